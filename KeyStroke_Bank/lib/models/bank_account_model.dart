@@ -131,7 +131,8 @@ class BankAccount {
       return BankAccount(
         id: (map['_id']?.toString()) ?? (_getValue(map, 'id')?.toString()) ?? '',
         userId: _getValue(map, 'userId') ?? '',
-        accountNumber: _getValue(map, 'accountNumber') ?? '',
+        // Other users' accounts only come with the masked number
+        accountNumber: _getValue(map, 'accountNumber') ?? _getValue(map, 'accountNumberMasked') ?? '',
         accountHolderName: _getValue(map, 'accountHolderName') ?? '',
         email: _getValue(map, 'email') ?? '',
         bankName: _getValue(map, 'bankName') ?? 'KeyStroke Bank',
@@ -546,11 +546,12 @@ class _EnhancedTransferScreenState extends State<EnhancedTransferScreen> {
         
         debugPrint('Received ${accounts.length} accounts from API');
         
-        // Ensure unique accounts by account number
+        // Ensure unique accounts by id (recipient accounts only carry a masked number)
         for (var account in accounts) {
           try {
             final bankAccount = BankAccount.fromMap(account);
-            uniqueAccounts[bankAccount.accountNumber] = bankAccount;
+            if (bankAccount.id.isEmpty) continue;
+            uniqueAccounts[bankAccount.id] = bankAccount;
           } catch (e) {
             debugPrint('Error parsing account: $e');
           }
@@ -69,6 +69,25 @@ app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key')
 app.config['MONGO_URI'] = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/ketstrokebank')
 app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'jwt-secret-key')
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = 86400  # 24 hours in seconds
+app.config['RISK_STEP_UP_SCORE'] = float(os.getenv('RISK_STEP_UP_SCORE', '0.4'))
+app.config['RISK_DENY_SCORE'] = float(os.getenv('RISK_DENY_SCORE', '0.9'))
+app.config['ADMIN_TOKEN'] = os.getenv('ADMIN_TOKEN')  # admin endpoints are off when unset
+app.config['PROFILE_SAMPLE_RATE'] = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+app.config['PROFILE_ENDPOINTS'] = os.getenv('PROFILE_ENDPOINTS', '')  # e.g. transactions.create_transaction
+app.config['PROFILE_MODE'] = os.getenv('PROFILE_MODE', 'cprofile')  # or 'sample'
+app.config['PROFILE_SECRET'] = os.getenv('PROFILE_SECRET')
+app.config['PROFILE_DIR'] = os.getenv('PROFILE_DIR')
+app.config['SLOW_QUERY_MS'] = float(os.getenv('SLOW_QUERY_MS', '100'))  # 0 disables the slow-query log
+app.config['SLOW_QUERY_EXPLAIN_VERBOSITY'] = os.getenv('SLOW_QUERY_EXPLAIN_VERBOSITY', 'queryPlanner')
+app.config['COMPRESS_MIN_SIZE'] = int(os.getenv('COMPRESS_MIN_SIZE', '1024'))
+app.config['STREAM_ENABLED'] = os.getenv('STREAM_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+app.config['ADMISSION_ENABLED'] = os.getenv('ADMISSION_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+app.config['ADMISSION_CAPACITY'] = int(os.getenv('ADMISSION_CAPACITY', '32'))  # about the worker thread count
+app.config['WRITE_BEHIND_INTERVAL'] = float(os.getenv('WRITE_BEHIND_INTERVAL', '1.0'))
+# Write concern per durability profile: 'majority+j', '1', '2+wtimeout=5000' or 'default'
+app.config['DURABILITY_MONEY'] = os.getenv('DURABILITY_MONEY', 'majority+j')
+app.config['DURABILITY_STANDARD'] = os.getenv('DURABILITY_STANDARD', 'default')
+app.config['DURABILITY_BOOKKEEPING'] = os.getenv('DURABILITY_BOOKKEEPING', '1')
 
 # Custom JSON encoder to handle ObjectId
 class JSONEncoder(json.JSONEncoder):
@@ -81,23 +100,69 @@ app.json_encoder = JSONEncoder
 
 def create_app():
     # Initialize extensions
-    from extensions import mongo, jwt
+    from extensions import mongo, jwt, command_listeners
     
     # Initialize extensions with app
-    mongo.init_app(app)
+    mongo.init_app(app, event_listeners=command_listeners(app))
     jwt.init_app(app)
     
+    # Write concerns for the model durability profiles
+    from models.durability import durability
+    durability.init_app(app)
+    
+    # Make sure the indexes the model lookups rely on exist
+    from models import ensure_indexes
+    try:
+        with app.app_context():
+            ensure_indexes()
+    except Exception as e:
+        logger.error(f"Could not ensure indexes: {str(e)}")
+    
+    # Rebuild in-memory risk counters from recent transactions
+    from services.risk import risk_engine
+    risk_engine.init_app(app)
+    
+    # One shared change stream feeds live updates and cache invalidation
+    from services.stream_hub import stream_hub
+    stream_hub.init_app(app)
+    from services.versioning import versions
+    versions.init_app(app)
+    from services.identity import account_sets
+    account_sets.init_app(app)
+    
     # Register blueprints
     from routes.routes import auth_bp
     from routes.bank_accounts import bank_accounts_bp
     from routes.transactions import transactions_bp
     from routes.users import users_bp
+    from routes.admin import admin_bp
+    from routes.stream import stream_bp
+    from routes.dashboard import dashboard_bp
     
     # Register the blueprints with URL prefixes
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(bank_accounts_bp, url_prefix='/api/accounts')
     app.register_blueprint(transactions_bp, url_prefix='/api/transactions')
     app.register_blueprint(users_bp, url_prefix='/api/users')
+    app.register_blueprint(admin_bp, url_prefix='/api/admin')
+    app.register_blueprint(stream_bp, url_prefix='/api/stream')
+    app.register_blueprint(dashboard_bp, url_prefix='/api/dashboard')
+    
+    # Batched background writes for login bookkeeping, flushed at exit
+    from services.write_behind import write_behind
+    write_behind.init_app(app)
+    
+    # Per-class concurrency limits; sheds load with 503s before views run
+    from services.admission import admission
+    admission.init_app(app)
+    
+    # Negotiated MessagePack bodies and response compression
+    from services.encoding import encoder
+    encoder.init_app(app)
+    
+    # Opt-in request profiling wraps the views registered above
+    from services.profiler import profiler
+    profiler.init_app(app)
     
     # Simple route to test the API
     @app.route('/')
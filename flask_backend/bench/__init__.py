@@ -0,0 +1,3 @@
+# This makes the bench directory a Python package
+# Benchmarks are run as modules from the flask_backend directory, e.g.
+#   python -m bench.models_micro
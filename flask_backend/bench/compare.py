@@ -0,0 +1,42 @@
+"""Diff two bench.load result files.
+
+Usage:
+    python -m bench.compare bench/results/dashboard-abc1234-....json bench/results/dashboard-def5678-....json
+"""
+import argparse
+import json
+
+METRICS = ('throughput', 'p50_ms', 'p95_ms', 'p99_ms')
+
+
+def _delta(before, after):
+    if before in (None, 0) or after is None:
+        return '    n/a'
+    return f'{(after - before) / before * 100:+6.1f}%'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare two benchmark results')
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    print(f"{baseline.get('mix')}: {baseline.get('commit')} -> {candidate.get('commit')}")
+    rows = [('overall', baseline['overall'], candidate['overall'])]
+    for name, stats in sorted(baseline['endpoints'].items()):
+        if name in candidate['endpoints']:
+            rows.append((name, stats, candidate['endpoints'][name]))
+
+    for name, before, after in rows:
+        cells = '  '.join(f"{metric} {before[metric]} -> {after[metric]} ({_delta(before[metric], after[metric])})"
+                          for metric in METRICS)
+        print(f'{name:>13}: {cells}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+"""Generate production-sized synthetic datasets.
+
+Users, accounts and transactions are built with the model classes and written
+with unordered insert_many batches from a pool of processes. Ids are derived
+from row numbers, so every worker can reference any user or account without
+coordination, and a run is reproducible for a given --seed.
+
+Traffic is skewed: account k is picked with probability falling off as a
+power law (--skew), so a small set of hot accounts carries most transactions.
+Timestamps lean towards recent days and follow a daytime-heavy hourly
+profile.
+
+Usage:
+    python -m bench.datagen --users 1000000 --accounts 3000000 \\
+        --transactions 200000000 --workers 8
+"""
+import argparse
+import logging
+import os
+import random
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import MongoClient
+from pymongo.write_concern import WriteConcern
+from werkzeug.security import generate_password_hash
+
+from models.bank_account import BankAccount
+from models.transaction import Transaction
+from models.user import User
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PASSWORD = 'datagen-password'
+USER, ACCOUNT, TRANSACTION = 1, 2, 3
+ACCOUNT_TYPES = ('savings', 'savings', 'checking', 'current')
+# (transaction_type, weight)
+TYPE_WEIGHTS = (('transfer', 45), ('payment', 30), ('deposit', 15), ('withdrawal', 10))
+# Relative activity per hour of day (UTC)
+HOUR_WEIGHTS = (1, 1, 1, 1, 1, 2, 3, 5, 7, 8, 8, 8, 9, 8, 8, 8, 8, 9, 9, 8, 6, 4, 3, 2)
+BASE_TS = 1_600_000_000
+
+
+def make_id(kind, index):
+    """Deterministic ObjectId for row `index` of a collection."""
+    return ObjectId(struct.pack('>IBxxxI', BASE_TS, kind, index))
+
+
+class Layout:
+    """Shared shape of the dataset, passed to every worker."""
+
+    def __init__(self, users, accounts, transactions, days, skew, seed, mongo_uri, batch_size):
+        self.users = users
+        self.accounts = accounts
+        self.transactions = transactions
+        self.days = days
+        self.skew = skew
+        self.seed = seed
+        self.mongo_uri = mongo_uri
+        self.batch_size = batch_size
+        self.end = datetime.utcnow().replace(microsecond=0)
+
+    def owner(self, account_index):
+        return account_index % self.users
+
+    def account_count(self, user_index):
+        return self.accounts // self.users + (1 if user_index < self.accounts % self.users else 0)
+
+    def pick_account(self, rng):
+        # Power-law skew towards low indices: those are the hot accounts
+        return min(int(self.accounts * rng.random() ** self.skew), self.accounts - 1)
+
+    def pick_time(self, rng):
+        day = int(self.days * rng.random() ** 1.5)  # recent days are busier
+        hour = rng.choices(range(24), HOUR_WEIGHTS)[0]
+        base = (self.end - timedelta(days=day)).replace(hour=hour, minute=0, second=0)
+        created_at = base + timedelta(seconds=rng.randrange(3600))
+        return min(created_at, self.end)
+
+
+def _collection(layout, name):
+    db = MongoClient(layout.mongo_uri).get_default_database('ketstrokebank')
+    # Bulk load: acknowledge on the primary only
+    return db[name].with_options(write_concern=WriteConcern(w=1))
+
+
+def _flush(collection, batch):
+    if batch:
+        collection.insert_many(batch, ordered=False, bypass_document_validation=True)
+    return len(batch)
+
+
+def generate_users(layout, start, stop, password_hash):
+    users = _collection(layout, User.collection_name)
+    written, batch = 0, []
+    for i in range(start, stop):
+        user = User(
+            name=f'User {i}',
+            email=f'user{i}@example.com',
+            password_hash=password_hash,
+            phone_number=f'9{i % 1_000_000_000:09d}',
+            created_at=layout.end - timedelta(days=layout.days + i % 365),
+            _id=make_id(USER, i)
+        )
+        doc = user.to_bson()
+        doc['account_count'] = layout.account_count(i)
+        batch.append(doc)
+        if len(batch) >= layout.batch_size:
+            written += _flush(users, batch)
+            batch = []
+    return written + _flush(users, batch)
+
+
+def generate_accounts(layout, start, stop):
+    rng = random.Random(f'{layout.seed}-accounts-{start}')
+    accounts = _collection(layout, BankAccount.collection_name)
+    written, batch = 0, []
+    for j in range(start, stop):
+        user_index = layout.owner(j)
+        created_at = layout.end - timedelta(days=layout.days + rng.randrange(365))
+        batch.append(BankAccount(
+            user_id=make_id(USER, user_index),
+            account_number=f'{j:012d}',
+            account_holder_name=f'User {user_index}',
+            bank_name='KetStroke Bank',
+            ifsc_code=f'KSB{j % 10000:07d}',
+            account_type=rng.choice(ACCOUNT_TYPES),
+            balance_minor=rng.randint(0, 50_000_000),
+            is_primary=j < layout.users,  # each user's first account
+            created_at=created_at,
+            updated_at=created_at,
+            _id=make_id(ACCOUNT, j)
+        ).to_bson())
+        if len(batch) >= layout.batch_size:
+            written += _flush(accounts, batch)
+            batch = []
+    return written + _flush(accounts, batch)
+
+
+def generate_transactions(layout, start, stop):
+    rng = random.Random(f'{layout.seed}-transactions-{start}')
+    transactions = _collection(layout, Transaction.collection_name)
+    types, weights = zip(*TYPE_WEIGHTS)
+    written, batch = 0, []
+    for k in range(start, stop):
+        account_index = layout.pick_account(rng)
+        transaction_type = rng.choices(types, weights)[0]
+        recipient = None
+        if transaction_type == 'transfer':
+            recipient = make_id(ACCOUNT, layout.pick_account(rng))
+        created_at = layout.pick_time(rng)
+        # Mostly small amounts with a long tail
+        amount_minor = int(rng.lognormvariate(10, 1.2)) + 100
+        batch.append(Transaction(
+            user_id=make_id(USER, layout.owner(account_index)),
+            account_id=make_id(ACCOUNT, account_index),
+            amount=None,
+            amount_minor=amount_minor,
+            transaction_type=transaction_type,
+            description=f'{transaction_type} #{k}',
+            recipient_account_id=recipient,
+            status='completed' if rng.random() < 0.98 else 'failed',
+            reference=f'TXN{int((created_at - datetime(1970, 1, 1)).total_seconds())}{k:010d}',
+            created_at=created_at,
+            updated_at=created_at,
+            _id=make_id(TRANSACTION, k)
+        ).to_bson())
+        if len(batch) >= layout.batch_size:
+            written += _flush(transactions, batch)
+            batch = []
+    return written + _flush(transactions, batch)
+
+
+def _ranges(total, chunk):
+    return [(start, min(start + chunk, total)) for start in range(0, total, chunk)]
+
+
+def _run_phase(pool, name, fn, layout, total, chunk, *extra):
+    started = time.time()
+    futures = [pool.submit(fn, layout, start, stop, *extra) for start, stop in _ranges(total, chunk)]
+    written = 0
+    for future in as_completed(futures):
+        written += future.result()
+        rate = written / max(time.time() - started, 1e-6)
+        logger.info(f"{name}: {written}/{total} ({rate:,.0f} docs/s)")
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a synthetic KetStrokeBank dataset')
+    parser.add_argument('--mongo-uri', default=os.getenv('MONGODB_URI', 'mongodb://localhost:27017/ketstrokebank'))
+    parser.add_argument('--users', type=int, default=10_000)
+    parser.add_argument('--accounts', type=int, default=30_000)
+    parser.add_argument('--transactions', type=int, default=2_000_000)
+    parser.add_argument('--days', type=int, default=365, help='history span')
+    parser.add_argument('--skew', type=float, default=3.0, help='hot-account skew; 1.0 is uniform')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--chunk', type=int, default=250_000, help='rows per worker task')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--drop', action='store_true', help='drop the three collections first')
+    parser.add_argument('--create-indexes', action='store_true',
+                        help='create the app indexes after loading (faster than during)')
+    args = parser.parse_args(argv)
+
+    if args.accounts < args.users:
+        parser.error('--accounts must be at least --users (every user gets a primary account)')
+
+    layout = Layout(args.users, args.accounts, args.transactions, args.days, args.skew,
+                    args.seed, args.mongo_uri, args.batch_size)
+    db = MongoClient(args.mongo_uri).get_default_database('ketstrokebank')
+    if args.drop:
+        for name in (User.collection_name, BankAccount.collection_name, Transaction.collection_name):
+            db.drop_collection(name)
+
+    password_hash = generate_password_hash(PASSWORD)
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        _run_phase(pool, 'users', generate_users, layout, args.users, args.chunk, password_hash)
+        _run_phase(pool, 'accounts', generate_accounts, layout, args.accounts, args.chunk)
+        _run_phase(pool, 'transactions', generate_transactions, layout, args.transactions, args.chunk)
+
+    if args.create_indexes:
+        from jobs.common import model_app
+        from models import ensure_indexes
+        with model_app(args.mongo_uri).app_context():
+            ensure_indexes()
+        logger.info('Indexes created')
+
+
+if __name__ == '__main__':
+    main()
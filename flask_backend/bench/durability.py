@@ -0,0 +1,173 @@
+"""Durability profiles: are they applied, and what does each one cost?
+
+Verification runs the model writes each profile covers (account creation, a
+deposit, a failed-transfer record, a status change, a metadata edit and a
+write-behind flush) and checks, with a pymongo command listener, that each
+one reached the server with its profile's write concern: on the commit for
+transactional writes, on the write command otherwise.
+
+The latency part times single-document updates under every profile.
+On the throwaway single-node replica set majority costs about the same as w:1
+and the journal wait dominates; run with --mongo-uri against a real replica
+set to see the replication cost. Exits non-zero when a write used the wrong
+write concern.
+
+Usage:
+    python -m bench.durability --writes 2000
+    DURABILITY_MONEY=majority python -m bench.durability --mongo-uri mongodb://...
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from contextlib import ExitStack
+
+from bson import ObjectId
+from pymongo import MongoClient, monitoring
+
+from bench.mongod import local_mongod
+
+WRITE_COMMANDS = ('insert', 'update', 'delete', 'findAndModify', 'commitTransaction')
+
+
+class WriteConcernRecorder(monitoring.CommandListener):
+    """Records (command, collection, writeConcern) for write commands."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.seen = []
+
+    def started(self, event):
+        if event.command_name in WRITE_COMMANDS:
+            command = event.command
+            target = command.get(event.command_name)
+            with self.lock:
+                self.seen.append((event.command_name, target if isinstance(target, str) else None,
+                                  command.get('writeConcern')))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def take(self):
+        with self.lock:
+            seen, self.seen = self.seen, []
+        return seen
+
+
+def expected_concern(profile):
+    """The writeConcern document a command under `profile` should carry (None: omitted)."""
+    from extensions import mongo
+    from models.durability import durability
+    concern = durability.write_concern(profile) or mongo.db.write_concern
+    return concern.document or None
+
+
+def verify(recorder):
+    """Run each profiled write; return [(operation, profile, expected, actual)] mismatches."""
+    from models.bank_account import BankAccount
+    from models.durability import MONEY, STANDARD, BOOKKEEPING
+    from models.transaction import Transaction
+    from extensions import mongo
+    from services.write_behind import write_behind
+
+    user_id = ObjectId()
+    mongo.db.users.insert_one({'_id': user_id, 'name': 'Durability User',
+                               'email': f'{user_id}@example.com', 'account_count': 0})
+    account = BankAccount(user_id=user_id, account_number='000000000001',
+                          account_holder_name='Durability User', bank_name='KetStroke Bank',
+                          ifsc_code='KSB0000001', account_type='savings', balance_minor=0,
+                          _id=ObjectId())
+    deposit = Transaction(user_id=user_id, account_id=account._id, amount='10.00',
+                          transaction_type='deposit', description='bench')
+    failed = Transaction(user_id=user_id, account_id=account._id, amount='1.00',
+                         transaction_type='transfer', description='bench', status='failed')
+
+    operations = [
+        # (name, profile, command and collection that carries the write concern, run)
+        ('create account', MONEY, ('commitTransaction', None), account.save),
+        ('deposit', MONEY, ('commitTransaction', None), deposit.apply),
+        ('failed transfer record', BOOKKEEPING, ('insert', 'transactions'), failed.save),
+        ('transaction status', MONEY, ('findAndModify', 'transactions'),
+         lambda: Transaction.update_status(failed._id, 'reversed')),
+        ('account metadata', STANDARD, ('update', 'bank_accounts'),
+         lambda: BankAccount.update(account._id, user_id, {'account_holder_name': 'Renamed'})),
+        ('last_login', BOOKKEEPING, ('update', 'users'),
+         lambda: (write_behind.update('users', user_id, {'$set': {'last_login': time.time()}}),
+                  write_behind.flush())),
+    ]
+
+    mismatches = []
+    for name, profile, (command_name, collection), run in operations:
+        recorder.take()
+        run()
+        expected = expected_concern(profile)
+        matching = [concern for command, target, concern in recorder.take()
+                    if command == command_name and (collection is None or target == collection)]
+        actual = matching[0] if matching else 'no such command'
+        status = 'OK' if actual == expected else 'MISMATCH'
+        print(f"  {name:<24} {profile:<12} {command_name:<18} {str(actual):<32} {status}")
+        if actual != expected:
+            mismatches.append((name, profile, expected, actual))
+    return mismatches
+
+
+def time_writes(profile, writes):
+    """Latencies in ms of `writes` sequential single-document updates under `profile`."""
+    from models.durability import durability
+
+    collection = durability.collection('durability_bench', profile)
+    collection.insert_one({'_id': profile, 'n': 0})
+    latencies = []
+    for _ in range(writes):
+        started = time.perf_counter()
+        collection.update_one({'_id': profile}, {'$inc': {'n': 1}})
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Durability profile verification and write latency')
+    parser.add_argument('--writes', type=int, default=2000, help='timed writes per profile')
+    parser.add_argument('--mongo-uri', help='use a running replica set instead of starting mongod')
+    parser.add_argument('--mongod', default='mongod', help='mongod binary to start')
+    args = parser.parse_args(argv)
+
+    recorder = WriteConcernRecorder()
+    # Must be registered before the app creates its MongoClient
+    monitoring.register(recorder)
+
+    with ExitStack() as stack:
+        mongo_uri = args.mongo_uri or stack.enter_context(local_mongod(binary=args.mongod))
+        db = MongoClient(mongo_uri).get_default_database('ketstrokebank')
+        db.client.drop_database(db.name)
+        os.environ.update(MONGODB_URI=mongo_uri, STREAM_ENABLED='false')
+        import logging
+        import app as app_module
+        from models.durability import durability
+        application = app_module.create_app()
+        logging.getLogger().setLevel(logging.ERROR)
+
+        with application.app_context():
+            print(f"profiles: {durability.stats()}")
+            print('verification:')
+            mismatches = verify(recorder)
+
+            print(f'latency over {args.writes} updates:')
+            for profile in sorted(durability.stats()):
+                latencies = sorted(time_writes(profile, args.writes))
+                p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+                print(f"  {profile:<12} p50 {statistics.median(latencies):7.3f} ms  "
+                      f"p99 {p99:7.3f} ms  mean {statistics.fmean(latencies):7.3f} ms")
+
+    for name, profile, expected, actual in mismatches:
+        print(f"{name}: expected {expected} for {profile}, got {actual}")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,254 @@
+"""Load-test the API with realistic request mixes.
+
+Starts a throwaway mongod (or uses --mongo-uri), seeds synthetic data, runs
+the app in a subprocess and drives it with concurrent keep-alive clients.
+Each mix reports throughput and p50/p95/p99 latency per endpoint and is
+saved as JSON under bench/results/ for diffing with bench.compare.
+
+Usage:
+    python -m bench.load --mix dashboard --clients 32 --duration 30
+    python -m bench.load --mongo-uri mongodb://localhost:27017/ksb_bench --mix all
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from contextlib import ExitStack
+from datetime import datetime
+
+from pymongo import MongoClient
+
+from bench.mongod import local_mongod
+from bench.seed import seed
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+# mix name -> [(operation, weight)]
+MIXES = {
+    'login': [('login', 70), ('me', 15), ('accounts', 15)],
+    'dashboard': [('me', 20), ('accounts', 35), ('transactions', 35), ('users', 10)],
+    'transfer': [('transfer', 60), ('accounts', 20), ('transactions', 20)],
+}
+
+
+class Client:
+    """One simulated user on a persistent HTTP/1.1 connection."""
+
+    def __init__(self, host, port, credentials, everyone, rng):
+        self.conn = http.client.HTTPConnection(host, port, timeout=30)
+        self.credentials = credentials
+        self.everyone = everyone
+        self.rng = rng
+        self.token = None
+
+    def request(self, method, path, body=None, auth=True):
+        headers = {'Content-Type': 'application/json'}
+        if auth:
+            headers['Authorization'] = f'Bearer {self.token}'
+        payload = json.dumps(body) if body is not None else None
+        try:
+            self.conn.request(method, path, body=payload, headers=headers)
+            response = self.conn.getresponse()
+            data = response.read()
+        except (http.client.HTTPException, OSError):
+            self.conn.close()  # Reconnect on the next request
+            return 0, b''
+        return response.status, data
+
+    def login(self):
+        status, data = self.request('POST', '/api/auth/login', {
+            'email': self.credentials['email'],
+            'password': self.credentials['password']
+        }, auth=False)
+        if status == 200:
+            self.token = json.loads(data)['access_token']
+        return status
+
+    def run(self, operation):
+        if operation == 'login':
+            return self.login()
+        if operation == 'me':
+            return self.request('GET', '/api/auth/me')[0]
+        if operation == 'accounts':
+            return self.request('GET', '/api/accounts')[0]
+        if operation == 'transactions':
+            return self.request('GET', '/api/transactions?limit=20')[0]
+        if operation == 'users':
+            other = self.rng.choice(self.everyone)
+            if self.rng.random() < 0.5:
+                return self.request('GET', f"/api/users?q={other['email'][:6]}")[0]
+            return self.request('GET', f"/api/users/{other['user_id']}/accounts")[0]
+        if operation == 'transfer':
+            recipient = self.rng.choice(self.everyone)['account_ids'][0]
+            return self.request('POST', '/api/transactions', {
+                'account_id': self.rng.choice(self.credentials['account_ids']),
+                'recipient_account_id': recipient,
+                'amount': '1.00',
+                'transaction_type': 'transfer',
+                'description': 'bench'
+            })[0]
+        raise ValueError(f'Unknown operation {operation}')
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1, len(sorted_values) - 1)
+    return sorted_values[max(index, 0)]
+
+
+def summarize(samples, elapsed):
+    latencies = sorted(latency for latency, _ in samples)
+    errors = sum(1 for _, status in samples if not 200 <= status < 400)
+    return {
+        'count': len(samples),
+        'errors': errors,
+        'throughput': round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3) if latencies else None,
+    }
+
+
+def run_mix(mix, host, port, credentials, clients=16, duration=20.0, warmup=3.0, seed_value=1):
+    operations, weights = zip(*MIXES[mix])
+    samples = {operation: [] for operation in operations}
+    lock = threading.Lock()
+    state = {'measure_from': None, 'stop_at': None}
+
+    def set_window():
+        # Runs once every client has logged in
+        now = time.perf_counter()
+        state['measure_from'] = now + warmup
+        state['stop_at'] = now + warmup + duration
+
+    start_barrier = threading.Barrier(clients + 1, action=set_window)
+
+    def worker(index):
+        rng = random.Random(seed_value * 1000 + index)
+        client = Client(host, port, credentials[index % len(credentials)], credentials, rng)
+        client.login()
+        local = {operation: [] for operation in operations}
+        start_barrier.wait()
+        while True:
+            now = time.perf_counter()
+            if now >= state['stop_at']:
+                break
+            operation = rng.choices(operations, weights)[0]
+            status = client.run(operation)
+            finished = time.perf_counter()
+            if now >= state['measure_from']:
+                local[operation].append((finished - now, status))
+        with lock:
+            for operation, values in local.items():
+                samples[operation].extend(values)
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    start_barrier.wait()
+    for thread in threads:
+        thread.join()
+
+    all_samples = [sample for values in samples.values() for sample in values]
+    return {
+        'overall': summarize(all_samples, duration),
+        'endpoints': {operation: summarize(values, duration) for operation, values in samples.items()},
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def start_server(mongo_uri, port, keep_risk=False, extra_env=None):
+    env = dict(os.environ, MONGODB_URI=mongo_uri)
+    if not keep_risk:
+        # Synthetic transfers trip the velocity rules; scores never exceed 1.0
+        env.update(RISK_STEP_UP_SCORE='2', RISK_DENY_SCORE='2')
+    env.update(extra_env or {})
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'bench.serve', '--port', str(port)],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('API server exited during startup')
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/')
+            if conn.getresponse().status == 200:
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError('API server did not start')
+
+
+def save_result(result, output_dir=RESULTS_DIR):
+    os.makedirs(output_dir, exist_ok=True)
+    name = f"{result['mix']}-{result['commit']}-{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}.json"
+    path = os.path.join(output_dir, name)
+    with open(path, 'w') as f:
+        json.dump(result, f, indent=2)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load-test the KetStrokeBank API')
+    parser.add_argument('--mix', choices=sorted(MIXES) + ['all'], default='all')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20.0, help='measured seconds per mix')
+    parser.add_argument('--warmup', type=float, default=3.0)
+    parser.add_argument('--mongo-uri', help='use a running server instead of starting mongod')
+    parser.add_argument('--mongod', default='mongod', help='mongod binary to start')
+    parser.add_argument('--port', type=int, default=5050, help='API port')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--accounts-per-user', type=int, default=2)
+    parser.add_argument('--transactions-per-account', type=int, default=20)
+    parser.add_argument('--keep-risk', action='store_true', help='leave risk step-up/deny enabled')
+    parser.add_argument('--output-dir', default=RESULTS_DIR)
+    args = parser.parse_args(argv)
+
+    with ExitStack() as stack:
+        mongo_uri = args.mongo_uri or stack.enter_context(local_mongod(binary=args.mongod))
+        db = MongoClient(mongo_uri).get_default_database('ketstrokebank')
+        db.client.drop_database(db.name)
+        credentials = seed(mongo_uri, users=args.users, accounts_per_user=args.accounts_per_user,
+                           transactions_per_account=args.transactions_per_account)
+
+        server = start_server(mongo_uri, args.port, keep_risk=args.keep_risk)
+        stack.callback(server.terminate)
+
+        mixes = sorted(MIXES) if args.mix == 'all' else [args.mix]
+        for mix in mixes:
+            result = run_mix(mix, '127.0.0.1', args.port, credentials, clients=args.clients,
+                             duration=args.duration, warmup=args.warmup)
+            result.update({
+                'mix': mix,
+                'commit': git_commit(),
+                'timestamp': datetime.utcnow().isoformat(),
+                'config': {key: getattr(args, key) for key in (
+                    'clients', 'duration', 'warmup', 'users', 'accounts_per_user',
+                    'transactions_per_account', 'keep_risk')},
+            })
+            path = save_result(result, args.output_dir)
+            overall = result['overall']
+            print(f"{mix:>10}: {overall['throughput']:8.1f} req/s  p50 {overall['p50_ms']} ms  "
+                  f"p95 {overall['p95_ms']} ms  p99 {overall['p99_ms']} ms  errors {overall['errors']}  -> {path}")
+
+
+if __name__ == '__main__':
+    main()
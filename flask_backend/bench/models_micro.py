@@ -0,0 +1,153 @@
+"""Per-row CPU and allocation cost of turning stored documents into API rows.
+
+Compares the list-endpoint path (from_bson_many + to_json) with the old
+copy-and-coerce loop the routes used to run on raw documents. The old
+model's coercion is vendored below as LegacyBankAccount, so the comparison
+is against the baseline code rather than the current model.
+
+Usage:
+    python -m bench.models_micro --rows 10000
+"""
+import argparse
+import time
+import tracemalloc
+from datetime import datetime
+
+from bson import ObjectId
+from bson.int64 import Int64
+
+from models.bank_account import BankAccount
+
+
+def make_docs(rows, migrated=False):
+    """Stored accounts, with the legacy float balance or (migrated) balance_minor."""
+    now = datetime.utcnow()
+    user_id = ObjectId()
+    balance = {'balance_minor': Int64(123450)} if migrated else {'balance': 1234.5}
+    return [{
+        '_id': ObjectId(),
+        'user_id': user_id,
+        'account_number': f'{i:012d}',
+        'account_holder_name': 'Bench User',
+        'bank_name': 'KetStroke Bank',
+        'ifsc_code': 'KSB0000001',
+        'account_type': 'savings',
+        **balance,
+        'is_primary': i == 0,
+        'created_at': now,
+        'updated_at': now
+    } for i in range(rows)]
+
+
+def cursor(docs):
+    # Each fetched row is a fresh dict, as with a pymongo cursor
+    return (dict(doc) for doc in docs)
+
+
+class LegacyBankAccount:
+    """BankAccount.__init__/from_dict/to_dict as they were before the slotted models."""
+
+    def __init__(self, user_id, account_number, account_holder_name, bank_name,
+                 ifsc_code, account_type, balance=0.0, is_primary=False):
+        self.user_id = user_id
+        self.account_number = account_number
+        self.account_holder_name = account_holder_name
+        self.bank_name = bank_name
+        self.ifsc_code = ifsc_code
+        self.account_type = account_type
+        self.balance = float(balance)
+        self.is_primary = bool(is_primary)
+        self.created_at = datetime.utcnow()
+        self.updated_at = datetime.utcnow()
+
+    def to_dict(self):
+        user_id = self.user_id
+        if user_id and not isinstance(user_id, ObjectId):
+            try:
+                user_id = ObjectId(str(user_id))
+            except:  # noqa: E722 - as in the baseline
+                pass
+        try:
+            balance = float(self.balance)
+        except (TypeError, ValueError):
+            balance = 0.0
+        is_primary = bool(self.is_primary)
+        return {
+            'user_id': user_id,
+            'account_number': str(self.account_number) if self.account_number is not None else '',
+            'account_holder_name': str(self.account_holder_name) if self.account_holder_name is not None else '',
+            'bank_name': str(self.bank_name) if self.bank_name is not None else '',
+            'ifsc_code': str(self.ifsc_code) if self.ifsc_code is not None else '',
+            'account_type': str(self.account_type) if self.account_type is not None else 'savings',
+            'balance': balance,
+            'is_primary': is_primary,
+            'created_at': self.created_at if hasattr(self, 'created_at') and self.created_at else datetime.utcnow(),
+            'updated_at': self.updated_at if hasattr(self, 'updated_at') and self.updated_at else datetime.utcnow()
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            user_id=data['user_id'],
+            account_number=data['account_number'],
+            account_holder_name=data['account_holder_name'],
+            bank_name=data['bank_name'],
+            ifsc_code=data['ifsc_code'],
+            account_type=data['account_type'],
+            balance=data.get('balance', 0.0),
+            is_primary=data.get('is_primary', False)
+        )
+
+
+def legacy_rows(docs):
+    # What get_accounts did before the slotted models: list(find()) then copy-and-coerce
+    rows = []
+    for doc in list(cursor(docs)):
+        account = LegacyBankAccount.from_dict(doc)  # re-coerces every field
+        data = account.to_dict().copy()
+        data['_id'] = str(doc.get('_id', ''))
+        data['user_id'] = str(data.get('user_id', ''))
+        data['created_at'] = data['created_at'].isoformat()
+        data['updated_at'] = data['updated_at'].isoformat()
+        rows.append(data)
+    return rows
+
+
+def model_rows(docs):
+    return [account.to_json() for account in BankAccount.from_bson_many(cursor(docs))]
+
+
+def measure(fn, docs, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(docs)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    fn(docs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best / len(docs) * 1e6, peak / len(docs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Model conversion microbenchmark')
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    legacy_docs = make_docs(args.rows)
+    migrated_docs = make_docs(args.rows, migrated=True)
+    # The baseline on the documents it was written for; the model on both formats,
+    # since unmigrated balances go through Decimal rounding on read
+    for name, fn, docs in (('legacy', legacy_rows, legacy_docs),
+                           ('unmigrated', model_rows, legacy_docs),
+                           ('from_bson', model_rows, migrated_docs)):
+        us_per_row, bytes_per_row = measure(fn, docs, args.repeat)
+        print(f'{name:>10}: {us_per_row:8.2f} us/row  {bytes_per_row:8.0f} peak bytes/row')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Throwaway local mongod for benchmarks.
+
+Starts a single-node replica set (transactions need one) with its data
+directory on /dev/shm when available, so the database effectively lives in
+memory and disappears afterwards.
+"""
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from contextlib import contextmanager
+
+from pymongo import MongoClient
+from pymongo.errors import ConnectionFailure, OperationFailure
+
+
+def _log_tail(log_path, lines=20):
+    try:
+        with open(log_path, errors='replace') as log:
+            return ''.join(log.readlines()[-lines:])
+    except OSError:
+        return '(no log)'
+
+
+@contextmanager
+def local_mongod(port=27117, binary='mongod', replset='rs0', dbpath=None, start_timeout=30):
+    """Yield a mongodb:// URI for a fresh mongod, stopping it on exit.
+
+    Raises RuntimeError with the tail of the mongod log if it exits or is not
+    a writable primary within start_timeout seconds.
+    """
+    if shutil.which(binary) is None:
+        raise RuntimeError(f"{binary} not found on PATH; pass --mongo-uri to use a running server")
+
+    owned_dir = dbpath is None
+    if owned_dir:
+        base = '/dev/shm' if os.path.isdir('/dev/shm') else None
+        dbpath = tempfile.mkdtemp(prefix='ksb-bench-', dir=base)
+    log_fd, log_path = tempfile.mkstemp(prefix='ksb-mongod-', suffix='.log')
+    os.close(log_fd)
+
+    process = subprocess.Popen(
+        [binary, '--port', str(port), '--dbpath', dbpath, '--replSet', replset,
+         '--bind_ip', '127.0.0.1', '--quiet', '--logpath', log_path],
+        stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT
+    )
+    deadline = time.time() + start_timeout
+
+    def check_alive(reason):
+        if process.poll() is not None:
+            raise RuntimeError(f"mongod exited with status {process.returncode} {reason}; "
+                               f"log tail:\n{_log_tail(log_path)}")
+        if time.time() > deadline:
+            raise RuntimeError(f"mongod timed out after {start_timeout}s {reason}; "
+                               f"log tail:\n{_log_tail(log_path)}")
+
+    try:
+        client = MongoClient('127.0.0.1', port, directConnection=True, serverSelectionTimeoutMS=500)
+        while True:
+            try:
+                client.admin.command('ping')
+                break
+            except ConnectionFailure:
+                check_alive('before accepting connections')
+
+        try:
+            client.admin.command('replSetInitiate', {
+                '_id': replset,
+                'members': [{'_id': 0, 'host': f'127.0.0.1:{port}'}]
+            })
+        except OperationFailure:
+            pass  # Already initiated
+        while True:
+            try:
+                if client.admin.command('hello').get('isWritablePrimary'):
+                    break
+            except ConnectionFailure:
+                pass
+            check_alive('before becoming primary')
+            time.sleep(0.1)
+        client.close()
+
+        yield f'mongodb://127.0.0.1:{port}/ketstrokebank?replicaSet={replset}'
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        if owned_dir:
+            shutil.rmtree(dbpath, ignore_errors=True)
+        os.remove(log_path)
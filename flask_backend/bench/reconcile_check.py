@@ -0,0 +1,110 @@
+"""End-to-end check of jobs.reconcile against a real mongod.
+
+Seeds a handful of accounts whose ledgers span both tiers (deposits and
+transfers in the archive, transfers crossing `_id` ranges, a type that moves
+no money, a failed transfer) so that every balance agrees with its ledger
+except one, which is off by a known amount. Runs the reconciliation with
+small ranges and exits non-zero unless exactly that account is reported
+with that difference.
+
+Usage:
+    python -m bench.reconcile_check
+    python -m bench.reconcile_check --mongo-uri mongodb://...   # drops the database first
+"""
+import argparse
+import sys
+from contextlib import ExitStack
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from bson.int64 import Int64
+from pymongo import MongoClient
+
+from bench.mongod import local_mongod
+
+DISCREPANCY_MINOR = 500
+
+
+def _transaction(account_id, amount_minor, transaction_type, created_at, recipient_account_id=None,
+                 status='completed'):
+    return {'_id': ObjectId(), 'user_id': None, 'account_id': account_id,
+            'recipient_account_id': recipient_account_id, 'amount_minor': Int64(amount_minor),
+            'transaction_type': transaction_type, 'status': status, 'description': 'reconcile check',
+            'created_at': created_at, 'updated_at': created_at}
+
+
+def seed(db):
+    """Seed both tiers; returns (the account with the discrepancy, every account id)."""
+    from jobs.common import save_checkpoint
+    from jobs.tier_transactions import ensure_archive
+    from models.transaction import TIERING_JOB
+
+    now = datetime.utcnow()
+    cutoff = now - timedelta(days=30)
+    old, recent = cutoff - timedelta(days=10), now - timedelta(hours=1)
+    user_id = ObjectId()
+    # Created in order, so with two accounts per range a..g fall in ranges [a b] [c d] [e f] [g]
+    a, b, c, d, e, f, g = ids = [ObjectId() for _ in range(7)]
+    opening = {a: 1000, b: 500, c: 0, d: 100, e: 0, f: 1000}
+    balance = {a: 900, b: 400, c: 50, d: 100 + DISCREPANCY_MINOR, e: 400, f: 900, g: 250}
+
+    accounts = []
+    for account_id in ids:
+        doc = {'_id': account_id, 'user_id': user_id, 'account_number': str(account_id)[-12:],
+               'account_holder_name': 'Reconcile Check', 'bank_name': 'KetStroke Bank',
+               'ifsc_code': 'KSB0000001', 'account_type': 'savings',
+               'balance_minor': Int64(balance[account_id]), 'created_at': old, 'updated_at': now}
+        if account_id in opening:
+            doc['opening_balance_minor'] = Int64(opening[account_id])  # g is left unbaselined
+        accounts.append(doc)
+    db.bank_accounts.insert_many(accounts)
+
+    archive = ensure_archive(db)
+    archive.insert_many([
+        _transaction(a, 200, 'deposit', old),
+        _transaction(a, 300, 'transfer', old, recipient_account_id=e),  # lands two ranges later
+        _transaction(a, 999, 'transfer', old, recipient_account_id=e, status='failed'),
+    ])
+    db.transactions.insert_many([
+        _transaction(b, 100, 'withdrawal', recent),
+        _transaction(c, 50, 'deposit', recent),
+        _transaction(f, 100, 'transfer', recent, recipient_account_id=e),
+        _transaction(f, 70, 'payment', recent),  # moves no money
+    ])
+    save_checkpoint(db, TIERING_JOB, {'cutoff': cutoff})
+    return d, ids
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check that jobs.reconcile reports a seeded discrepancy')
+    parser.add_argument('--mongo-uri', help='use a running replica set instead of starting mongod')
+    parser.add_argument('--mongod', default='mongod', help='mongod binary to start')
+    args = parser.parse_args(argv)
+
+    from jobs import reconcile
+
+    with ExitStack() as stack:
+        mongo_uri = args.mongo_uri or stack.enter_context(local_mongod(binary=args.mongod))
+        db = MongoClient(mongo_uri).get_default_database('ketstrokebank')
+        db.client.drop_database(db.name)
+        wrong, ids = seed(db)
+
+        discrepancies = reconcile.run(workers=2, partition_size=2, uri=mongo_uri)
+        reported = {doc['account_id']: doc['difference_minor'] for doc in db[reconcile.REPORTS].find()}
+        unbaselined = db.bank_accounts.count_documents({'_id': {'$in': ids},
+                                                        'opening_balance_minor': {'$exists': False}})
+
+    print(f"reported: {[(str(account_id), difference) for account_id, difference in reported.items()]}")
+    expected = {wrong: DISCREPANCY_MINOR}
+    if reported != expected or len(discrepancies) != 1:
+        print(f"expected only {wrong} off by {DISCREPANCY_MINOR}")
+        return 1
+    if unbaselined != 1:
+        print(f"expected the unbaselined account to be skipped, found {unbaselined} without an opening balance")
+        return 1
+    print('OK')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""Seed a benchmark database with synthetic users, accounts and transactions.
+
+Documents are built with the models' to_bson so they match what the API
+writes. Every user shares one password hash, so seeding does not pay for the
+KDF once per user.
+"""
+import random
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import MongoClient
+from werkzeug.security import generate_password_hash
+
+from models.bank_account import BankAccount
+from models.transaction import Transaction
+from models.user import User
+
+PASSWORD = 'bench-password'
+TRANSACTION_TYPES = ('deposit', 'withdrawal', 'transfer', 'payment')
+
+
+def seed(mongo_uri, users=200, accounts_per_user=2, transactions_per_account=20,
+         opening_balance_minor=10_000_000, rng=None):
+    """Insert the dataset and return [{'email', 'password', 'user_id', 'account_ids'}]."""
+    rng = rng or random.Random(42)
+    db = MongoClient(mongo_uri).get_default_database('ketstrokebank')
+    password_hash = generate_password_hash(PASSWORD)
+    now = datetime.utcnow()
+
+    credentials, user_docs, account_docs = [], [], []
+    for i in range(users):
+        user = User(name=f'Bench User {i}', email=f'bench{i}@example.com', password_hash=password_hash,
+                    phone_number=f'9{i:09d}')
+        doc = user.to_bson()
+        doc['account_count'] = accounts_per_user
+        user_docs.append(doc)
+
+        account_ids = []
+        for j in range(accounts_per_user):
+            account = BankAccount(
+                user_id=user._id,
+                account_number=f'{i:08d}{j:04d}',
+                account_holder_name=user.name,
+                bank_name='KetStroke Bank',
+                ifsc_code='KSB0000001',
+                account_type='savings' if j == 0 else 'checking',
+                balance_minor=opening_balance_minor,
+                is_primary=j == 0,
+                _id=ObjectId()
+            )
+            account_docs.append(account.to_bson())
+            account_ids.append(str(account._id))
+        credentials.append({'email': user.email, 'password': PASSWORD,
+                            'user_id': str(user._id), 'account_ids': account_ids})
+
+    db.users.insert_many(user_docs, ordered=False)
+    db.bank_accounts.insert_many(account_docs, ordered=False)
+
+    all_accounts = [(c['user_id'], a) for c in credentials for a in c['account_ids']]
+    batch = []
+    for user_id, account_id in all_accounts:
+        for _ in range(transactions_per_account):
+            transaction_type = rng.choice(TRANSACTION_TYPES)
+            recipient = rng.choice(all_accounts)[1] if transaction_type == 'transfer' else None
+            created_at = now - timedelta(seconds=rng.randint(0, 90 * 86400))
+            batch.append(Transaction(
+                user_id=user_id,
+                account_id=account_id,
+                amount=None,
+                amount_minor=rng.randint(100, 500_000),
+                transaction_type=transaction_type,
+                recipient_account_id=recipient,
+                status='completed',
+                created_at=created_at,
+                updated_at=created_at
+            ).to_bson())
+            if len(batch) >= 5000:
+                db.transactions.insert_many(batch, ordered=False)
+                batch = []
+    if batch:
+        db.transactions.insert_many(batch, ordered=False)
+
+    return credentials
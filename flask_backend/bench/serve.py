@@ -0,0 +1,28 @@
+"""Serve the API for benchmarks: threaded WSGI server, quiet logging.
+
+Usage:
+    MONGODB_URI=... python -m bench.serve --port 5050
+"""
+import argparse
+import logging
+
+from werkzeug.serving import make_server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve the API for benchmarking')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5050)
+    args = parser.parse_args(argv)
+
+    import app as app_module
+    application = app_module.create_app()
+    # Per-request DEBUG logging would dominate the measurements
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    make_server(args.host, args.port, application, threaded=True).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+"""Concurrent-transfer correctness and throughput harness.
+
+Fires thousands of transfers over a handful of accounts through
+create_transaction (in-process, via the Flask test client) from a pool of
+threads, then checks the invariants the transfer path must keep:
+
+* money is conserved: the sum of balances is unchanged
+* no account balance is negative
+* every transaction reference is unique
+* each balance equals its opening balance plus the committed ledger
+
+Throughput is reported as committed transfers per second; a pymongo command
+listener counts commits, aborts and write conflicts to give the retry rate.
+Runs against a throwaway single-node replica set (or --mongo-uri) and exits
+non-zero when an invariant breaks.
+
+Usage:
+    python -m bench.transfer_harness --transfers 5000 --concurrency 1,4,16,32
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from bson import ObjectId
+from pymongo import MongoClient, monitoring
+
+from bench.mongod import local_mongod
+
+WRITE_CONFLICT = 112
+
+
+class TransactionCounter(monitoring.CommandListener):
+    """Counts transaction outcomes seen on the wire."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.commits = 0
+            self.aborts = 0
+            self.write_conflicts = 0
+            self.transient_errors = 0
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        if event.command_name in ('commitTransaction', 'abortTransaction'):
+            with self.lock:
+                if event.command_name == 'commitTransaction':
+                    self.commits += 1
+                else:
+                    self.aborts += 1
+
+    def failed(self, event):
+        failure = event.failure or {}
+        with self.lock:
+            if failure.get('code') == WRITE_CONFLICT:
+                self.write_conflicts += 1
+            if 'TransientTransactionError' in failure.get('errorLabels', ()):
+                self.transient_errors += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {'commits': self.commits, 'aborts': self.aborts,
+                    'write_conflicts': self.write_conflicts, 'transient_errors': self.transient_errors}
+
+
+def seed_accounts(db, users, accounts_per_user, opening_balance_minor):
+    """Insert users and accounts; return [(user_id, account_id)]."""
+    from models.bank_account import BankAccount
+    from models.user import User
+
+    owners, user_docs, account_docs = [], [], []
+    for i in range(users):
+        user = User(name=f'Transfer User {i}', email=f'transfer{i}@example.com',
+                    password_hash='!', _id=ObjectId())
+        doc = user.to_bson()
+        doc['account_count'] = accounts_per_user
+        user_docs.append(doc)
+        for j in range(accounts_per_user):
+            account = BankAccount(
+                user_id=user._id,
+                account_number=f'{i:06d}{j:06d}',
+                account_holder_name=user.name,
+                bank_name='KetStroke Bank',
+                ifsc_code='KSB0000001',
+                account_type='savings',
+                balance_minor=opening_balance_minor,
+                is_primary=j == 0,
+                _id=ObjectId()
+            )
+            account_docs.append(account.to_bson())
+            owners.append((str(user._id), str(account._id)))
+    db.users.insert_many(user_docs)
+    db.bank_accounts.insert_many(account_docs)
+    return owners
+
+
+def check_invariants(db, opening):
+    """Return a list of violated invariants (empty when all hold)."""
+    problems = []
+    balances = {doc['_id']: doc.get('balance_minor', 0)
+                for doc in db.bank_accounts.find({}, {'balance_minor': 1})}
+
+    if sum(balances.values()) != sum(opening.values()):
+        problems.append(f"money not conserved: {sum(opening.values())} -> {sum(balances.values())}")
+
+    negative = [str(_id) for _id, balance in balances.items() if balance < 0]
+    if negative:
+        problems.append(f"negative balances on {len(negative)} accounts: {negative[:5]}")
+
+    duplicates = list(db.transactions.aggregate([
+        {'$group': {'_id': '$reference', 'n': {'$sum': 1}}},
+        {'$match': {'n': {'$gt': 1}}},
+        {'$limit': 5}
+    ]))
+    if duplicates:
+        problems.append(f"duplicate references: {[d['_id'] for d in duplicates]}")
+
+    expected = dict(opening)
+    for doc in db.transactions.find({'status': 'completed', 'transaction_type': 'transfer'},
+                                    {'account_id': 1, 'recipient_account_id': 1, 'amount_minor': 1}):
+        expected[doc['account_id']] -= doc['amount_minor']
+        expected[doc['recipient_account_id']] += doc['amount_minor']
+    drifted = [str(_id) for _id, balance in balances.items() if balance != expected.get(_id)]
+    if drifted:
+        problems.append(f"balances disagree with the ledger on {len(drifted)} accounts: {drifted[:5]}")
+    return problems
+
+
+def run_round(client, tokens, owners, transfers, concurrency, max_amount_minor, seed_value):
+    """Fire `transfers` transfers from `concurrency` threads; return status counts and elapsed time."""
+    account_ids = [account_id for _, account_id in owners]
+    statuses = {}
+    lock = threading.Lock()
+
+    def fire(index):
+        rng = random.Random(seed_value * 1_000_003 + index)
+        user_id, account_id = rng.choice(owners)
+        recipient = rng.choice([a for a in account_ids if a != account_id])
+        response = client.post('/api/transactions', json={
+            'account_id': account_id,
+            'recipient_account_id': recipient,
+            'amount': f'{rng.randint(1, max_amount_minor) / 100:.2f}',
+            'transaction_type': 'transfer',
+            'description': 'harness'
+        }, headers={'Authorization': f'Bearer {tokens[user_id]}'})
+        with lock:
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(fire, range(transfers)))
+    return statuses, time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Concurrent transfer correctness and throughput harness')
+    parser.add_argument('--transfers', type=int, default=5000, help='transfers per concurrency level')
+    parser.add_argument('--concurrency', default='1,4,16,32', help='comma-separated thread counts')
+    parser.add_argument('--users', type=int, default=4)
+    parser.add_argument('--accounts-per-user', type=int, default=2)
+    parser.add_argument('--opening-balance', type=int, default=100_000, help='minor units per account')
+    parser.add_argument('--max-amount', type=int, default=20_000,
+                        help='largest transfer in minor units; large values exercise insufficient funds')
+    parser.add_argument('--mongo-uri', help='use a running replica set instead of starting mongod')
+    parser.add_argument('--mongod', default='mongod', help='mongod binary to start')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+    levels = [int(level) for level in args.concurrency.split(',')]
+
+    counter = TransactionCounter()
+    # Must be registered before the app creates its MongoClient
+    monitoring.register(counter)
+
+    with ExitStack() as stack:
+        mongo_uri = args.mongo_uri or stack.enter_context(local_mongod(binary=args.mongod))
+        db = MongoClient(mongo_uri).get_default_database('ketstrokebank')
+        db.client.drop_database(db.name)
+        owners = seed_accounts(db, args.users, args.accounts_per_user, args.opening_balance)
+        opening = {ObjectId(account_id): args.opening_balance for _, account_id in owners}
+
+        # Risk rules would step up most of these synthetic transfers
+        os.environ.update(MONGODB_URI=mongo_uri, RISK_STEP_UP_SCORE='2', RISK_DENY_SCORE='2')
+        import logging
+        import app as app_module
+        from flask_jwt_extended import create_access_token
+        application = app_module.create_app()
+        logging.getLogger().setLevel(logging.ERROR)
+        with application.app_context():
+            tokens = {user_id: create_access_token(identity=user_id) for user_id, _ in owners}
+        client = application.test_client()
+
+        failed = False
+        for level in levels:
+            counter.reset()
+            statuses, elapsed = run_round(client, tokens, owners, args.transfers, level,
+                                          args.max_amount, args.seed + level)
+            counts = counter.snapshot()
+            committed = statuses.get(201, 0)
+            attempts = counts['commits'] + counts['transient_errors']
+            problems = check_invariants(db, opening)
+            failed = failed or bool(problems)
+            print(f"concurrency {level:>3}: {committed / elapsed:8.1f} commits/s  "
+                  f"statuses {dict(sorted(statuses.items()))}  "
+                  f"write conflicts {counts['write_conflicts']}  "
+                  f"retry rate {counts['transient_errors'] / attempts if attempts else 0.0:.3f}  "
+                  f"{'OK' if not problems else 'FAILED'}")
+            for problem in problems:
+                print(f"    {problem}")
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -16,6 +16,12 @@ class JSONEncoder(json.JSONEncoder):
             return str(o)
         return json.JSONEncoder.default(self, o)
 
+def command_listeners(app):
+    """Configure the pymongo command listeners every app client gets."""
+    from services.slow_queries import slow_query_log
+    slow_query_log.init_app(app)
+    return [slow_query_log]
+
 # Initialize the app with extensions
 def init_app(app):
     # Initialize MongoDB
@@ -39,7 +45,8 @@ def init_app(app):
             connect=False,
             maxPoolsize=1,
             ssl=True,
-            ssl_cert_reqs=ssl.CERT_NONE
+            ssl_cert_reqs=ssl.CERT_NONE,
+            event_listeners=command_listeners(app)
         )
         
         # Test the connection
@@ -58,3 +65,13 @@ def init_app(app):
     app.json_encoder = JSONEncoder
     
     return app
+
+def run_in_transaction(callback, write_concern=None):
+    """Run callback(session) in a multi-document transaction.
+
+    with_transaction retries the whole callback on transient errors such as
+    write conflicts, so callbacks must not keep side effects outside Mongo.
+    write_concern applies to the commit; None keeps the client default.
+    """
+    with mongo.cx.start_session() as session:
+        return session.with_transaction(callback, write_concern=write_concern)
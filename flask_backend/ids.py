@@ -0,0 +1,26 @@
+"""Typed accessors for document references.
+
+Every reference field (`user_id`, `account_id`, `recipient_account_id`) is
+stored as an ObjectId, so lookups are a single indexed equality match.
+Kept outside the models package so services can use it without importing
+the models (which import the services).
+"""
+from bson import ObjectId
+from bson.errors import InvalidId
+
+
+def object_id(value):
+    """Return `value` as an ObjectId; raises InvalidId for anything else."""
+    if isinstance(value, ObjectId):
+        return value
+    if not isinstance(value, str):
+        raise InvalidId(f"{value!r} is not a valid ObjectId")
+    return ObjectId(value)
+
+
+def optional_object_id(value):
+    return object_id(value) if value else None
+
+
+def is_object_id(value):
+    return isinstance(value, ObjectId) or (isinstance(value, str) and ObjectId.is_valid(value))
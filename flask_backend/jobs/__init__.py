@@ -0,0 +1,3 @@
+# This makes the jobs directory a Python package
+# Batch jobs are run as modules from the flask_backend directory, e.g.
+#   python -m jobs.rescore_behavior --help
@@ -0,0 +1,86 @@
+import os
+import time
+from datetime import datetime
+from dotenv import load_dotenv
+from pymongo import MongoClient, ReadPreference
+
+# Load environment variables (same .env as the API)
+load_dotenv()
+
+DEFAULT_MONGO_URI = 'mongodb://localhost:27017/ketstrokebank'
+DEFAULT_DB_NAME = 'ketstrokebank'
+
+
+def get_db(uri=None, **client_kwargs):
+    """Return the application database for a batch job.
+
+    Jobs open their own small client instead of going through Flask-PyMongo so
+    they can run outside an app context and in worker processes.
+    """
+    client_kwargs.setdefault('maxPoolSize', 4)
+    client = MongoClient(uri or os.getenv('MONGODB_URI', DEFAULT_MONGO_URI), **client_kwargs)
+    return client.get_default_database(DEFAULT_DB_NAME)
+
+
+def secondary_preferred(collection):
+    """Route a job's bulk reads away from the primary serving the live API."""
+    return collection.with_options(read_preference=ReadPreference.SECONDARY_PREFERRED)
+
+
+def id_partitions(collection, size):
+    """First `_id` of every run of `size` documents, in `_id` order.
+
+    Range i is bounds[i] <= _id < bounds[i + 1]; the last one is open-ended.
+    """
+    bounds = []
+    cursor = secondary_preferred(collection).find({}, {'_id': 1}).sort('_id', 1).batch_size(10000)
+    for position, doc in enumerate(cursor):
+        if position % size == 0:
+            bounds.append(doc['_id'])
+    return bounds
+
+
+def lower_priority(niceness=10):
+    """Drop the current process's CPU priority so live requests win."""
+    try:
+        os.nice(niceness)
+    except (AttributeError, OSError):
+        pass  # Not supported on this platform
+
+
+def throttle(seconds):
+    """Pause between batches; a no-op when seconds is 0."""
+    if seconds and seconds > 0:
+        time.sleep(seconds)
+
+
+def load_checkpoint(db, job):
+    """Return the saved state for `job`, or {} on a fresh run."""
+    state = db.job_state.find_one({'_id': job})
+    return state.get('state', {}) if state else {}
+
+
+def save_checkpoint(db, job, state):
+    db.job_state.update_one(
+        {'_id': job},
+        {'$set': {'state': state, 'updated_at': datetime.utcnow()}},
+        upsert=True
+    )
+
+
+def clear_checkpoint(db, job):
+    db.job_state.delete_one({'_id': job})
+
+
+def model_app(uri=None):
+    """Bare Flask app with Flask-PyMongo initialised, for calling model methods.
+
+    Use as `with model_app().app_context(): BankAccount.ensure_indexes()`.
+    """
+    from flask import Flask
+    from extensions import mongo
+
+    app = Flask('jobs')
+    app.config['MONGO_URI'] = uri or os.getenv('MONGODB_URI', DEFAULT_MONGO_URI)
+    mongo.init_app(app)
+    return app
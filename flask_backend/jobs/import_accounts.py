@@ -0,0 +1,61 @@
+"""Bulk-import bank accounts and their transactions from a CSV or NDJSON file.
+
+Command-line counterpart of POST /api/accounts/import for migrations, where
+one file holds many customers: every row names its owner with a `user_id`
+or `user_email` column. Transaction rows (`record` = transaction) may also
+name a recipient of another customer by `recipient_account_id`. Rows go
+through the same validation and batched unordered writes as the API; failed
+rows are printed with their row number (or written to --errors as NDJSON).
+
+Usage:
+    python -m jobs.import_accounts customers.csv --batch-size 2000
+    python -m jobs.import_accounts - --format ndjson < customers.ndjson
+"""
+import argparse
+import json
+import logging
+import sys
+
+from jobs.common import model_app
+from models.account_import import AccountImporter, iter_rows, FORMATS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def import_file(stream, fmt, batch_size=1000, max_errors=100000):
+    importer = AccountImporter(batch_size=batch_size, max_errors=max_errors)
+    return importer.run(iter_rows(stream, fmt))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bulk-import bank accounts and transactions')
+    parser.add_argument('path', help="CSV or NDJSON file, or '-' for stdin")
+    parser.add_argument('--format', choices=FORMATS, default=None,
+                        help='input format (default: from the file extension, else csv)')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--errors', default=None, help='write failed rows to this NDJSON file')
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ('ndjson' if args.path.endswith(('.ndjson', '.jsonl')) else 'csv')
+    with model_app().app_context():
+        if args.path == '-':
+            result = import_file(sys.stdin.buffer, fmt, batch_size=args.batch_size)
+        else:
+            with open(args.path, 'rb') as stream:
+                result = import_file(stream, fmt, batch_size=args.batch_size)
+
+    if args.errors:
+        with open(args.errors, 'w') as out:
+            for error in result.errors:
+                out.write(json.dumps(error) + '\n')
+    else:
+        for error in result.errors:
+            logger.warning(f"Row {error['row']}: {error['message']}")
+    logger.info(f"Imported {result.inserted} accounts and {result.inserted_transactions} transactions "
+                f"from {result.rows} rows, {result.failed} failed")
+    raise SystemExit(1 if result.failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Online migration of float money fields to integer minor units.
+
+Folds `bank_accounts.balance` into `balance_minor` and `transactions.amount`
+into `amount_minor` with a single server-side update pipeline per batch, so a
+concurrent `$inc` on `balance_minor` is never lost. Documents already folded
+no longer match the filter, which makes the job safe to stop and re-run.
+
+Usage:
+    python -m jobs.migrate_money --batch-size 1000 --sleep 0.05
+"""
+import argparse
+import logging
+
+from models.money import MINOR_PER_UNIT
+from jobs.common import get_db, throttle
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# collection -> (legacy float field, integer minor-unit field)
+FIELDS = {
+    'bank_accounts': ('balance', 'balance_minor'),
+    'transactions': ('amount', 'amount_minor'),
+}
+
+
+def fold_pipeline(legacy_field, minor_field):
+    return [
+        {'$set': {minor_field: {'$add': [
+            {'$toLong': {'$ifNull': [f'${minor_field}', 0]}},
+            # A null legacy field counts as 0 rather than nulling the sum
+            {'$toLong': {'$round': [{'$multiply': [{'$ifNull': [f'${legacy_field}', 0]}, MINOR_PER_UNIT]}, 0]}}
+        ]}}},
+        {'$unset': legacy_field}
+    ]
+
+
+def migrate_collection(db, name, batch_size=1000, sleep=0.0, dry_run=False):
+    legacy_field, minor_field = FIELDS[name]
+    collection = db[name]
+    legacy_filter = {legacy_field: {'$exists': True}}
+    pipeline = fold_pipeline(legacy_field, minor_field)
+
+    migrated = 0
+    last_id = None
+    while True:
+        # Walk by _id so every batch is an index range scan
+        query = dict(legacy_filter)
+        if last_id is not None:
+            query['_id'] = {'$gt': last_id}
+        ids = [doc['_id'] for doc in collection.find(query, {'_id': 1}).sort('_id', 1).limit(batch_size)]
+        if not ids:
+            break
+        last_id = ids[-1]
+
+        if dry_run:
+            migrated += len(ids)
+        else:
+            result = collection.update_many({'_id': {'$in': ids}, **legacy_filter}, pipeline)
+            migrated += result.modified_count
+        throttle(sleep)
+
+    logger.info(f"{name}: folded {legacy_field} into {minor_field} on {migrated} documents")
+    return migrated
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Migrate float money fields to integer minor units')
+    parser.add_argument('--collection', choices=sorted(FIELDS), action='append',
+                        help='collection to migrate (default: all)')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--sleep', type=float, default=0.0, help='seconds to pause between batches')
+    parser.add_argument('--dry-run', action='store_true', help='count documents without updating them')
+    args = parser.parse_args(argv)
+
+    db = get_db()
+    for name in args.collection or sorted(FIELDS):
+        migrate_collection(db, name, batch_size=args.batch_size, sleep=args.sleep, dry_run=args.dry_run)
+
+
+if __name__ == '__main__':
+    main()
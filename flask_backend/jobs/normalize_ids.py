@@ -0,0 +1,96 @@
+"""Normalize reference fields stored as strings to ObjectId.
+
+Older code stored `transactions.user_id`, `account_id` and
+`recipient_account_id` (and some `bank_accounts.user_id`) as hex strings.
+The models now write and query ObjectIds only, so this job walks each
+collection in `_id` order and converts the strings server-side with
+`$toObjectId`. Progress is checkpointed in `job_state`, so an interrupted run
+resumes where it stopped. Run it once after deploying, and again with
+--restart to sweep up anything written by old workers during the rollout.
+
+Usage:
+    python -m jobs.normalize_ids --batch-size 2000 --sleep 0.05
+"""
+import argparse
+import logging
+
+from bson import ObjectId
+
+from jobs.common import get_db, throttle, load_checkpoint, save_checkpoint, clear_checkpoint
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+JOB = 'normalize_ids'
+
+REFERENCE_FIELDS = {
+    'bank_accounts': ('user_id',),
+    'transactions': ('user_id', 'account_id', 'recipient_account_id'),
+}
+
+
+def normalize_collection(db, name, batch_size=1000, sleep=0.0, dry_run=False):
+    fields = REFERENCE_FIELDS[name]
+    collection = db[name]
+    state = load_checkpoint(db, JOB)
+    last_id = state.get(name)
+    converted = {field: 0 for field in fields}
+    invalid = {field: 0 for field in fields}
+
+    projection = {field: 1 for field in fields}
+    while True:
+        query = {'_id': {'$gt': last_id}} if last_id is not None else {}
+        docs = list(collection.find(query, projection).sort('_id', 1).limit(batch_size))
+        if not docs:
+            break
+
+        for field in fields:
+            ids, bad = [], 0
+            for doc in docs:
+                value = doc.get(field)
+                if isinstance(value, str) and value:
+                    if ObjectId.is_valid(value):
+                        ids.append(doc['_id'])
+                    else:
+                        bad += 1
+            invalid[field] += bad
+            if ids and not dry_run:
+                # Re-check the type in the filter so a concurrent writer is never clobbered
+                result = collection.update_many(
+                    {'_id': {'$in': ids}, field: {'$type': 'string'}},
+                    [{'$set': {field: {'$toObjectId': f'${field}'}}}]
+                )
+                converted[field] += result.modified_count
+            elif ids:
+                converted[field] += len(ids)
+
+        last_id = docs[-1]['_id']
+        if not dry_run:
+            state[name] = last_id
+            save_checkpoint(db, JOB, state)
+        throttle(sleep)
+
+    for field in fields:
+        logger.info(f"{name}.{field}: converted {converted[field]}, left {invalid[field]} non-ObjectId strings")
+    return converted, invalid
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Normalize reference fields to ObjectId')
+    parser.add_argument('--collection', choices=sorted(REFERENCE_FIELDS), action='append',
+                        help='collection to normalize (default: all)')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--sleep', type=float, default=0.0, help='seconds to pause between batches')
+    parser.add_argument('--restart', action='store_true', help='ignore the saved checkpoint')
+    parser.add_argument('--dry-run', action='store_true', help='count documents without updating them')
+    args = parser.parse_args(argv)
+
+    db = get_db()
+    if args.restart:
+        clear_checkpoint(db, JOB)
+    for name in args.collection or sorted(REFERENCE_FIELDS):
+        normalize_collection(db, name, batch_size=args.batch_size, sleep=args.sleep, dry_run=args.dry_run)
+
+
+if __name__ == '__main__':
+    main()
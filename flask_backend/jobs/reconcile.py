@@ -0,0 +1,250 @@
+"""Balance reconciliation: every account's balance against its ledger.
+
+An account's balance must equal its opening balance plus its completed
+transactions as applied by Transaction.apply: deposits added, withdrawals
+and outgoing transfers subtracted, incoming transfers added; other types
+(such as payments) do not move money. The check runs
+entirely server-side: one aggregation per range of accounts looks up each
+account's ledger totals over the (account_id, created_at) and
+(recipient_account_id, created_at) indexes, adds the range's archived
+incoming transfers totalled in one pass over the archive, and returns only
+the accounts that disagree.
+
+Ranges are checked concurrently. A full run walks all accounts in `_id`
+ranges; --incremental only checks accounts whose balance or transactions
+changed since the last run's watermark (kept in `job_state`, with a
+--lookback overlap for clock skew between API hosts), so it can run hourly.
+Where the server supports it each check reads one snapshot; discrepancies
+are re-checked once before being reported, so a transfer committing
+mid-check is not flagged.
+
+Accounts created before `opening_balance_minor` was recorded are counted as
+unbaselined and skipped. --baseline records their opening balance from the
+current balance and ledger; run it once, in a quiet window. Balances edited
+through PUT /api/accounts bypass the ledger and are reported.
+
+Discrepancies are logged and stored in `balance_discrepancies`.
+
+Usage:
+    python -m jobs.reconcile --workers 8
+    python -m jobs.reconcile --incremental
+"""
+import argparse
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from pymongo.errors import ConfigurationError, OperationFailure
+
+from jobs.common import get_db, secondary_preferred, id_partitions, load_checkpoint, save_checkpoint
+from models.money import AMOUNT_MINOR, BALANCE_MINOR
+from models.transaction import ARCHIVE_COLLECTION, TIERING_JOB, DEBIT_TYPES
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+JOB = 'reconcile'
+REPORTS = 'balance_discrepancies'
+
+# Signed effect of a transaction on its own account, and of a transfer on the recipient,
+# as Transaction.apply moves money: other transaction types leave balances alone
+OWN_EFFECT = {'$switch': {
+    'branches': [
+        {'case': {'$eq': ['$transaction_type', 'deposit']}, 'then': AMOUNT_MINOR},
+        {'case': {'$in': ['$transaction_type', list(DEBIT_TYPES)]}, 'then': {'$subtract': [0, AMOUNT_MINOR]}},
+    ],
+    'default': 0
+}}
+INCOMING_EFFECT = AMOUNT_MINOR
+
+
+def _ledger_lookups(tiers):
+    """$lookup stages totalling each account's ledger, and the expression adding them up.
+
+    Incoming transfers in the archive are not looked up per account; see
+    _archived_incoming.
+    """
+    stages, totals = [], []
+    for tier in tiers:
+        reads = [('account_id', {'status': 'completed'}, OWN_EFFECT)]
+        if tier != ARCHIVE_COLLECTION:
+            reads.append(('recipient_account_id', {'status': 'completed', 'transaction_type': 'transfer'},
+                          INCOMING_EFFECT))
+        for field, match, effect in reads:
+            name = f'{tier}_{field}'
+            stages.append({'$lookup': {
+                'from': tier,
+                'localField': '_id',
+                'foreignField': field,
+                'pipeline': [{'$match': match}, {'$group': {'_id': None, 'net': {'$sum': effect}}}],
+                'as': name
+            }})
+            totals.append({'$sum': f'${name}.net'})
+    return stages, {'$add': totals}
+
+
+def _archived_incoming(match):
+    """Stages adding the range's archived incoming transfers to each account's ledger_minor.
+
+    A time-series archive on MongoDB 5.x cannot index recipient_account_id,
+    so a per-account lookup would scan it once per account. Instead the
+    range's transfers are totalled by one $match and $group, unioned in and
+    summed per account. Recipients outside the accounts being checked have
+    no balance and are dropped.
+    """
+    return [
+        {'$unionWith': {'coll': ARCHIVE_COLLECTION, 'pipeline': [
+            {'$match': {'recipient_account_id': match['_id'], 'status': 'completed',
+                        'transaction_type': 'transfer'}},
+            {'$group': {'_id': '$recipient_account_id', 'ledger_minor': {'$sum': INCOMING_EFFECT}}}
+        ]}},
+        {'$group': {
+            '_id': '$_id',
+            'user_id': {'$max': '$user_id'},
+            'balance_minor': {'$max': '$balance_minor'},
+            'opening_balance_minor': {'$max': '$opening_balance_minor'},
+            'ledger_minor': {'$sum': '$ledger_minor'}
+        }},
+        {'$match': {'balance_minor': {'$ne': None}}}
+    ]
+
+
+def _ledger_stages(match, tiers, baselined):
+    """Stages yielding {user_id, balance_minor, opening_balance_minor, ledger_minor} per account."""
+    lookups, ledger = _ledger_lookups(tiers)
+    stages = [{'$match': dict(match, opening_balance_minor={'$exists': baselined})}] + lookups + [
+        {'$project': {
+            'user_id': 1,
+            'balance_minor': BALANCE_MINOR,
+            'opening_balance_minor': 1,
+            'ledger_minor': ledger
+        }}
+    ]
+    if ARCHIVE_COLLECTION in tiers:
+        stages += _archived_incoming(match)
+    return stages
+
+
+def check_pipeline(match, tiers):
+    return _ledger_stages(match, tiers, True) + [
+        {'$project': {
+            'user_id': 1,
+            'balance_minor': 1,
+            'expected_minor': {'$add': ['$opening_balance_minor', '$ledger_minor']}
+        }},
+        {'$match': {'$expr': {'$ne': ['$balance_minor', '$expected_minor']}}}
+    ]
+
+
+def baseline_pipeline(match, tiers):
+    return _ledger_stages(match, tiers, False) + [
+        {'$project': {'opening_balance_minor': {'$subtract': ['$balance_minor', '$ledger_minor']}}},
+        {'$merge': {'into': 'bank_accounts', 'on': '_id', 'whenMatched': 'merge', 'whenNotMatched': 'discard'}}
+    ]
+
+
+def _aggregate(db, pipeline):
+    accounts = secondary_preferred(db.bank_accounts)
+    try:
+        with db.client.start_session(snapshot=True) as session:
+            return list(accounts.aggregate(pipeline, session=session))
+    except (ConfigurationError, OperationFailure):
+        # Standalone server or before 5.0: no snapshot reads
+        return list(accounts.aggregate(pipeline))
+
+
+def check(db, match, tiers, baseline=False):
+    """(discrepancies, unbaselined count) for the accounts matching match."""
+    if baseline:
+        db.bank_accounts.aggregate(baseline_pipeline(match, tiers))
+        unbaselined = 0
+    else:
+        unbaselined = db.bank_accounts.count_documents(dict(match, opening_balance_minor={'$exists': False}))
+
+    found = _aggregate(db, check_pipeline(match, tiers))
+    if found:
+        found = _aggregate(db, check_pipeline({'_id': {'$in': [doc['_id'] for doc in found]}}, tiers))
+    return found, unbaselined
+
+
+def touched_accounts(db, since):
+    """Ids of accounts whose balance or transactions changed since `since`."""
+    ids = {doc['_id'] for doc in secondary_preferred(db.bank_accounts)
+           .find({'updated_at': {'$gte': since}}, {'_id': 1})}
+    rows = secondary_preferred(db.transactions).aggregate([
+        {'$match': {'updated_at': {'$gte': since}}},
+        {'$project': {'ids': ['$account_id', '$recipient_account_id']}},
+        {'$unwind': '$ids'},
+        {'$group': {'_id': '$ids'}}
+    ])
+    ids.update(row['_id'] for row in rows if row['_id'] is not None)
+    return sorted(ids)
+
+
+def run(workers=4, partition_size=5000, incremental=False, lookback=300, baseline=False, uri=None):
+    db = get_db(uri, maxPoolSize=workers + 2)
+    started_at = datetime.utcnow()
+    state = load_checkpoint(db, JOB)
+
+    tiers = ['transactions']
+    if load_checkpoint(db, TIERING_JOB).get('cutoff') is not None:
+        tiers.append(ARCHIVE_COLLECTION)
+
+    if incremental and state.get('watermark'):
+        since = state['watermark'] - timedelta(seconds=lookback)
+        ids = touched_accounts(db, since)
+        matches = [{'_id': {'$in': ids[i:i + partition_size]}} for i in range(0, len(ids), partition_size)]
+        logger.info(f"{len(ids)} accounts touched since {since.isoformat()}")
+    else:
+        bounds = id_partitions(db.bank_accounts, partition_size)
+        matches = []
+        for index, lo in enumerate(bounds):
+            id_range = {'$gte': lo}
+            if index + 1 < len(bounds):
+                id_range['$lt'] = bounds[index + 1]
+            matches.append({'_id': id_range})
+
+    discrepancies, unbaselined = [], 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for found, skipped in pool.map(lambda match: check(db, match, tiers, baseline), matches):
+            discrepancies.extend(found)
+            unbaselined += skipped
+
+    if discrepancies:
+        db[REPORTS].insert_many([{
+            'account_id': doc['_id'],
+            'user_id': doc.get('user_id'),
+            'balance_minor': doc['balance_minor'],
+            'expected_minor': doc['expected_minor'],
+            'difference_minor': doc['balance_minor'] - doc['expected_minor'],
+            'run_at': started_at
+        } for doc in discrepancies], ordered=False)
+    for doc in discrepancies:
+        logger.warning(f"Account {doc['_id']}: balance {doc['balance_minor']}, ledger says {doc['expected_minor']}")
+
+    state['watermark'] = started_at
+    save_checkpoint(db, JOB, state)
+    logger.info(f"Checked {len(matches)} batches: {len(discrepancies)} discrepancies, "
+                f"{unbaselined} accounts without an opening balance")
+    return discrepancies
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Reconcile account balances against the ledger')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--partition-size', type=int, default=5000, help='accounts per aggregation')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only check accounts touched since the last run')
+    parser.add_argument('--lookback', type=float, default=300,
+                        help='seconds of overlap with the previous run in incremental mode')
+    parser.add_argument('--baseline', action='store_true',
+                        help='record opening balances for accounts that have none')
+    args = parser.parse_args(argv)
+
+    discrepancies = run(workers=args.workers, partition_size=args.partition_size, incremental=args.incremental,
+                        lookback=args.lookback, baseline=args.baseline)
+    raise SystemExit(1 if discrepancies else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,234 @@
+"""Offline re-scoring of stored typing sessions and per-user threshold calibration.
+
+Streams `behavior_sessions` from MongoDB grouped by user, scores every session
+against that user's genuine template in a process pool, computes the FAR/FRR
+curve and writes the calibrated threshold to `behavior_thresholds`.
+
+Expected session shape:
+    {'user_id': ObjectId, 'features': [float, ...], 'genuine': bool}
+
+Usage:
+    python -m jobs.rescore_behavior --chunk-users 200 --workers 4
+"""
+import argparse
+import importlib
+import logging
+from array import array
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+
+from pymongo import UpdateOne
+from pymongo.write_concern import WriteConcern
+
+from jobs.common import get_db, secondary_preferred, lower_priority, throttle
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SESSIONS = 'behavior_sessions'
+THRESHOLDS = 'behavior_thresholds'
+
+
+def manhattan_score(features, template, spread):
+    """Default scorer: 1 / (1 + scaled Manhattan distance). Higher is more genuine."""
+    distance = 0.0
+    for value, mean, dev in zip(features, template, spread):
+        distance += abs(value - mean) / (dev or 1.0)
+    return 1.0 / (1.0 + distance / max(len(template), 1))
+
+
+def build_template(genuine_vectors):
+    """Per-feature mean and mean absolute deviation of the genuine sessions."""
+    n = len(genuine_vectors)
+    width = min(len(v) for v in genuine_vectors)
+    template = [sum(v[i] for v in genuine_vectors) / n for i in range(width)]
+    spread = [sum(abs(v[i] - template[i]) for v in genuine_vectors) / n for i in range(width)]
+    return template, spread
+
+
+def calibrate(genuine_scores, impostor_scores, target_frr):
+    """Return (threshold, far, frr) at the equal error rate.
+
+    Without impostor sessions FAR is unknown, so the threshold is placed at
+    the `target_frr` quantile of the genuine scores instead.
+    """
+    genuine_scores = sorted(genuine_scores)
+    if not impostor_scores:
+        index = min(int(len(genuine_scores) * target_frr), len(genuine_scores) - 1)
+        threshold = genuine_scores[index]
+        frr = sum(1 for s in genuine_scores if s < threshold) / len(genuine_scores)
+        return threshold, None, frr
+
+    impostor_scores = sorted(impostor_scores)
+    best = None
+    g_below = i_below = 0
+    for threshold in sorted(set(genuine_scores) | set(impostor_scores)):
+        # Both lists are sorted, so the "score < threshold" counts only move forward
+        while g_below < len(genuine_scores) and genuine_scores[g_below] < threshold:
+            g_below += 1
+        while i_below < len(impostor_scores) and impostor_scores[i_below] < threshold:
+            i_below += 1
+        frr = g_below / len(genuine_scores)
+        far = (len(impostor_scores) - i_below) / len(impostor_scores)
+        if best is None or abs(far - frr) < abs(best[1] - best[2]):
+            best = (threshold, far, frr)
+    return best
+
+
+def _load_scorer(path):
+    if not path:
+        return manhattan_score
+    module_name, _, attr = path.partition(':')
+    return getattr(importlib.import_module(module_name), attr)
+
+
+def _init_worker(scorer_path):
+    global _scorer
+    lower_priority()
+    _scorer = _load_scorer(scorer_path)
+
+
+def score_users(batch, target_frr):
+    """Worker entry point: score and calibrate a batch of users.
+
+    `batch` is a list of (user_id, [(session_id, features, genuine), ...]) where
+    features are packed `array('d')` buffers to keep the pickled payload small.
+    """
+    results = []
+    for user_id, sessions in batch:
+        genuine = [features for _, features, is_genuine in sessions if is_genuine]
+        if not genuine:
+            continue  # Nothing enrolled yet, leave the user uncalibrated
+        template, spread = build_template(genuine)
+
+        scores = []
+        genuine_scores, impostor_scores = [], []
+        for session_id, features, is_genuine in sessions:
+            score = _scorer(features, template, spread)
+            scores.append((session_id, score))
+            (genuine_scores if is_genuine else impostor_scores).append(score)
+
+        threshold, far, frr = calibrate(genuine_scores, impostor_scores, target_frr)
+        results.append({
+            'user_id': user_id,
+            'scores': scores,
+            'threshold': threshold,
+            'far': far,
+            'frr': frr,
+            'genuine_sessions': len(genuine_scores),
+            'impostor_sessions': len(impostor_scores),
+        })
+    return results
+
+
+def iter_user_batches(db, chunk_users, batch_size):
+    """Stream sessions ordered by user and yield batches of whole users."""
+    cursor = (secondary_preferred(db[SESSIONS])
+              .find({}, {'user_id': 1, 'features': 1, 'genuine': 1})
+              .sort('user_id', 1)
+              .batch_size(batch_size))
+
+    batch, current_user, sessions = [], None, []
+    for doc in cursor:
+        if doc['user_id'] != current_user:
+            if sessions:
+                batch.append((current_user, sessions))
+                if len(batch) >= chunk_users:
+                    yield batch
+                    batch = []
+            current_user, sessions = doc['user_id'], []
+        sessions.append((doc['_id'], array('d', doc.get('features') or []), bool(doc.get('genuine'))))
+
+    if sessions:
+        batch.append((current_user, sessions))
+    if batch:
+        yield batch
+
+
+def write_results(db, results, model_version):
+    # Scores are recomputable, so acknowledge on the primary only
+    sessions = db[SESSIONS].with_options(write_concern=WriteConcern(w=1))
+    thresholds = db[THRESHOLDS].with_options(write_concern=WriteConcern(w=1))
+    now = datetime.utcnow()
+
+    session_ops, threshold_ops = [], []
+    for result in results:
+        for session_id, score in result['scores']:
+            session_ops.append(UpdateOne(
+                {'_id': session_id},
+                {'$set': {'score': score, 'model_version': model_version}}
+            ))
+        threshold_ops.append(UpdateOne(
+            {'user_id': result['user_id']},
+            {'$set': {
+                'threshold': result['threshold'],
+                'far': result['far'],
+                'frr': result['frr'],
+                'genuine_sessions': result['genuine_sessions'],
+                'impostor_sessions': result['impostor_sessions'],
+                'model_version': model_version,
+                'calibrated_at': now
+            }},
+            upsert=True
+        ))
+
+    if session_ops:
+        sessions.bulk_write(session_ops, ordered=False)
+    if threshold_ops:
+        thresholds.bulk_write(threshold_ops, ordered=False)
+
+
+def run(workers=2, chunk_users=200, batch_size=1000, max_in_flight=None,
+        target_frr=0.05, scorer=None, model_version=None, sleep=0.0):
+    db = get_db()
+    db[SESSIONS].create_index('user_id')
+    db[THRESHOLDS].create_index('user_id', unique=True)
+
+    model_version = model_version or datetime.utcnow().strftime('%Y%m%d%H%M%S')
+    max_in_flight = max_in_flight or workers * 2
+    users_done = 0
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(scorer,)) as pool:
+        pending = set()
+        for batch in iter_user_batches(db, chunk_users, batch_size):
+            # Bound the number of queued batches so memory stays flat
+            while len(pending) >= max_in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results = future.result()
+                    write_results(db, results, model_version)
+                    users_done += len(results)
+                throttle(sleep)
+            pending.add(pool.submit(score_users, batch, target_frr))
+
+        for future in pending:
+            results = future.result()
+            write_results(db, results, model_version)
+            users_done += len(results)
+
+    logger.info(f"Calibrated {users_done} users (model version {model_version})")
+    return users_done
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Re-score typing sessions and calibrate per-user thresholds')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--chunk-users', type=int, default=200, help='users per worker task')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Mongo cursor batch size')
+    parser.add_argument('--max-in-flight', type=int, default=None)
+    parser.add_argument('--target-frr', type=float, default=0.05,
+                        help='FRR used when a user has no impostor sessions')
+    parser.add_argument('--scorer', default=None, help='custom scorer as module:function')
+    parser.add_argument('--model-version', default=None)
+    parser.add_argument('--sleep', type=float, default=0.0, help='seconds to pause between batches')
+    args = parser.parse_args(argv)
+
+    lower_priority()
+    run(workers=args.workers, chunk_users=args.chunk_users, batch_size=args.batch_size,
+        max_in_flight=args.max_in_flight, target_frr=args.target_frr, scorer=args.scorer,
+        model_version=args.model_version, sleep=args.sleep)
+
+
+if __name__ == '__main__':
+    main()
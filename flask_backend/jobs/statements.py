@@ -0,0 +1,285 @@
+"""Monthly account statements.
+
+For every bank account, renders the statement for one calendar month: the
+opening and closing balance, totals per category (deposits, withdrawals,
+transfers out, transfers in) and every completed ledger line in those
+categories with its running balance. Transactions moved to the archive tier are included.
+
+Balances are derived backwards from the account's current balance through
+the ledger, so they assume every balance change since the period start is a
+completed transaction. The balance and the ledger of a partition are read
+from one snapshot where the server supports it (5.0+ replica sets), so a
+transfer committing mid-read cannot skew the numbers.
+
+Incoming transfers in the archive are read once per run, grouped by
+recipient, and handed to each range: a time-series archive on MongoDB 5.x
+cannot index recipient_account_id, so per-range queries would each scan it.
+Only transfers archived after that read are looked up per range, by time.
+
+Accounts are split into `_id` ranges of --partition-size accounts and the
+ranges are rendered in a process pool. Each range is written to two files
+under --out/<YYYY-MM>/: `<first id>.csv` (one row per ledger line) and
+`<first id>.ndjson` (one statement per line, ready for a PDF renderer).
+Files are written to a temporary name and renamed, and finished ranges are
+checkpointed in `job_state`, so a crashed run resumes with the ranges it had
+not finished.
+
+Usage:
+    python -m jobs.statements --period 2026-09 --workers 8 --partition-size 2000
+"""
+import argparse
+import bisect
+import csv
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+
+from pymongo.errors import ConfigurationError, OperationFailure
+
+from jobs.common import (get_db, secondary_preferred, id_partitions, lower_priority, throttle,
+                         load_checkpoint, save_checkpoint)
+from models.bank_account import BankAccount
+from models.money import from_minor
+from models.transaction import Transaction, ARCHIVE_COLLECTION, TIERING_JOB, DEBIT_TYPES
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_OUT = 'statements'
+CATEGORIES = ('deposit', 'withdrawal', 'transfer_out', 'transfer_in')
+CSV_COLUMNS = ('account_id', 'date', 'reference', 'description', 'category', 'debit', 'credit', 'balance')
+
+
+def period_bounds(period):
+    """[start, end) datetimes of a 'YYYY-MM' period."""
+    start = datetime.strptime(period, '%Y-%m')
+    index = start.year * 12 + start.month
+    return start, datetime(index // 12, index % 12 + 1, 1)
+
+
+def previous_period(now=None):
+    now = now or datetime.utcnow()
+    index = now.year * 12 + now.month - 2
+    return f'{index // 12:04d}-{index % 12 + 1:02d}'
+
+
+def category(transaction, account_id):
+    if transaction.transaction_type == 'transfer':
+        return 'transfer_out' if transaction.account_id == account_id else 'transfer_in'
+    return transaction.transaction_type
+
+
+def effect(transaction, account_id):
+    """Signed change the transaction made to account_id's balance, in minor units.
+
+    Mirrors Transaction.apply: types other than deposits and DEBIT_TYPES move no money.
+    """
+    if transaction.account_id != account_id:
+        return transaction.amount_minor  # incoming transfer
+    if transaction.transaction_type == 'deposit':
+        return transaction.amount_minor
+    if transaction.transaction_type in DEBIT_TYPES:
+        return -transaction.amount_minor
+    return 0
+
+
+def _amount(minor):
+    return str(from_minor(minor))
+
+
+def _worker_init(uri):
+    global _db
+    lower_priority()
+    _db = get_db(uri)
+
+
+def _incoming_archived(db, start):
+    """Completed archived transfers since start, sorted by recipient, and when they were read.
+
+    Returns (docs, recipient ids in the same order, cutoff at the time of the read).
+    """
+    cutoff = load_checkpoint(db, TIERING_JOB).get('cutoff')
+    query = {'transaction_type': 'transfer', 'status': 'completed', 'created_at': {'$gte': start},
+             'recipient_account_id': {'$type': 'objectId'}}
+    docs = sorted(secondary_preferred(db[ARCHIVE_COLLECTION]).find(query).batch_size(5000),
+                  key=lambda doc: doc['recipient_account_id'])
+    return docs, [doc['recipient_account_id'] for doc in docs], cutoff
+
+
+def _ledger(db, account_range, start, archived, session, incoming=(), archived_since=None):
+    """Completed transactions touching the range since start, from both tiers.
+
+    Incoming transfers already in the archive are passed in as `incoming`;
+    only those archived after `archived_since` are read here.
+    """
+    reads = [(db.transactions, 'account_id', {}),
+             (db.transactions, 'recipient_account_id', {'transaction_type': 'transfer'})]
+    if archived:
+        reads.append((db[ARCHIVE_COLLECTION], 'account_id', {}))
+        if archived_since is not None:
+            # Moved by a tiering run since the per-run read; a short, recent time range
+            reads.append((db[ARCHIVE_COLLECTION], 'recipient_account_id',
+                          {'transaction_type': 'transfer', 'created_at': {'$gte': max(start, archived_since)}}))
+    entries = {doc['_id']: doc for doc in incoming}
+    for tier, field, extra in reads:
+        query = dict({field: account_range, 'created_at': {'$gte': start}, 'status': 'completed'}, **extra)
+        for doc in secondary_preferred(tier).find(query, session=session).batch_size(5000):
+            entries[doc['_id']] = doc  # a transaction caught mid-tiering is in both
+    return Transaction.from_bson_many(entries.values())
+
+
+def _read_partition(db, account_range, start, archived, session, incoming, archived_since):
+    accounts = BankAccount.from_bson_many(
+        secondary_preferred(db.bank_accounts).find({'_id': account_range}, session=session).sort('_id', 1))
+    return accounts, _ledger(db, account_range, start, archived, session, incoming, archived_since)
+
+
+def render_partition(index, lo, hi, period, out_dir, archived, incoming=(), archived_since=None):
+    """Worker entry point: write the statements of accounts with lo <= _id < hi.
+
+    `incoming` holds the range's archived incoming transfers read by run().
+    Returns (index, accounts rendered, ledger lines).
+    """
+    start, end = period_bounds(period)
+    account_range = {'$gte': lo}
+    if hi is not None:
+        account_range['$lt'] = hi
+
+    try:
+        with _db.client.start_session(snapshot=True) as session:
+            accounts, ledger = _read_partition(_db, account_range, start, archived, session,
+                                               incoming, archived_since)
+    except (ConfigurationError, OperationFailure):
+        # Standalone server or before 5.0: no snapshot reads
+        accounts, ledger = _read_partition(_db, account_range, start, archived, None,
+                                           incoming, archived_since)
+
+    by_account = {account._id: [] for account in accounts}
+    for transaction in ledger:
+        for account_id in (transaction.account_id, transaction.recipient_account_id):
+            if account_id in by_account and (account_id == transaction.account_id or
+                                             transaction.transaction_type == 'transfer'):
+                by_account[account_id].append(transaction)
+
+    base = os.path.join(out_dir, period, str(lo))
+    lines = 0
+    with open(base + '.csv.tmp', 'w', newline='') as csv_file, open(base + '.ndjson.tmp', 'w') as json_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(CSV_COLUMNS)
+        for account in accounts:
+            entries = sorted(by_account[account._id], key=lambda t: (t.created_at, t._id))
+            later = sum(effect(t, account._id) for t in entries if t.created_at >= end)
+            in_period = [t for t in entries if t.created_at < end]
+            closing = account.balance_minor - later
+            opening = closing - sum(effect(t, account._id) for t in in_period)
+
+            totals = dict.fromkeys(CATEGORIES, 0)
+            rows, balance = [], opening
+            for t in in_period:
+                kind = category(t, account._id)
+                if kind not in totals:
+                    continue  # moves no money, so it is not a statement line
+                change = effect(t, account._id)
+                balance += change
+                totals[kind] += t.amount_minor
+                rows.append({
+                    'date': t.created_at.isoformat(),
+                    'reference': t.reference,
+                    'description': t.description,
+                    'category': kind,
+                    'debit': _amount(-change) if change < 0 else '',
+                    'credit': _amount(change) if change >= 0 else '',
+                    'balance': _amount(balance)
+                })
+                writer.writerow([str(account._id)] + [rows[-1][column] for column in CSV_COLUMNS[1:]])
+
+            json_file.write(json.dumps({
+                'account_id': str(account._id),
+                'user_id': str(account.user_id),
+                'account_holder_name': account.account_holder_name,
+                'bank_name': account.bank_name,
+                'account_number_masked': account.to_json(('account_number_masked',))['account_number_masked'],
+                'period': period,
+                'opening_balance': _amount(opening),
+                'closing_balance': _amount(closing),
+                'totals': {kind: _amount(minor) for kind, minor in totals.items()},
+                'lines': rows
+            }) + '\n')
+            lines += len(rows)
+
+    os.replace(base + '.csv.tmp', base + '.csv')
+    os.replace(base + '.ndjson.tmp', base + '.ndjson')
+    return index, len(accounts), lines
+
+
+def run(period=None, out_dir=DEFAULT_OUT, workers=4, partition_size=2000, max_in_flight=None,
+        restart=False, sleep=0.0, uri=None):
+    period = period or previous_period()
+    start, _ = period_bounds(period)
+    job = f'statements:{period}'
+    db = get_db(uri)
+    os.makedirs(os.path.join(out_dir, period), exist_ok=True)
+
+    state = {} if restart else load_checkpoint(db, job)
+    if 'bounds' not in state:
+        # Fixed on the first run so a resumed run renders the same ranges
+        state = {'bounds': id_partitions(db.bank_accounts, partition_size), 'done': []}
+        save_checkpoint(db, job, state)
+    bounds, done = state['bounds'], set(state['done'])
+
+    cutoff = load_checkpoint(db, TIERING_JOB).get('cutoff')
+    archived = cutoff is not None and start < cutoff
+    incoming, recipients, archived_since = _incoming_archived(db, start) if archived else ([], [], None)
+    max_in_flight = max_in_flight or workers * 2
+    accounts = lines = 0
+
+    def collect(futures):
+        nonlocal accounts, lines
+        for future in futures:
+            index, rendered, written = future.result()
+            accounts += rendered
+            lines += written
+            done.add(index)
+        state['done'] = sorted(done)
+        save_checkpoint(db, job, state)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_worker_init, initargs=(uri,)) as pool:
+        pending = set()
+        for index, lo in enumerate(bounds):
+            if index in done:
+                continue
+            # The last range is open-ended so accounts opened since the first run are included
+            hi = bounds[index + 1] if index + 1 < len(bounds) else None
+            while len(pending) >= max_in_flight:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(finished)
+                throttle(sleep)
+            first = bisect.bisect_left(recipients, lo)
+            last = bisect.bisect_left(recipients, hi) if hi is not None else len(recipients)
+            pending.add(pool.submit(render_partition, index, lo, hi, period, out_dir, archived,
+                                    incoming[first:last], archived_since))
+        collect(pending)
+
+    logger.info(f"Rendered {accounts} statements with {lines} lines for {period} in {len(bounds)} ranges")
+    return accounts, lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Render monthly account statements')
+    parser.add_argument('--period', default=None, help='YYYY-MM (default: last month)')
+    parser.add_argument('--out', default=os.getenv('STATEMENTS_DIR', DEFAULT_OUT))
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--partition-size', type=int, default=2000, help='accounts per worker task')
+    parser.add_argument('--max-in-flight', type=int, default=None)
+    parser.add_argument('--sleep', type=float, default=0.0, help='seconds to pause between batches')
+    parser.add_argument('--restart', action='store_true', help='ignore the saved checkpoint')
+    args = parser.parse_args(argv)
+
+    run(period=args.period, out_dir=args.out, workers=args.workers, partition_size=args.partition_size,
+        max_in_flight=args.max_in_flight, restart=args.restart, sleep=args.sleep)
+
+
+if __name__ == '__main__':
+    main()
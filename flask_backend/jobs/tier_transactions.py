@@ -0,0 +1,163 @@
+"""Move old transactions from the hot collection to the archive tier.
+
+Transactions created before the horizon (TIERING_HORIZON_DAYS, default 180)
+are copied into `transactions_archive` and then deleted from `transactions`,
+oldest first, in batches. The archive is a time-series collection bucketed by
+account (MongoDB 5.0+), which stores years of history in a fraction of the
+space; older servers get a plain zstd-compressed collection instead. Both
+carry the (user_id, created_at) and (account_id, created_at) indexes the
+API pages on.
+
+The cutoff is published in `job_state` before anything newer than the
+previous cutoff moves, and the job then waits for API workers' cached
+cutoffs to expire. Readers use it to know which tier a page lives in, so it
+only ever moves forward.
+
+Each batch is recorded as pending before it is copied. An interrupted run
+finishes the pending batch first, skipping documents already in the
+archive, so a crash between the copy and the delete never duplicates an
+entry.
+
+Usage:
+    python -m jobs.tier_transactions --horizon-days 180 --batch-size 1000 --sleep 0.1
+"""
+import argparse
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+
+from pymongo.errors import CollectionInvalid, OperationFailure
+
+from jobs.common import get_db, throttle, load_checkpoint, save_checkpoint
+from models.transaction import ARCHIVE_COLLECTION, TIERING_JOB, CUTOFF_TTL
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_HORIZON_DAYS = 180
+ARCHIVE_INDEXES = (
+    [('user_id', 1), ('created_at', -1)],
+    [('account_id', 1), ('created_at', -1)],
+    [('recipient_account_id', 1), ('created_at', -1)],
+)
+
+
+def ensure_archive(db):
+    """Create the archive collection and its indexes if they are missing."""
+    if not db.list_collection_names(filter={'name': ARCHIVE_COLLECTION}):
+        try:
+            db.create_collection(ARCHIVE_COLLECTION, timeseries={
+                'timeField': 'created_at',
+                'metaField': 'account_id',
+                'granularity': 'hours'
+            })
+            logger.info(f"Created time-series collection {ARCHIVE_COLLECTION}")
+        except CollectionInvalid:
+            pass  # Created by a concurrent run
+        except OperationFailure as e:
+            logger.warning(f"Time-series collections unavailable ({e}), using a plain collection")
+            db.create_collection(ARCHIVE_COLLECTION, storageEngine={
+                'wiredTiger': {'configString': 'block_compressor=zstd'}
+            })
+
+    archive = db[ARCHIVE_COLLECTION]
+    for keys in ARCHIVE_INDEXES:
+        try:
+            archive.create_index(keys)
+        except OperationFailure as e:
+            # Time-series on 5.x only indexes the meta and time fields
+            logger.warning(f"Could not create archive index {keys}: {e}")
+    return archive
+
+
+def publish_cutoff(db, state, cutoff, wait):
+    """Advance the saved cutoff and give API workers time to see it."""
+    previous = state.get('cutoff')
+    if previous is not None and previous >= cutoff:
+        return previous
+    state['cutoff'] = cutoff
+    save_checkpoint(db, TIERING_JOB, state)
+    logger.info(f"Published cutoff {cutoff.isoformat()}")
+    if wait > 0:
+        # Until their caches expire, readers assume the archive ends at the old cutoff
+        time.sleep(wait)
+    return cutoff
+
+
+def move_batch(db, archive, ids, oldest, newest):
+    """Copy the transactions in ids to the archive, then delete them from the hot tier."""
+    hot = db.transactions
+    docs = list(hot.find({'_id': {'$in': ids}}))
+    if not docs:
+        return 0
+    archived = {doc['_id'] for doc in archive.find(
+        {'_id': {'$in': ids}, 'created_at': {'$gte': oldest, '$lte': newest}}, {'_id': 1})}
+    missing = [doc for doc in docs if doc['_id'] not in archived]
+    if missing:
+        archive.insert_many(missing, ordered=False)
+    hot.delete_many({'_id': {'$in': [doc['_id'] for doc in docs]}})
+    return len(docs)
+
+
+def tier_transactions(db, horizon_days=DEFAULT_HORIZON_DAYS, batch_size=1000, sleep=0.0,
+                      publish_wait=CUTOFF_TTL * 2, dry_run=False):
+    cutoff = datetime.utcnow() - timedelta(days=horizon_days)
+    if dry_run:
+        due = db.transactions.count_documents({'created_at': {'$lt': cutoff}})
+        logger.info(f"{due} transactions created before {cutoff.isoformat()} would be archived")
+        return due
+
+    archive = ensure_archive(db)
+    state = load_checkpoint(db, TIERING_JOB)
+    moved = 0
+
+    pending = state.get('pending')
+    if pending:
+        logger.info(f"Finishing interrupted batch of {len(pending['ids'])}")
+        moved += move_batch(db, archive, pending['ids'], pending['oldest'], pending['newest'])
+        state.pop('pending')
+        save_checkpoint(db, TIERING_JOB, state)
+
+    cutoff = publish_cutoff(db, state, cutoff, publish_wait)
+    while True:
+        docs = list(db.transactions.find({'created_at': {'$lt': cutoff}}, {'created_at': 1})
+                    .sort('created_at', 1).limit(batch_size))
+        if not docs:
+            break
+        pending = {
+            'ids': [doc['_id'] for doc in docs],
+            'oldest': docs[0]['created_at'],
+            'newest': docs[-1]['created_at']
+        }
+        state['pending'] = pending
+        save_checkpoint(db, TIERING_JOB, state)
+        moved += move_batch(db, archive, pending['ids'], pending['oldest'], pending['newest'])
+        state.pop('pending')
+        save_checkpoint(db, TIERING_JOB, state)
+        throttle(sleep)
+
+    logger.info(f"Archived {moved} transactions created before {cutoff.isoformat()}")
+    return moved
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Move old transactions to the archive tier')
+    parser.add_argument('--horizon-days', type=int,
+                        default=int(os.getenv('TIERING_HORIZON_DAYS', DEFAULT_HORIZON_DAYS)),
+                        help='archive transactions older than this many days')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--sleep', type=float, default=0.0, help='seconds to pause between batches')
+    parser.add_argument('--publish-wait', type=float, default=CUTOFF_TTL * 2,
+                        help='seconds to wait after advancing the cutoff before moving documents')
+    parser.add_argument('--dry-run', action='store_true', help='count due transactions without moving them')
+    args = parser.parse_args(argv)
+
+    # The copy must be durable before the hot copy is deleted
+    db = get_db(w='majority')
+    tier_transactions(db, horizon_days=args.horizon_days, batch_size=args.batch_size, sleep=args.sleep,
+                      publish_wait=args.publish_wait, dry_run=args.dry_run)
+
+
+if __name__ == '__main__':
+    main()
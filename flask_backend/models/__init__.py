@@ -1,5 +1,11 @@
 # This makes the models directory a Python package
 from .bank_account import BankAccount
+from .transaction import Transaction
 from .user import User  # We'll create this file next
 
-__all__ = ['BankAccount', 'User']
+__all__ = ['BankAccount', 'Transaction', 'User', 'ensure_indexes']
+
+def ensure_indexes():
+    """Create the indexes the model lookups rely on (idempotent)."""
+    BankAccount.ensure_indexes()
+    Transaction.ensure_indexes()
@@ -0,0 +1,475 @@
+"""Bulk account and transaction import from CSV or NDJSON streams.
+
+Rows are parsed one at a time from the input stream and handled in batches:
+each batch is validated in memory, checked against the database with one
+query per kind of lookup, and written with unordered bulk writes. Errors are
+reported per row (1-based, header excluded) and never stop the import.
+
+A `record` column says what a row holds: `account` (the default) or
+`transaction`. Transaction rows name their account by `account_number` and
+carry `amount`, `transaction_type`, and optionally `description`, `status`
+(default completed), `created_at` (ISO 8601, default now), `reference` and,
+for transfers, `recipient_account_number` (another of the owner's accounts)
+or, in the command-line import only, `recipient_account_id`. A
+transaction's account must already exist or come earlier in the input.
+
+Side effects match BankAccount.save(): `users.account_count` is kept in
+step, a user without a primary account gets one (the first row asking for it,
+else their first imported row), new accounts record `opening_balance_minor`,
+and data versions and account caches are invalidated once per batch.
+Unlike save(), a batch is not one transaction; rows that fail are simply
+not inserted.
+
+Imported transactions are history: the imported or stored balance already
+includes them, so they do not move money. Instead each completed one shifts
+its accounts' `opening_balance_minor` by its effect, keeping balance =
+opening + ledger for jobs.reconcile and the statements. Accounts without an
+opening balance yet are left for `jobs.reconcile --baseline`.
+"""
+import codecs
+import csv
+import json
+import struct
+from datetime import datetime, timezone
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from bson.int64 import Int64
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from extensions import mongo
+from models.bank_account import BankAccount, _forget_user
+from models.durability import durability, MONEY
+from ids import object_id
+from models.money import to_minor
+from models.transaction import Transaction, DEBIT_TYPES
+from services.versioning import versions
+
+FORMATS = ('csv', 'ndjson')
+RECORDS = ('account', 'transaction')
+REQUIRED_FIELDS = ('account_number', 'account_holder_name', 'bank_name', 'ifsc_code', 'account_type')
+TRANSACTION_FIELDS = ('account_number', 'amount', 'transaction_type')
+TRANSACTION_TYPES = ('deposit', 'withdrawal', 'transfer', 'payment')
+TRANSACTION_STATUSES = ('completed', 'failed', 'cancelled')
+TRUE_VALUES = ('1', 'true', 'yes', 'y')
+
+
+def iter_rows(stream, fmt):
+    """Yield (row number, dict) from a binary stream without reading it whole."""
+    text = codecs.getreader('utf-8-sig')(stream)
+    if fmt == 'csv':
+        for number, row in enumerate(csv.DictReader(text), start=1):
+            yield number, row
+        return
+    number = 0
+    for line in text:
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield number, row if isinstance(row, dict) else {'__invalid__': line.strip()[:100]}
+
+
+def _created_at(value, now):
+    """Naive UTC datetime for an ISO 8601 created_at; now when empty."""
+    value = str(value or '').strip()
+    if not value:
+        return now
+    when = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if when.tzinfo is not None:
+        when = when.astimezone(timezone.utc).replace(tzinfo=None)
+    if when > now:
+        raise ValueError('created_at is in the future')
+    return when
+
+
+def _id_at(when):
+    """A fresh ObjectId whose timestamp is `when`.
+
+    Transaction.get_by_id finds archived transactions by the time in their
+    id, so a backdated transaction needs an id minted at its created_at.
+    """
+    seconds = int(when.replace(tzinfo=timezone.utc).timestamp())
+    return ObjectId(struct.pack('>I', max(seconds, 0)) + ObjectId().binary[4:])
+
+
+def _effects(transaction):
+    """(account_id, signed minor units) the transaction moved, as Transaction.apply would."""
+    if transaction.status != 'completed':
+        return []
+    if transaction.transaction_type == 'deposit':
+        return [(transaction.account_id, transaction.amount_minor)]
+    if transaction.transaction_type not in DEBIT_TYPES:
+        return []
+    effects = [(transaction.account_id, -transaction.amount_minor)]
+    if transaction.transaction_type == 'transfer' and transaction.recipient_account_id is not None:
+        effects.append((transaction.recipient_account_id, transaction.amount_minor))
+    return effects
+
+
+class ImportResult:
+    def __init__(self, max_errors):
+        self.rows = 0
+        self.inserted = 0
+        self.inserted_transactions = 0
+        self.failed = 0
+        self.errors = []
+        self.max_errors = max_errors
+
+    def error(self, row, message):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'row': row, 'message': message})
+
+    def to_json(self):
+        return {
+            'rows': self.rows,
+            'inserted': self.inserted,
+            'inserted_transactions': self.inserted_transactions,
+            'failed': self.failed,
+            'errors': sorted(self.errors, key=lambda error: error['row']),
+            'errors_truncated': self.failed > len(self.errors)
+        }
+
+
+class AccountImporter:
+    """Imports rows for one user (API) or for the users named in the rows (CLI).
+
+    With owner_id set, `user_id`/`user_email` columns are ignored. Without
+    it every row must name its owner by `user_id` or `user_email`.
+    """
+
+    def __init__(self, owner_id=None, batch_size=1000, max_rows=None, max_errors=1000):
+        self.owner_id = object_id(owner_id) if owner_id is not None else None
+        self.batch_size = batch_size
+        self.max_rows = max_rows
+        self.result = ImportResult(max_errors)
+        self._seen = set()  # (user_id, account_number) already imported this run
+        self._has_primary = {}  # user_id -> bool, once looked up
+
+    def run(self, rows):
+        batch = []
+        for number, row in rows:
+            if self.max_rows is not None and self.result.rows >= self.max_rows:
+                self.result.error(number, f'Row limit of {self.max_rows} reached; the rest was not imported')
+                break
+            self.result.rows += 1
+            batch.append((number, row))
+            if len(batch) >= self.batch_size:
+                self._import_batch(batch)
+                batch = []
+        if batch:
+            self._import_batch(batch)
+        return self.result
+
+    # Validation
+
+    def _resolve_owners(self, batch):
+        """Map every row's owner to an ObjectId with at most one users query."""
+        if self.owner_id is not None:
+            return {}
+        emails = {str(row.get('user_email')).strip().lower() for _, row in batch
+                  if not row.get('user_id') and row.get('user_email')}
+        if not emails:
+            return {}
+        users = mongo.db.users.find({'email': {'$in': list(emails)}}, {'email': 1})
+        return {user['email'].lower(): user['_id'] for user in users}
+
+    def _owner(self, row, by_email):
+        if self.owner_id is not None:
+            return self.owner_id
+        if row.get('user_id'):
+            return object_id(str(row['user_id']).strip())
+        if row.get('user_email'):
+            owner = by_email.get(str(row['user_email']).strip().lower())
+            if owner is None:
+                raise ValueError('Unknown user_email')
+            return owner
+        raise ValueError('Missing user_id or user_email')
+
+    def _validate(self, batch):
+        """BankAccount objects for the valid account rows, as (row number, account, wants primary)."""
+        by_email = self._resolve_owners(batch)
+        valid = []
+        for number, row in batch:
+            if '__invalid__' in row:
+                self.result.error(number, 'Not a JSON object')
+                continue
+            missing = [field for field in REQUIRED_FIELDS if not str(row.get(field) or '').strip()]
+            if missing:
+                self.result.error(number, f"Missing required fields: {', '.join(missing)}")
+                continue
+            try:
+                owner = self._owner(row, by_email)
+                balance_minor = to_minor(row.get('balance') or 0)
+                if balance_minor < 0:
+                    raise ValueError('Balance cannot be negative')
+                account = BankAccount(
+                    user_id=owner,
+                    account_number=str(row['account_number']).strip(),
+                    account_holder_name=str(row['account_holder_name']).strip(),
+                    bank_name=str(row['bank_name']).strip(),
+                    ifsc_code=str(row['ifsc_code']).strip(),
+                    account_type=str(row['account_type']).strip(),
+                    balance_minor=balance_minor
+                )
+            except InvalidId:
+                self.result.error(number, 'Invalid user_id')
+                continue
+            except (ValueError, ArithmeticError) as e:
+                # ArithmeticError covers decimal and overflow errors from odd balances
+                self.result.error(number, str(e) or 'Invalid balance')
+                continue
+            key = (account.user_id, account.account_number)
+            if key in self._seen:
+                self.result.error(number, 'Duplicate account number in import')
+                continue
+            self._seen.add(key)
+            wants_primary = str(row.get('is_primary') or '').strip().lower() in TRUE_VALUES
+            valid.append((number, account, wants_primary))
+
+        # Accounts that already exist, in one query
+        if valid:
+            existing = {(doc['user_id'], doc['account_number']) for doc in mongo.db.bank_accounts.find(
+                {'user_id': {'$in': list({account.user_id for _, account, _ in valid})},
+                 'account_number': {'$in': list({account.account_number for _, account, _ in valid})}},
+                {'user_id': 1, 'account_number': 1})}
+            kept = []
+            for number, account, wants_primary in valid:
+                if (account.user_id, account.account_number) in existing:
+                    self.result.error(number, 'Account number already exists')
+                else:
+                    kept.append((number, account, wants_primary))
+            valid = kept
+        return valid
+
+    # Writing
+
+    def _assign_primaries(self, valid):
+        users = {account.user_id for _, account, _ in valid}
+        unknown = [user_id for user_id in users if user_id not in self._has_primary]
+        if unknown:
+            with_primary = set(mongo.db.bank_accounts.distinct(
+                'user_id', {'user_id': {'$in': unknown}, 'is_primary': True}))
+            for user_id in unknown:
+                self._has_primary[user_id] = user_id in with_primary
+
+        # The first row asking to be primary wins, else the user's first row
+        chosen = {}
+        for index, (_, account, wants_primary) in enumerate(valid):
+            if self._has_primary[account.user_id]:
+                continue
+            current = chosen.get(account.user_id)
+            if current is None or (wants_primary and not valid[current][2]):
+                chosen[account.user_id] = index
+        for user_id, index in chosen.items():
+            valid[index][1].is_primary = True
+            self._has_primary[user_id] = True
+
+    def _ensure_counters(self, users):
+        # account_count is initialised lazily, as in BankAccount.save()
+        for user in mongo.db.users.find({'_id': {'$in': list(users)}, 'account_count': {'$exists': False}},
+                                        {'_id': 1}):
+            count = mongo.db.bank_accounts.count_documents({'user_id': user['_id']})
+            mongo.db.users.update_one({'_id': user['_id'], 'account_count': {'$exists': False}},
+                                      {'$set': {'account_count': count}})
+
+    def _import_batch(self, batch):
+        accounts, transactions = [], []
+        for number, row in batch:
+            record = str(row.get('record') or 'account').strip().lower()
+            if record == 'account':
+                accounts.append((number, row))
+            elif record == 'transaction':
+                transactions.append((number, row))
+            else:
+                self.result.error(number, f"record must be one of: {', '.join(RECORDS)}")
+        # Accounts first, so transactions can refer to accounts from the same batch
+        if accounts:
+            self._import_accounts(accounts)
+        if transactions:
+            self._import_transactions(transactions)
+
+    def _import_accounts(self, batch):
+        valid = self._validate(batch)
+        if not valid:
+            return
+        self._assign_primaries(valid)
+        self._ensure_counters({account.user_id for _, account, _ in valid})
+
+        now = datetime.utcnow()
+        docs = []
+        for _, account, _ in valid:
+            account.created_at = account.updated_at = now
+            doc = account.to_bson()
+            doc['opening_balance_minor'] = Int64(account.balance_minor)
+            docs.append(doc)
+
+        accounts = durability.collection('bank_accounts', MONEY)  # opening balances
+        failed = {}
+        try:
+            accounts.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get('writeErrors', []):
+                failed[error['index']] = error
+        inserted_by_user = {}
+        for index, (number, account, _) in enumerate(valid):
+            error = failed.get(index)
+            if error is not None and error.get('code') == 11000 and 'is_primary' in (error.get('keyPattern') or {}):
+                # A concurrent writer made another account primary first
+                docs[index]['is_primary'] = False
+                try:
+                    accounts.insert_one(docs[index])
+                    error = None
+                except DuplicateKeyError as retry_error:
+                    error = {'errmsg': str(retry_error)}
+            if error is not None:
+                self.result.error(number, error.get('errmsg', 'Write failed'))
+                continue
+            inserted_by_user[account.user_id] = inserted_by_user.get(account.user_id, 0) + 1
+
+        for user_id, count in inserted_by_user.items():
+            mongo.db.users.update_one({'_id': user_id}, {'$inc': {'account_count': count}})
+        self.result.inserted += sum(inserted_by_user.values())
+        versions.bump(list(inserted_by_user))
+        for user_id in inserted_by_user:
+            _forget_user(user_id)
+
+    # Transactions
+
+    def _validate_transactions(self, batch):
+        """Transaction objects for the valid transaction rows, as (row number, transaction)."""
+        by_email = self._resolve_owners(batch)
+        now = datetime.utcnow()
+        parsed = []
+        for number, row in batch:
+            missing = [field for field in TRANSACTION_FIELDS if not str(row.get(field) or '').strip()]
+            if missing:
+                self.result.error(number, f"Missing required fields: {', '.join(missing)}")
+                continue
+            try:
+                owner = self._owner(row, by_email)
+            except InvalidId:
+                self.result.error(number, 'Invalid user_id')
+                continue
+            except ValueError as e:
+                self.result.error(number, str(e))
+                continue
+            try:
+                amount_minor = to_minor(row['amount'])
+                if amount_minor <= 0:
+                    raise ValueError('Amount must be greater than zero')
+                transaction_type = str(row['transaction_type']).strip().lower()
+                if transaction_type not in TRANSACTION_TYPES:
+                    raise ValueError(f"transaction_type must be one of: {', '.join(TRANSACTION_TYPES)}")
+                status = str(row.get('status') or 'completed').strip().lower()
+                if status not in TRANSACTION_STATUSES:
+                    raise ValueError(f"status must be one of: {', '.join(TRANSACTION_STATUSES)}")
+                created_at = _created_at(row.get('created_at'), now)
+                recipient_number = str(row.get('recipient_account_number') or '').strip() or None
+                recipient_id = str(row.get('recipient_account_id') or '').strip() or None
+                if transaction_type != 'transfer' and (recipient_number or recipient_id):
+                    raise ValueError('Only transfers have a recipient')
+                if recipient_id and self.owner_id is not None:
+                    raise ValueError('Name the recipient by recipient_account_number')
+                if recipient_id:
+                    try:
+                        recipient_id = object_id(recipient_id)
+                    except InvalidId:
+                        raise ValueError('Invalid recipient_account_id')
+            except (ValueError, ArithmeticError) as e:
+                # ArithmeticError covers decimal and overflow errors from odd amounts
+                self.result.error(number, str(e) or 'Invalid amount')
+                continue
+            parsed.append((number, row, owner, amount_minor, transaction_type, status, created_at,
+                           recipient_number, recipient_id))
+        if not parsed:
+            return []
+
+        # Account numbers of the owners, and recipients named by id, in one query each
+        owners = list({entry[2] for entry in parsed})
+        numbers = {str(entry[1]['account_number']).strip() for entry in parsed}
+        numbers.update(entry[7] for entry in parsed if entry[7])
+        account_ids = {(doc['user_id'], doc['account_number']): doc['_id'] for doc in mongo.db.bank_accounts.find(
+            {'user_id': {'$in': owners}, 'account_number': {'$in': list(numbers)}},
+            {'user_id': 1, 'account_number': 1})}
+        recipient_ids = list({entry[8] for entry in parsed if entry[8]})
+        known_recipients = set(mongo.db.bank_accounts.distinct('_id', {'_id': {'$in': recipient_ids}})) \
+            if recipient_ids else set()
+
+        valid = []
+        for number, row, owner, amount_minor, transaction_type, status, created_at, recipient_number, \
+                recipient_id in parsed:
+            account_id = account_ids.get((owner, str(row['account_number']).strip()))
+            if account_id is None:
+                self.result.error(number, 'Unknown account_number')
+                continue
+            if recipient_number:
+                recipient_id = account_ids.get((owner, recipient_number))
+                if recipient_id is None:
+                    self.result.error(number, 'Unknown recipient_account_number')
+                    continue
+            elif recipient_id and recipient_id not in known_recipients:
+                self.result.error(number, 'Unknown recipient_account_id')
+                continue
+            if recipient_id == account_id:
+                self.result.error(number, 'Cannot transfer to the same account')
+                continue
+            transaction = Transaction(
+                user_id=owner,
+                account_id=account_id,
+                amount=None,
+                amount_minor=amount_minor,
+                transaction_type=transaction_type,
+                description=str(row.get('description') or '').strip(),
+                recipient_account_id=recipient_id,
+                status=status,
+                reference=str(row.get('reference') or '').strip() or None,
+                created_at=created_at,
+                updated_at=now,
+                _id=_id_at(created_at)
+            )
+            valid.append((number, transaction))
+        return valid
+
+    def _import_transactions(self, batch):
+        valid = self._validate_transactions(batch)
+        if not valid:
+            return
+
+        transactions = durability.collection('transactions', MONEY)
+        failed = {}
+        try:
+            transactions.bulk_write([InsertOne(transaction.to_bson()) for _, transaction in valid], ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get('writeErrors', []):
+                failed[error['index']] = error
+
+        opening_shift, users = {}, set()
+        for index, (number, transaction) in enumerate(valid):
+            error = failed.get(index)
+            if error is not None:
+                message = 'Duplicate reference' if error.get('code') == 11000 else error.get('errmsg', 'Write failed')
+                self.result.error(number, message)
+                continue
+            self.result.inserted_transactions += 1
+            users.add(transaction.user_id)
+            for account_id, minor in _effects(transaction):
+                opening_shift[account_id] = opening_shift.get(account_id, 0) + minor
+
+        # The balance already includes the history: move the opening balance back by its effect
+        updates = [UpdateOne({'_id': account_id, 'opening_balance_minor': {'$exists': True}},
+                             {'$inc': {'opening_balance_minor': Int64(-minor)}})
+                   for account_id, minor in opening_shift.items() if minor]
+        if updates:
+            accounts = durability.collection('bank_accounts', MONEY)
+            accounts.bulk_write(updates, ordered=False)
+            users.update(doc['user_id'] for doc in mongo.db.bank_accounts.find(
+                {'_id': {'$in': list(opening_shift)}}, {'user_id': 1}))
+        versions.bump(list(users))
+        for user_id in users:
+            _forget_user(user_id)
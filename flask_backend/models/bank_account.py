@@ -1,57 +1,159 @@
 from datetime import datetime
 from bson import ObjectId
+from bson.int64 import Int64
+from bson.errors import InvalidId
 from extensions import mongo
+from models.durability import durability, MONEY, STANDARD
+from models.money import to_minor, to_json_amount, stored_minor
+from ids import object_id
+from models.fields import projection, select
+from services import single_flight
+from services.versioning import versions
+from services.identity import account_sets
+
+# Concurrent identical account listings share one query
+_accounts_by_user = single_flight.group('accounts_by_user', timeout=2.0)
+
+def _forget_user(user_id):
+    # After a committed write: no joining older reads, no cached old version
+    _accounts_by_user.forget(str(user_id))
+    versions.evict([user_id])
+    account_sets.evict(user_id)
+
+def _to_str(value, default=''):
+    return str(value) if value is not None else default
+
+class LastAccountError(Exception):
+    """Raised when deleting a user's only account."""
+
+class _AccountNotFound(Exception):
+    pass
 
 class BankAccount:
-    def __init__(self, user_id, account_number, account_holder_name, bank_name, 
-                 ifsc_code, account_type, balance=0.0, is_primary=False):
-        self.user_id = user_id
-        self.account_number = account_number
-        self.account_holder_name = account_holder_name
-        self.bank_name = bank_name
-        self.ifsc_code = ifsc_code
-        self.account_type = account_type  # 'savings', 'checking', etc.
-        self.balance = float(balance)
+    """Bank account record.
+
+    Fields are validated once in __init__; documents read back from MongoDB
+    are trusted and go through from_bson, which skips validation entirely.
+    """
+    __slots__ = ('_id', 'user_id', 'account_number', 'account_holder_name', 'bank_name',
+                 'ifsc_code', 'account_type', 'balance_minor', 'is_primary', 'created_at', 'updated_at')
+
+    collection_name = 'bank_accounts'
+
+    # API field -> stored fields it is built from
+    JSON_FIELDS = {
+        '_id': ('_id',),
+        'user_id': ('user_id',),
+        'account_number': ('account_number',),
+        'account_number_masked': ('account_number',),
+        'account_holder_name': ('account_holder_name',),
+        'bank_name': ('bank_name',),
+        'ifsc_code': ('ifsc_code',),
+        'account_type': ('account_type',),
+        'balance': ('balance_minor', 'balance'),
+        'balance_minor': ('balance_minor', 'balance'),
+        'is_primary': ('is_primary',),
+        'created_at': ('created_at',),
+        'updated_at': ('updated_at',),
+    }
+    VIEWS = {
+        # Enough to pick someone else's account as a transfer recipient
+        'recipient': ('_id', 'user_id', 'account_holder_name', 'bank_name', 'account_type',
+                      'account_number_masked', 'is_primary'),
+        'summary': ('_id', 'account_number', 'bank_name', 'account_type', 'balance', 'balance_minor',
+                    'is_primary'),
+    }
+    RECIPIENT_FIELDS = frozenset(VIEWS['recipient'])
+
+    def __init__(self, user_id, account_number, account_holder_name, bank_name,
+                 ifsc_code, account_type, balance=0, is_primary=False,
+                 created_at=None, updated_at=None, _id=None, balance_minor=None):
+        now = datetime.utcnow()
+        self._id = _id
+        self.user_id = object_id(user_id)
+        self.account_number = _to_str(account_number)
+        self.account_holder_name = _to_str(account_holder_name)
+        self.bank_name = _to_str(bank_name)
+        self.ifsc_code = _to_str(ifsc_code)
+        self.account_type = _to_str(account_type, 'savings')  # 'savings', 'checking', etc.
+        # Balance is kept in integer minor units; `balance` is in major units
+        self.balance_minor = Int64(balance_minor) if balance_minor is not None else to_minor(balance)
         self.is_primary = bool(is_primary)
-        self.created_at = datetime.utcnow()
-        self.updated_at = datetime.utcnow()
-
-    def to_dict(self):
-        # Ensure all fields have consistent types
-        from bson import ObjectId
-        
-        # Handle user_id type consistency
-        user_id = self.user_id
-        if user_id and not isinstance(user_id, ObjectId):
-            try:
-                user_id = ObjectId(str(user_id))
-            except:
-                pass  # Keep as is if conversion fails
-        
-        # Ensure balance is float
-        try:
-            balance = float(self.balance)
-        except (TypeError, ValueError):
-            balance = 0.0
-            
-        # Ensure boolean fields are properly cast
-        is_primary = bool(self.is_primary)
-        
-        return {
-            'user_id': user_id,
-            'account_number': str(self.account_number) if self.account_number is not None else '',
-            'account_holder_name': str(self.account_holder_name) if self.account_holder_name is not None else '',
-            'bank_name': str(self.bank_name) if self.bank_name is not None else '',
-            'ifsc_code': str(self.ifsc_code) if self.ifsc_code is not None else '',
-            'account_type': str(self.account_type) if self.account_type is not None else 'savings',
-            'balance': balance,
-            'is_primary': is_primary,
-            'created_at': self.created_at if hasattr(self, 'created_at') and self.created_at else datetime.utcnow(),
-            'updated_at': self.updated_at if hasattr(self, 'updated_at') and self.updated_at else datetime.utcnow()
+        self.created_at = created_at or now
+        self.updated_at = updated_at or now
+
+    def to_bson(self):
+        # Values were coerced in __init__, so this is a plain copy
+        doc = {
+            'user_id': self.user_id,
+            'account_number': self.account_number,
+            'account_holder_name': self.account_holder_name,
+            'bank_name': self.bank_name,
+            'ifsc_code': self.ifsc_code,
+            'account_type': self.account_type,
+            'balance_minor': self.balance_minor,
+            'is_primary': self.is_primary,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
+        }
+        if self._id is not None:
+            doc['_id'] = self._id
+        return doc
+
+    to_dict = to_bson
+
+    def to_json(self, fields=None):
+        """API representation: string ids and ISO timestamps; `fields` selects keys."""
+        data = {
+            '_id': str(self._id),
+            'user_id': str(self.user_id),
+            'account_number': self.account_number,
+            'account_holder_name': self.account_holder_name,
+            'bank_name': self.bank_name,
+            'ifsc_code': self.ifsc_code,
+            'account_type': self.account_type,
+            'balance': to_json_amount(self.balance_minor),
+            'balance_minor': self.balance_minor,
+            'is_primary': self.is_primary,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
+        if fields is not None and 'account_number_masked' in fields:
+            number = _to_str(self.account_number)
+            data['account_number_masked'] = '*' * max(len(number) - 4, 0) + number[-4:]
+        return select(data, fields)
+
+    @classmethod
+    def from_bson(cls, doc):
+        """Wrap a stored document without re-validating it."""
+        account = cls.__new__(cls)
+        account._id = doc.get('_id')
+        account.user_id = doc.get('user_id')
+        account.account_number = doc.get('account_number', '')
+        account.account_holder_name = doc.get('account_holder_name', '')
+        account.bank_name = doc.get('bank_name', '')
+        account.ifsc_code = doc.get('ifsc_code', '')
+        account.account_type = doc.get('account_type', 'savings')
+        account.balance_minor = stored_minor(doc, 'balance_minor', 'balance')
+        account.is_primary = doc.get('is_primary', False)
+        account.created_at = doc.get('created_at')
+        account.updated_at = doc.get('updated_at')
+        return account
+
+    @classmethod
+    def from_bson_many(cls, docs):
+        from_bson = cls.from_bson
+        return [from_bson(doc) for doc in docs]
+
+    def belongs_to(self, user_id):
+        try:
+            return self.user_id == object_id(user_id)
+        except InvalidId:
+            return False
 
     @classmethod
     def from_dict(cls, data):
+        """Build a validated account from untrusted input."""
         return cls(
             user_id=data['user_id'],
             account_number=data['account_number'],
@@ -59,53 +161,108 @@ class BankAccount:
             bank_name=data['bank_name'],
             ifsc_code=data['ifsc_code'],
             account_type=data['account_type'],
-            balance=data.get('balance', 0.0),
-            is_primary=data.get('is_primary', False)
+            balance=data.get('balance', 0),
+            balance_minor=data.get('balance_minor'),
+            is_primary=data.get('is_primary', False),
+            created_at=data.get('created_at'),
+            updated_at=data.get('updated_at'),
+            _id=data.get('_id')
         )
 
     def save(self):
+        """Insert the account in one transaction.
+
+        Bumps users.account_count (and the data version, in the same update)
+        to decide whether this is the first (and so primary) account, clears
+        the old primary only when this one replaces it, then inserts. The
+        partial unique index on (user_id, is_primary) makes concurrent clicks
+        conflict and retry instead of leaving two primaries.
+
+        This is more than the one or two round trips asked for: the counter
+        and the account are written separately and the commit is a round
+        trip of its own, plus an update_many when a primary is replaced.
+        Fewer would need the counter and the primary flag on one document,
+        giving up the (user_id, is_primary) index the import relies on.
+        """
+        accounts = mongo.db[self.collection_name]
+        users = mongo.db.users
+        requested_primary = self.is_primary
+
+        def _create(session):
+            now = datetime.utcnow()
+            before = users.find_one_and_update(
+                {'_id': self.user_id},
+                versions.bump_update({'$inc': {'account_count': 1}}),
+                projection={'account_count': 1},
+                session=session
+            )
+            existing = before.get('account_count') if before else None
+            if existing is None:
+                # Counter not initialised for this user yet
+                existing = accounts.count_documents({'user_id': self.user_id}, session=session)
+                users.update_one(
+                    {'_id': self.user_id},
+                    {'$set': {'account_count': existing + 1}},
+                    session=session
+                )
+
+            # If this is the first account for the user, make it primary
+            self.is_primary = requested_primary or existing == 0
+            if self.is_primary and existing > 0:
+                accounts.update_many(
+                    {'user_id': self.user_id, 'is_primary': True},
+                    {'$set': {'is_primary': False, 'updated_at': now}},
+                    session=session
+                )
+
+            self.created_at = self.updated_at = now
+            doc = self.to_bson()
+            # Starting point for jobs.reconcile: balance = opening + ledger
+            doc['opening_balance_minor'] = self.balance_minor
+            return accounts.insert_one(doc, session=session).inserted_id
+
+        self._id = durability.run_in_transaction(_create, MONEY)
+        _forget_user(self.user_id)
+        return str(self._id)
+
+    @staticmethod
+    def ensure_indexes():
         accounts = mongo.db.bank_accounts
-        
-        # Ensure user_id is consistently stored as ObjectId
-        from bson import ObjectId
-        if not isinstance(self.user_id, ObjectId):
-            try:
-                self.user_id = ObjectId(str(self.user_id))
-            except:
-                pass  # Keep as string if conversion fails
-        
-        # If this is the first account for the user, make it primary
-        user_query = {'user_id': self.user_id}
-        if accounts.count_documents(user_query) == 0:
-            self.is_primary = True
-        
-        # If this account is marked as primary, unset primary from other accounts
-        if self.is_primary:
-            accounts.update_many(
-                user_query,
-                {'$set': {'is_primary': False, 'updated_at': datetime.utcnow()}}
+        accounts.create_index('user_id')
+        accounts.create_index('updated_at')  # incremental reconciliation
+        try:
+            accounts.create_index(
+                [('user_id', 1), ('is_primary', 1)],
+                unique=True,
+                partialFilterExpression={'is_primary': True},
+                name='one_primary_per_user'
             )
-        
-        # Add timestamps
-        self.created_at = datetime.utcnow()
-        self.updated_at = datetime.utcnow()
-        
-        # Insert the account
-        account_data = self.to_dict()
-        result = accounts.insert_one(account_data)
-        return str(result.inserted_id)
+        except Exception as e:
+            # Existing duplicate primaries have to be resolved by hand first
+            print(f"Could not create primary account index: {str(e)}")
+        try:
+            # Lets change streams report the owner of a deleted account (MongoDB 6.0+)
+            mongo.db.command('collMod', BankAccount.collection_name,
+                             changeStreamPreAndPostImages={'enabled': True})
+        except Exception as e:
+            print(f"Could not enable account pre-images: {str(e)}")
+
+    @staticmethod
+    def get_by_user(user_id, fields=None):
+        """The user's accounts; `fields` (API field names) limits what is read."""
+        return _accounts_by_user.do((str(user_id), fields),
+                                    lambda: BankAccount._load_by_user(user_id, fields))
 
     @staticmethod
-    def get_by_user(user_id):
+    def _load_by_user(user_id, fields=None):
         accounts = mongo.db.bank_accounts
         try:
-            # First try to find with ObjectId if user_id is a valid ObjectId string
-            from bson.errors import InvalidId
-            try:
-                return list(accounts.find({'user_id': ObjectId(user_id)}))
-            except (InvalidId, TypeError):
-                # If not a valid ObjectId, try with string comparison
-                return list(accounts.find({'user_id': str(user_id)}))
+            return BankAccount.from_bson_many(accounts.find(
+                {'user_id': object_id(user_id)},
+                projection(fields, BankAccount.JSON_FIELDS)
+            ))
+        except InvalidId:
+            return []
         except Exception as e:
             print(f"Error in get_by_user: {str(e)}")
             return []
@@ -113,28 +270,101 @@ class BankAccount:
     @staticmethod
     def get_by_id(account_id):
         accounts = mongo.db.bank_accounts
-        return accounts.find_one({'_id': ObjectId(account_id)})
+        doc = accounts.find_one({'_id': ObjectId(account_id)})
+        return BankAccount.from_bson(doc) if doc else None
 
     @staticmethod
-    def update(account_id, update_data):
-        accounts = mongo.db.bank_accounts
+    def update(account_id, user_id, update_data):
+        """Apply update_data to one of the user's accounts.
+
+        Returns False if the account does not exist or belongs to someone else.
+        Balance edits are written with the money durability profile.
+        """
+        profile = MONEY if 'balance_minor' in update_data else STANDARD
+        accounts = durability.collection('bank_accounts', profile)
+        account_id, user_id = ObjectId(account_id), object_id(user_id)
         update_data['updated_at'] = datetime.utcnow()
-        
-        # If making this account primary, unset primary from others
-        if update_data.get('is_primary') is True:
-            account = accounts.find_one({'_id': ObjectId(account_id)})
-            if account:
-                accounts.update_many(
-                    {'user_id': account['user_id'], '_id': {'$ne': ObjectId(account_id)}, 'is_primary': True},
-                    {'$set': {'is_primary': False}}
-                )
-                
-        return accounts.update_one(
-            {'_id': ObjectId(account_id)},
-            {'$set': update_data}
-        )
+
+        update = {'$set': update_data}
+        if 'balance_minor' in update_data:
+            # Drop any unmigrated float so it is not folded in on read
+            update['$unset'] = {'balance': ''}
+        owned = {'_id': account_id, 'user_id': user_id}
+
+        if update_data.get('is_primary') is not True:
+            updated = accounts.update_one(owned, update).matched_count > 0
+            if updated:
+                versions.bump([user_id])
+            _forget_user(user_id)
+            return updated
+
+        # If making this account primary, unset primary from others in the same transaction
+        def _make_primary(session):
+            accounts.update_many(
+                {'user_id': user_id, 'is_primary': True, '_id': {'$ne': account_id}},
+                {'$set': {'is_primary': False, 'updated_at': update_data['updated_at']}},
+                session=session
+            )
+            if accounts.update_one(owned, update, session=session).matched_count == 0:
+                raise _AccountNotFound()
+            versions.bump([user_id], session=session)
+            return True
+
+        try:
+            return durability.run_in_transaction(_make_primary, profile)
+        except _AccountNotFound:
+            return False
+        finally:
+            _forget_user(user_id)
 
     @staticmethod
-    def delete(account_id):
+    def delete(account_id, user_id):
+        """Delete one of the user's accounts in one transaction.
+
+        Returns False if the account does not exist or belongs to someone
+        else, and raises LastAccountError if it is the user's only account.
+        A deleted primary hands the flag to another of the user's accounts.
+        The counter update carries the data version bump, so the usual case
+        is two writes plus the commit.
+        """
         accounts = mongo.db.bank_accounts
-        return accounts.delete_one({'_id': ObjectId(account_id)})
+        users = mongo.db.users
+        account_id, user_id = ObjectId(account_id), object_id(user_id)
+
+        def _delete(session):
+            deleted = accounts.find_one_and_delete(
+                {'_id': account_id, 'user_id': user_id},
+                projection={'is_primary': 1},
+                session=session
+            )
+            if not deleted:
+                return False
+
+            counted = users.find_one_and_update(
+                {'_id': user_id, 'account_count': {'$gt': 1}},
+                versions.bump_update({'$inc': {'account_count': -1}}),
+                projection={'_id': 1},
+                session=session
+            )
+            if not counted:
+                user = users.find_one({'_id': user_id}, {'account_count': 1}, session=session)
+                remaining = accounts.count_documents({'user_id': user_id}, session=session)
+                if remaining == 0 or (user and user.get('account_count') is not None):
+                    raise LastAccountError()
+                # Counter not initialised for this user yet
+                users.update_one({'_id': user_id},
+                                 versions.bump_update({'$set': {'account_count': remaining}}),
+                                 session=session)
+
+            if deleted.get('is_primary'):
+                accounts.update_one(
+                    {'user_id': user_id},
+                    {'$set': {'is_primary': True, 'updated_at': datetime.utcnow()}},
+                    session=session
+                )
+            return True
+
+        try:
+            return durability.run_in_transaction(_delete, MONEY)
+        finally:
+            _forget_user(user_id)
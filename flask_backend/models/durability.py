@@ -0,0 +1,83 @@
+"""Named durability profiles: the write concern each class of write uses.
+
+Model writes pick a profile instead of inheriting the client default:
+
+* ``money``: money movement and the records it depends on: balance
+  changes, account creation and deletion, transaction status. Defaults to
+  majority plus journal, so an acknowledged write survives a failover.
+* ``standard``: account metadata edits and per-user data versions. Uses the
+  client default (whatever MONGODB_URI sets).
+* ``bookkeeping``: audit records of failed attempts, last_login and similar
+  values that are cheap to lose in a failover. Defaults to w:1, so the
+  request does not wait for replication.
+
+Each profile is configured by DURABILITY_<PROFILE>, a spec such as
+'majority+j', '1', '2+wtimeout=5000' or 'default' (the client default).
+Inside a transaction only the commit takes a write concern, so transactional
+writes pass the profile to run_in_transaction instead of the collection.
+"""
+from pymongo.write_concern import WriteConcern
+
+from extensions import mongo, run_in_transaction
+
+MONEY = 'money'
+STANDARD = 'standard'
+BOOKKEEPING = 'bookkeeping'
+DEFAULT_PROFILES = {
+    MONEY: 'majority+j',
+    STANDARD: 'default',
+    BOOKKEEPING: '1',
+}
+
+
+def parse_write_concern(spec):
+    """WriteConcern for a spec like 'majority+j' or '1+wtimeout=5000'; None for 'default'."""
+    spec = str(spec).strip()
+    if spec == 'default':
+        return None
+    w, *options = spec.split('+')
+    kwargs = {'w': int(w) if w.isdigit() else w}
+    for option in options:
+        if option == 'j':
+            kwargs['j'] = True
+        elif option.startswith('wtimeout='):
+            kwargs['wtimeout'] = int(option[len('wtimeout='):])
+        else:
+            raise ValueError(f"Unknown write concern option {option!r} in {spec!r}")
+    return WriteConcern(**kwargs)
+
+
+class DurabilityProfiles:
+    """Maps profile names to write concerns."""
+
+    def __init__(self):
+        self._concerns = {name: parse_write_concern(spec) for name, spec in DEFAULT_PROFILES.items()}
+
+    def init_app(self, app):
+        for name in DEFAULT_PROFILES:
+            spec = app.config.get(f'DURABILITY_{name.upper()}')
+            if spec:
+                self._concerns[name] = parse_write_concern(spec)
+
+    def write_concern(self, profile):
+        """The profile's WriteConcern, or None for the client default."""
+        return self._concerns[profile]
+
+    def collection(self, name, profile):
+        """mongo.db[name] with the profile's write concern, for writes outside transactions."""
+        collection = mongo.db[name]
+        write_concern = self._concerns[profile]
+        if write_concern is None:
+            return collection
+        return collection.with_options(write_concern=write_concern)
+
+    def run_in_transaction(self, callback, profile):
+        """run_in_transaction with the commit acknowledged at the profile's write concern."""
+        return run_in_transaction(callback, write_concern=self._concerns[profile])
+
+    def stats(self):
+        return {name: (concern.document if concern is not None else 'default')
+                for name, concern in self._concerns.items()}
+
+
+durability = DurabilityProfiles()
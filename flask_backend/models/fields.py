@@ -0,0 +1,51 @@
+"""Sparse fieldsets: `fields=` and `view=` query parameters.
+
+Each model declares JSON_FIELDS, mapping every API field it can return to
+the stored fields it is built from, and VIEWS, named field lists for common
+lean responses. A request's selection is validated against an allowlist and
+pushed down to MongoDB as a projection, so unrequested fields are neither
+read nor serialized.
+"""
+
+
+def parse_fields(fields_param, view_param, allowed, views, default_view=None):
+    """Resolve the request's selection to a tuple of API fields.
+
+    Returns None for "everything" when neither parameter is given and there
+    is no default view. Raises ValueError for unknown views and for fields
+    outside `allowed`.
+    """
+    if fields_param:
+        fields = [f.strip() for f in fields_param.split(',') if f.strip()]
+    else:
+        view = view_param or default_view
+        if not view:
+            return None
+        if view not in views:
+            raise ValueError(f"Unknown view: {view}")
+        fields = list(views[view])
+
+    rejected = [f for f in fields if f not in allowed]
+    if rejected:
+        raise ValueError(f"Fields not available: {', '.join(rejected)}")
+    if '_id' not in fields:
+        fields.insert(0, '_id')
+    return tuple(dict.fromkeys(fields))
+
+
+def projection(fields, json_fields):
+    """MongoDB projection for the API fields, or None for whole documents."""
+    if fields is None:
+        return None
+    stored = {}
+    for field in fields:
+        for name in json_fields[field]:
+            stored[name] = 1
+    return stored
+
+
+def select(data, fields):
+    """Keep only the requested keys of a to_json() dict."""
+    if fields is None:
+        return data
+    return {field: data[field] for field in fields}
@@ -0,0 +1,95 @@
+"""Fixed-point money helpers.
+
+Amounts are stored as integer minor units (paise) in `*_minor` Int64 fields.
+Decimal is only used at the edges: parsing request values and rendering
+JSON numbers.
+"""
+from decimal import Decimal, InvalidOperation, ROUND_HALF_EVEN
+from bson.int64 import Int64
+
+MINOR_DIGITS = 2
+MINOR_PER_UNIT = 10 ** MINOR_DIGITS
+MAX_MINOR = 2 ** 63 - 1  # largest value an Int64 field can hold
+_QUANTUM = Decimal(1).scaleb(-MINOR_DIGITS)
+
+
+def _checked(minor):
+    if abs(minor) > MAX_MINOR:
+        raise ValueError("Amount is too large")
+    return Int64(minor)
+
+
+def to_minor(value, strict=True):
+    """Convert an amount in major units (number or string) to integer minor units.
+
+    With strict=True, values with more precision than the currency allows are
+    rejected; otherwise they are rounded half-to-even (used for legacy floats).
+    Raises ValueError for anything that is not a finite number or does not
+    fit in an Int64 once converted.
+    """
+    if isinstance(value, bool) or value is None:
+        raise ValueError("Invalid amount")
+    if isinstance(value, int):
+        return _checked(value * MINOR_PER_UNIT)
+    try:
+        amount = Decimal(str(value).strip())
+    except (InvalidOperation, ValueError):
+        raise ValueError("Invalid amount")
+    if not amount.is_finite():
+        raise ValueError("Invalid amount")
+    try:
+        quantized = amount.quantize(_QUANTUM, rounding=ROUND_HALF_EVEN)
+    except InvalidOperation:
+        # More digits than the decimal context can hold
+        raise ValueError("Amount is too large")
+    if strict and quantized != amount:
+        raise ValueError(f"Amount has more than {MINOR_DIGITS} decimal places")
+    return _checked(int(quantized.scaleb(MINOR_DIGITS)))
+
+
+def from_minor(minor):
+    """Exact Decimal amount in major units."""
+    return Decimal(int(minor or 0)).scaleb(-MINOR_DIGITS)
+
+
+def to_json_amount(minor):
+    """JSON number in major units; exact for any amount with two decimals."""
+    return float(from_minor(minor))
+
+
+def minor_expr(minor_field, legacy_field):
+    """Aggregation expression for an amount in minor units.
+
+    Until jobs.migrate_money has folded a document, the legacy float field may
+    still hold (part of) the value, so both are added server-side.
+    """
+    return {'$add': [
+        {'$ifNull': [f'${minor_field}', 0]},
+        {'$toLong': {'$round': [{'$multiply': [{'$ifNull': [f'${legacy_field}', 0]}, MINOR_PER_UNIT]}, 0]}}
+    ]}
+
+
+# Aggregation expressions used by rollups
+BALANCE_MINOR = minor_expr('balance_minor', 'balance')
+AMOUNT_MINOR = minor_expr('amount_minor', 'amount')
+
+
+def add_balance_pipeline(delta_minor, now):
+    """Update pipeline adding delta_minor to an account balance.
+
+    Any unmigrated float `balance` is folded into `balance_minor` in the same
+    update, so money movement never depends on jobs.migrate_money having run.
+    """
+    return [
+        {'$set': {'balance_minor': {'$add': [BALANCE_MINOR, Int64(delta_minor)]}, 'updated_at': now}},
+        {'$unset': 'balance'}
+    ]
+
+
+def stored_minor(doc, minor_field, legacy_field):
+    """Read an amount from a stored document, folding in any unmigrated legacy float."""
+    minor = doc.get(minor_field) or 0
+    legacy = doc.get(legacy_field)
+    if legacy is not None:
+        minor += to_minor(legacy, strict=False)
+    return minor
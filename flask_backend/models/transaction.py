@@ -1,26 +1,114 @@
-from datetime import datetime
+import threading
+import time
+from datetime import datetime, timedelta
 from bson import ObjectId
+from bson.errors import InvalidId
+from bson.int64 import Int64
 from extensions import mongo
+from models.durability import durability, MONEY, BOOKKEEPING
+from models.money import (to_minor, to_json_amount, stored_minor, add_balance_pipeline,
+                          AMOUNT_MINOR, BALANCE_MINOR)
+from ids import object_id, optional_object_id
+from models.fields import projection, select
+from services import single_flight
+from services.versioning import versions
+
+DEBIT_TYPES = ('withdrawal', 'transfer')
+
+# Cold tier written by jobs.tier_transactions; its checkpoint holds the cutoff
+ARCHIVE_COLLECTION = 'transactions_archive'
+TIERING_JOB = 'tier_transactions'
+CUTOFF_TTL = 30.0
+ID_CLOCK_SKEW = timedelta(minutes=5)
+
+# Concurrent identical listings share one query
+_by_user = single_flight.group('transactions_by_user')
+_by_account = single_flight.group('transactions_by_account')
+_accounts_by_user = single_flight.group('accounts_by_user', timeout=2.0)
+
+_cutoff = {'value': None, 'expires': 0.0}
+_cutoff_lock = threading.Lock()
+
+def archive_cutoff():
+    """Tiering cutoff: archived transactions are all older than it, or None.
+
+    Cached for CUTOFF_TTL seconds; the job publishes a new cutoff and waits
+    longer than that before moving anything past the old one.
+    """
+    now = time.monotonic()
+    if _cutoff['expires'] > now:
+        return _cutoff['value']
+    with _cutoff_lock:
+        if _cutoff['expires'] <= now:
+            state = mongo.db.job_state.find_one({'_id': TIERING_JOB}, {'state.cutoff': 1}) or {}
+            _cutoff['value'] = state.get('state', {}).get('cutoff')
+            _cutoff['expires'] = now + CUTOFF_TTL
+    return _cutoff['value']
+
+class InsufficientFundsError(Exception):
+    """Raised when a debit would take an account below zero."""
+
+class RecipientNotFoundError(Exception):
+    """Raised when the recipient account disappears before the credit."""
+
+class AccountNotFoundError(Exception):
+    """Raised when the transaction's own account no longer exists."""
 
 class Transaction:
-    def __init__(self, user_id, account_id, amount, transaction_type, 
-                 description="", recipient_account_id=None, status="pending"):
-        self.user_id = user_id
-        self.account_id = account_id
-        self.amount = float(amount)
+    """Ledger entry.
+
+    __init__ validates new transactions; stored documents are wrapped by
+    from_bson without re-validation.
+    """
+    __slots__ = ('_id', 'user_id', 'account_id', 'amount_minor', 'transaction_type', 'description',
+                 'recipient_account_id', 'status', 'reference', 'created_at', 'updated_at')
+
+    collection_name = 'transactions'
+
+    # API field -> stored fields it is built from
+    JSON_FIELDS = {
+        '_id': ('_id',),
+        'user_id': ('user_id',),
+        'account_id': ('account_id',),
+        'amount': ('amount_minor', 'amount'),
+        'amount_minor': ('amount_minor', 'amount'),
+        'transaction_type': ('transaction_type',),
+        'description': ('description',),
+        'recipient_account_id': ('recipient_account_id',),
+        'status': ('status',),
+        'reference': ('reference',),
+        'created_at': ('created_at',),
+        'updated_at': ('updated_at',),
+    }
+    VIEWS = {
+        'summary': ('_id', 'account_id', 'amount', 'amount_minor', 'transaction_type', 'description',
+                    'status', 'created_at'),
+    }
+
+    def __init__(self, user_id, account_id, amount, transaction_type,
+                 description="", recipient_account_id=None, status="pending",
+                 reference=None, created_at=None, updated_at=None, _id=None, amount_minor=None):
+        now = datetime.utcnow()
+        # The id is assigned up front so the reference can be derived from it
+        self._id = _id or ObjectId()
+        self.user_id = object_id(user_id)
+        self.account_id = object_id(account_id)
+        # Amount in integer minor units; `amount` is in major units
+        self.amount_minor = Int64(amount_minor) if amount_minor is not None else to_minor(amount)
         self.transaction_type = transaction_type  # 'deposit', 'withdrawal', 'transfer', 'payment'
         self.description = description
-        self.recipient_account_id = recipient_account_id
+        self.recipient_account_id = optional_object_id(recipient_account_id)
         self.status = status  # 'pending', 'completed', 'failed', 'cancelled'
-        self.created_at = datetime.utcnow()
-        self.updated_at = datetime.utcnow()
-        self.reference = f"TXN{int(datetime.utcnow().timestamp())}"
+        self.created_at = created_at or now
+        self.updated_at = updated_at or now
+        # Unique across processes, unlike a bare timestamp
+        self.reference = reference or f"TXN{str(self._id).upper()}"
 
-    def to_dict(self):
-        return {
+    def to_bson(self):
+        doc = {
             'user_id': self.user_id,
             'account_id': self.account_id,
-            'amount': self.amount,
+            'amount_minor': self.amount_minor,
             'transaction_type': self.transaction_type,
             'description': self.description,
             'recipient_account_id': self.recipient_account_id,
@@ -29,99 +117,292 @@ class Transaction:
             'created_at': self.created_at,
             'updated_at': self.updated_at
         }
+        if self._id is not None:
+            doc['_id'] = self._id
+        return doc
+
+    to_dict = to_bson
+
+    def to_json(self, fields=None):
+        """API representation with ObjectIds converted to strings; `fields` selects keys."""
+        data = {
+            '_id': str(self._id),
+            'user_id': str(self.user_id),
+            'account_id': str(self.account_id),
+            'amount': to_json_amount(self.amount_minor),
+            'amount_minor': self.amount_minor,
+            'transaction_type': self.transaction_type,
+            'description': self.description,
+            'recipient_account_id': str(self.recipient_account_id) if self.recipient_account_id else self.recipient_account_id,
+            'status': self.status,
+            'reference': self.reference,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
+        }
+        return select(data, fields)
+
+    @classmethod
+    def from_bson(cls, doc):
+        """Wrap a stored document without re-validating it."""
+        transaction = cls.__new__(cls)
+        transaction._id = doc.get('_id')
+        transaction.user_id = doc.get('user_id')
+        transaction.account_id = doc.get('account_id')
+        transaction.amount_minor = stored_minor(doc, 'amount_minor', 'amount')
+        transaction.transaction_type = doc.get('transaction_type')
+        transaction.description = doc.get('description', '')
+        transaction.recipient_account_id = doc.get('recipient_account_id')
+        transaction.status = doc.get('status', 'pending')
+        transaction.reference = doc.get('reference')
+        transaction.created_at = doc.get('created_at')
+        transaction.updated_at = doc.get('updated_at')
+        return transaction
+
+    @classmethod
+    def from_bson_many(cls, docs):
+        from_bson = cls.from_bson
+        return [from_bson(doc) for doc in docs]
+
+    def belongs_to(self, user_id):
+        try:
+            return self.user_id == object_id(user_id)
+        except InvalidId:
+            return False
 
     @classmethod
     def from_dict(cls, data):
-        transaction = cls(
+        """Build a validated transaction from untrusted input."""
+        return cls(
             user_id=data['user_id'],
             account_id=data['account_id'],
-            amount=data['amount'],
+            amount=data.get('amount'),
+            amount_minor=data.get('amount_minor'),
             transaction_type=data['transaction_type'],
             description=data.get('description', ''),
             recipient_account_id=data.get('recipient_account_id'),
-            status=data.get('status', 'pending')
+            status=data.get('status', 'pending'),
+            reference=data.get('reference'),
+            created_at=data.get('created_at'),
+            updated_at=data.get('updated_at'),
+            _id=data.get('_id')
         )
-        if 'created_at' in data:
-            transaction.created_at = data['created_at']
-        if 'updated_at' in data:
-            transaction.updated_at = data['updated_at']
-        if 'reference' in data:
-            transaction.reference = data['reference']
-        return transaction
 
     def save(self):
-        transactions = mongo.db.transactions
-        result = transactions.insert_one(self.to_dict())
+        """Insert the record as is; used for failed attempts kept for the audit trail."""
+        transactions = durability.collection('transactions', BOOKKEEPING)
+        result = transactions.insert_one(self.to_bson())
+        self._id = result.inserted_id
+        versions.bump([self.user_id])
+        self._forget_reads()
         return str(result.inserted_id)
 
+    def apply(self):
+        """Insert the transaction as completed and move the money atomically.
+
+        The debit only matches while the balance covers the amount, so
+        concurrent transfers can never overdraw an account. A balance still
+        held in the legacy float field counts and is folded into
+        balance_minor by the same update. Write conflicts
+        are retried by run_in_transaction. The commit waits for the money
+        durability profile.
+        """
+        accounts = mongo.db.bank_accounts
+        transactions = mongo.db.transactions
+        touched = {}
+
+        def _apply(session):
+            now = datetime.utcnow()
+            self.status = 'completed'
+            self.updated_at = now
+            if self.transaction_type in DEBIT_TYPES:
+                # BALANCE_MINOR includes a legacy float balance not yet migrated
+                debited = accounts.update_one(
+                    {'_id': self.account_id, '$expr': {'$gte': [BALANCE_MINOR, self.amount_minor]}},
+                    add_balance_pipeline(-self.amount_minor, now),
+                    session=session
+                )
+                if not debited.matched_count:
+                    if accounts.find_one({'_id': self.account_id}, {'_id': 1}, session=session) is None:
+                        raise AccountNotFoundError()
+                    raise InsufficientFundsError()
+            elif self.transaction_type == 'deposit':
+                deposited = accounts.update_one(
+                    {'_id': self.account_id},
+                    add_balance_pipeline(self.amount_minor, now),
+                    session=session
+                )
+                if not deposited.matched_count:
+                    raise AccountNotFoundError()
+            if self.transaction_type == 'transfer':
+                credited = accounts.find_one_and_update(
+                    {'_id': self.recipient_account_id},
+                    add_balance_pipeline(self.amount_minor, now),
+                    projection={'user_id': 1},
+                    session=session
+                )
+                if not credited:
+                    raise RecipientNotFoundError()
+                touched['recipient_user_id'] = credited.get('user_id')
+            transactions.insert_one(self.to_bson(), session=session)
+            versions.bump([self.user_id, touched.get('recipient_user_id')], session=session)
+
+        durability.run_in_transaction(_apply, MONEY)
+        self._forget_reads(touched.get('recipient_user_id'))
+        return str(self._id)
+
+    def _forget_reads(self, recipient_user_id=None):
+        # Readers arriving after the commit must not join reads started before it
+        for user_id in (self.user_id, recipient_user_id):
+            if user_id is not None:
+                _accounts_by_user.forget(str(user_id))
+                _by_user.forget(str(user_id))
+                versions.evict([user_id])
+        for account_id in (self.account_id, self.recipient_account_id):
+            if account_id is not None:
+                _by_account.forget(str(account_id))
+
+    @staticmethod
+    def ensure_indexes():
+        transactions = mongo.db.transactions
+        transactions.create_index([('user_id', 1), ('created_at', -1)])
+        transactions.create_index([('account_id', 1), ('created_at', -1)])
+        transactions.create_index('created_at')  # tiering job's scan for old entries
+        transactions.create_index('updated_at')  # incremental reconciliation
+        transactions.create_index([('recipient_account_id', 1), ('created_at', -1)],
+                                  partialFilterExpression={'transaction_type': 'transfer'})
+        try:
+            transactions.create_index('reference', unique=True, name='unique_reference')
+        except Exception as e:
+            # Legacy second-resolution references can collide
+            print(f"Could not create unique reference index: {e}")
+
     @staticmethod
     def get_by_id(transaction_id):
         try:
-            transaction = mongo.db.transactions.find_one({
-                '_id': ObjectId(transaction_id)
-            })
-            if transaction:
-                transaction['_id'] = str(transaction['_id'])
-                transaction['account_id'] = str(transaction['account_id'])
-                if 'recipient_account_id' in transaction and transaction['recipient_account_id']:
-                    transaction['recipient_account_id'] = str(transaction['recipient_account_id'])
-            return transaction
+            oid = ObjectId(transaction_id)
+            doc = mongo.db.transactions.find_one({'_id': oid})
+            cutoff = archive_cutoff()
+            if not doc and cutoff is not None and oid.generation_time.replace(tzinfo=None) < cutoff:
+                # Ids are minted at creation, so the id's timestamp bounds the archive buckets to scan
+                created = oid.generation_time.replace(tzinfo=None)
+                doc = mongo.db[ARCHIVE_COLLECTION].find_one({
+                    '_id': oid,
+                    'created_at': {'$gte': created - ID_CLOCK_SKEW, '$lte': created + ID_CLOCK_SKEW}
+                })
+            return Transaction.from_bson(doc) if doc else None
         except Exception as e:
             print(f"Error getting transaction by ID: {e}")
             return None
 
     @staticmethod
-    def get_by_user(user_id, limit=50, skip=0):
+    def get_by_user(user_id, limit=50, skip=0, fields=None):
+        return _by_user.do((str(user_id), limit, skip, fields),
+                           lambda: Transaction._load_by_user(user_id, limit, skip, fields))
+
+    @staticmethod
+    def _load_by_user(user_id, limit, skip, fields=None):
         try:
-            transactions = list(mongo.db.transactions
-                .find({'user_id': user_id})
-                .sort('created_at', -1)
-                .skip(skip)
-                .limit(limit))
-            
-            # Convert ObjectId to string for JSON serialization
-            for t in transactions:
-                t['_id'] = str(t['_id'])
-                t['account_id'] = str(t['account_id'])
-                if 'recipient_account_id' in t and t['recipient_account_id']:
-                    t['recipient_account_id'] = str(t['recipient_account_id'])
-            
-            return transactions
+            return Transaction.from_bson_many(
+                Transaction._load_page({'user_id': object_id(user_id)}, limit, skip, fields))
         except Exception as e:
             print(f"Error getting transactions by user: {e}")
             return []
 
     @staticmethod
-    def get_by_account(account_id, limit=50, skip=0):
+    def get_by_account(account_id, limit=50, skip=0, fields=None):
+        return _by_account.do((str(account_id), limit, skip, fields),
+                              lambda: Transaction._load_by_account(account_id, limit, skip, fields))
+
+    @staticmethod
+    def _load_by_account(account_id, limit, skip, fields=None):
         try:
-            transactions = list(mongo.db.transactions
-                .find({'account_id': account_id})
-                .sort('created_at', -1)
-                .skip(skip)
-                .limit(limit))
-            
-            # Convert ObjectId to string for JSON serialization
-            for t in transactions:
-                t['_id'] = str(t['_id'])
-                t['account_id'] = str(t['account_id'])
-                if 'recipient_account_id' in t and t['recipient_account_id']:
-                    t['recipient_account_id'] = str(t['recipient_account_id'])
-            
-            return transactions
+            return Transaction.from_bson_many(
+                Transaction._load_page({'account_id': object_id(account_id)}, limit, skip, fields))
         except Exception as e:
             print(f"Error getting transactions by account: {e}")
             return []
 
+    @staticmethod
+    def _load_page(query, limit, skip, fields=None):
+        """One page of `query`, newest first, across the hot and archive tiers.
+
+        Everything created at or after the tiering cutoff is still in the hot
+        collection and everything archived is older, so the archive is only
+        read when a page runs past the hot documents newer than the cutoff.
+        """
+        proj = projection(fields, Transaction.JSON_FIELDS)
+        if proj is not None:
+            proj['created_at'] = 1  # needed to place the page against the cutoff
+        hot = mongo.db.transactions
+        docs = list(hot.find(query, proj).sort('created_at', -1).skip(skip).limit(limit))
+        cutoff = archive_cutoff()
+        if cutoff is None or (len(docs) == limit and docs[-1].get('created_at', cutoff) >= cutoff):
+            return docs
+
+        recent = [doc for doc in docs if doc.get('created_at', cutoff) >= cutoff]
+        if recent or skip == 0:
+            newer = skip + len(recent)
+        else:
+            newer = hot.count_documents(dict(query, created_at={'$gte': cutoff}))
+        offset, wanted = max(skip - newer, 0), limit - len(recent)
+
+        # Older than the cutoff: the archive, plus stragglers a running job has not moved yet
+        older_query = dict(query, created_at={'$lt': cutoff})
+        archive = mongo.db[ARCHIVE_COLLECTION]
+        stragglers = list(hot.find(older_query, proj).sort('created_at', -1).limit(offset + wanted))
+        if not stragglers:
+            return recent + list(archive.find(older_query, proj)
+                                 .sort('created_at', -1).skip(offset).limit(wanted))
+        merged = {doc['_id']: doc for doc in archive.find(older_query, proj)
+                  .sort('created_at', -1).limit(offset + wanted)}
+        merged.update((doc['_id'], doc) for doc in stragglers)  # a doc caught mid-move is in both
+        older = sorted(merged.values(), key=lambda doc: doc['created_at'], reverse=True)
+        return recent + older[offset:offset + wanted]
+
+    @staticmethod
+    def monthly_totals(user_id, since):
+        """Per-month totals of the user's completed transactions since `since`.
+
+        Newest month first, amounts in minor units split by transaction type:
+        [{'month': 'YYYY-MM', 'by_type': {type: minor}, 'count': n}].
+        The match is a range on the (user_id, created_at) index; months older
+        than the tiering cutoff are read from the archive as well.
+        """
+        match = {'$match': {'user_id': object_id(user_id), 'created_at': {'$gte': since}, 'status': 'completed'}}
+        pipeline = [match]
+        cutoff = archive_cutoff()
+        if cutoff is not None and since < cutoff:
+            pipeline.append({'$unionWith': {'coll': ARCHIVE_COLLECTION, 'pipeline': [match]}})
+        rows = mongo.db.transactions.aggregate(pipeline + [
+            {'$group': {
+                '_id': {
+                    'month': {'$dateToString': {'format': '%Y-%m', 'date': '$created_at'}},
+                    'type': '$transaction_type'
+                },
+                'total_minor': {'$sum': AMOUNT_MINOR},
+                'count': {'$sum': 1}
+            }}
+        ])
+        months = {}
+        for row in rows:
+            month = months.setdefault(row['_id']['month'], {'month': row['_id']['month'], 'by_type': {}, 'count': 0})
+            month['by_type'][row['_id']['type']] = row['total_minor']
+            month['count'] += row['count']
+        return sorted(months.values(), key=lambda m: m['month'], reverse=True)
+
     @staticmethod
     def update_status(transaction_id, status):
         try:
-            mongo.db.transactions.update_one(
+            updated = durability.collection('transactions', MONEY).find_one_and_update(
                 {'_id': ObjectId(transaction_id)},
                 {'$set': {
                     'status': status,
                     'updated_at': datetime.utcnow()
-                }}
+                }},
+                projection={'user_id': 1}
             )
+            if updated:
+                versions.bump([updated.get('user_id')])
             return True
         except Exception as e:
             print(f"Error updating transaction status: {e}")
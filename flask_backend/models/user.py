@@ -2,82 +2,122 @@ from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 from bson import ObjectId
 from extensions import mongo
+from services import single_flight
+
+# Concurrent lookups of the same user share one query
+_by_id = single_flight.group('user_by_id', timeout=2.0)
 
 class User:
+    """User record.
+
+    Takes an already-hashed password; hashing only happens through
+    set_password so loading users never pays for the KDF. The hash is stored
+    under 'password', the field the auth routes read.
+    """
+    __slots__ = ('_id', 'name', 'email', 'password_hash', 'phone_number',
+                 'created_at', 'last_login', 'is_active', 'account_count')
+
     collection_name = 'users'
-    
-    def __init__(self, name, email, password, phone_number=None, created_at=None, last_login=None, _id=None):
+
+    def __init__(self, name, email, password_hash=None, phone_number=None, created_at=None,
+                 last_login=None, is_active=True, _id=None):
         self._id = _id or ObjectId()
         self.name = name
         self.email = email
-        self.password_hash = generate_password_hash(password) if password else None
+        self.password_hash = password_hash
         self.phone_number = phone_number
         self.created_at = created_at or datetime.utcnow()
         self.last_login = last_login
-    
+        self.is_active = is_active
+        self.account_count = None  # maintained by BankAccount, never written from here
+
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
-        
+
     def check_password(self, password):
         if not self.password_hash:
             return False
         return check_password_hash(self.password_hash, password)
-    
+
     def save(self):
-        user_data = self.to_dict()
-        if self._id:
-            # Update existing user
-            result = mongo.db[self.collection_name].update_one(
-                {'_id': self._id},
-                {'$set': user_data}
-            )
-            return str(self._id)
-        else:
-            # Insert new user
-            user_data.pop('_id', None)  # Remove _id for insert
-            result = mongo.db[self.collection_name].insert_one(user_data)
-            self._id = result.inserted_id
-            return str(self._id)
-    
+        user_data = self.to_bson()
+        user_data.pop('_id')
+        # _id is always set, so upsert covers both new and existing users
+        mongo.db[self.collection_name].update_one(
+            {'_id': self._id},
+            {'$set': user_data},
+            upsert=True
+        )
+        _by_id.forget(str(self._id))
+        return str(self._id)
+
     @classmethod
     def get_by_email(cls, email):
         user_data = mongo.db[cls.collection_name].find_one({'email': email})
         if user_data:
-            return cls.from_dict(user_data)
+            return cls.from_bson(user_data)
         return None
-    
+
     @classmethod
     def get_by_id(cls, user_id):
+        return _by_id.do(str(user_id), lambda: cls._load_by_id(user_id))
+
+    @classmethod
+    def _load_by_id(cls, user_id):
         try:
             user_data = mongo.db[cls.collection_name].find_one({'_id': ObjectId(user_id)})
             if user_data:
-                return cls.from_dict(user_data)
+                return cls.from_bson(user_data)
             return None
         except:
             return None
-    
-    def to_dict(self):
+
+    def to_bson(self):
         return {
             '_id': self._id,
             'name': self.name,
             'email': self.email,
-            'password_hash': self.password_hash,
+            'password': self.password_hash,
             'phone_number': self.phone_number,
             'created_at': self.created_at,
-            'last_login': self.last_login
+            'last_login': self.last_login,
+            'is_active': self.is_active
         }
-    
+
+    to_dict = to_bson
+
+    def to_json(self):
+        """API representation without the password hash."""
+        return {
+            '_id': str(self._id),
+            'name': self.name,
+            'email': self.email,
+            'phone_number': self.phone_number,
+            'created_at': self.created_at,
+            'last_login': self.last_login,
+            'is_active': self.is_active,
+            'account_count': self.account_count
+        }
+
     @classmethod
-    def from_dict(cls, data):
-        user = cls(
-            name=data['name'],
-            email=data['email'],
-            password='',  # Password will be set from hash
-            phone_number=data.get('phone_number'),
-            created_at=data.get('created_at'),
-            last_login=data.get('last_login'),
-            _id=data.get('_id')
-        )
-        if 'password_hash' in data:
-            user.password_hash = data['password_hash']
+    def from_bson(cls, data):
+        """Wrap a stored document without re-validating or hashing anything."""
+        user = cls.__new__(cls)
+        user._id = data.get('_id')
+        user.name = data.get('name')
+        user.email = data.get('email')
+        # Older documents written by this model used 'password_hash'
+        user.password_hash = data.get('password') or data.get('password_hash')
+        user.phone_number = data.get('phone_number')
+        user.created_at = data.get('created_at')
+        user.last_login = data.get('last_login')
+        user.is_active = data.get('is_active', True)
+        user.account_count = data.get('account_count')
         return user
+
+    @classmethod
+    def from_bson_many(cls, docs):
+        from_bson = cls.from_bson
+        return [from_bson(doc) for doc in docs]
+
+    from_dict = from_bson
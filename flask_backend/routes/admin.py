@@ -0,0 +1,142 @@
+from flask import Blueprint, request, jsonify, current_app, send_from_directory
+from functools import wraps
+import hmac
+import logging
+
+from extensions import mongo
+from services.profiler import profiler, FILENAME_RE
+from services.slow_queries import slow_query_log
+from services import single_flight
+from services.admission import admission
+from services.write_behind import write_behind
+from models.durability import durability
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Create blueprint
+admin_bp = Blueprint('admin', __name__)
+
+def admin_required(fn):
+    """Require the X-Admin-Token header to match ADMIN_TOKEN.
+
+    The admin surface is disabled entirely when ADMIN_TOKEN is not set.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        expected = current_app.config.get('ADMIN_TOKEN')
+        supplied = request.headers.get('X-Admin-Token', '')
+        if not expected or not hmac.compare_digest(supplied, expected):
+            return jsonify({
+                'status': 'error',
+                'message': 'Admin access required'
+            }), 403
+        return fn(*args, **kwargs)
+    return wrapper
+
+@admin_bp.route('/profiles', methods=['GET'])
+@admin_required
+def list_profiles():
+    try:
+        limit = int(request.args.get('limit', '100'))
+    except ValueError:
+        limit = 100
+    return jsonify({
+        'status': 'success',
+        'settings': profiler.settings(),
+        'data': profiler.list_profiles(limit=limit)
+    })
+
+@admin_bp.route('/profiles/<name>', methods=['GET'])
+@admin_required
+def download_profile(name):
+    if not FILENAME_RE.match(name) or not profiler.directory:
+        return jsonify({
+            'status': 'error',
+            'message': 'Profile not found'
+        }), 404
+    return send_from_directory(profiler.directory, name, as_attachment=True)
+
+@admin_bp.route('/profiles/settings', methods=['PUT'])
+@admin_required
+def update_profile_settings():
+    """Change the sampling rate, endpoint filter or mode without a restart."""
+    data = request.get_json() or {}
+    try:
+        profiler.configure(
+            sample_rate=data.get('sample_rate'),
+            endpoints=data.get('endpoints'),
+            mode=data.get('mode')
+        )
+    except (TypeError, ValueError) as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+    logger.info(f"Profiler settings changed: {profiler.settings()}")
+    return jsonify({
+        'status': 'success',
+        'settings': profiler.settings()
+    })
+
+@admin_bp.route('/slow-queries', methods=['GET'])
+@admin_required
+def list_slow_queries():
+    """Recent slow commands; `source=db` reads the capped collection."""
+    try:
+        limit = int(request.args.get('limit', '100'))
+    except ValueError:
+        limit = 100
+    try:
+        if request.args.get('source') == 'db':
+            entries = slow_query_log.stored(mongo.db, limit=limit)
+        else:
+            entries = slow_query_log.recent(limit=limit)
+    except Exception as e:
+        logger.error(f"Error reading slow queries: {str(e)}", exc_info=True)
+        return jsonify({
+            'status': 'error',
+            'message': 'Failed to read slow queries'
+        }), 500
+    return jsonify({
+        'status': 'success',
+        'stats': slow_query_log.stats(),
+        'data': entries
+    })
+
+@admin_bp.route('/single-flight', methods=['GET'])
+@admin_required
+def single_flight_stats():
+    """Per-group call counts and coalescing ratio for this worker."""
+    return jsonify({
+        'status': 'success',
+        'data': single_flight.stats()
+    })
+
+@admin_bp.route('/admission', methods=['GET'])
+@admin_required
+def admission_stats():
+    """Current limits, queue lengths and shed counts per endpoint class."""
+    return jsonify({
+        'status': 'success',
+        'data': admission.stats()
+    })
+
+@admin_bp.route('/write-behind', methods=['GET'])
+@admin_required
+def write_behind_stats():
+    """Pending, flushed and dropped bookkeeping updates for this worker."""
+    return jsonify({
+        'status': 'success',
+        'data': write_behind.stats()
+    })
+
+@admin_bp.route('/durability', methods=['GET'])
+@admin_required
+def durability_profiles():
+    """Write concern used by each durability profile."""
+    return jsonify({
+        'status': 'success',
+        'data': durability.stats()
+    })
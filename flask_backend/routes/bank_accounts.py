@@ -1,7 +1,12 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from bson import ObjectId
-from models.bank_account import BankAccount
+from models.bank_account import BankAccount, LastAccountError
+from models.money import to_minor
+from models.fields import parse_fields
+from models.account_import import AccountImporter, iter_rows, FORMATS
+from services.versioning import conditional
+from services.admission import admission_class
 from extensions import mongo
 import logging
 
@@ -27,6 +32,14 @@ def create_account():
                 'message': 'Missing required fields'
             }), 400
         
+        try:
+            balance_minor = to_minor(data.get('balance', 0))
+        except ValueError:
+            return jsonify({
+                'status': 'error',
+                'message': 'Invalid balance'
+            }), 400
+        
         # Create new account
         account = BankAccount(
             user_id=current_user_id,
@@ -35,7 +48,7 @@ def create_account():
             bank_name=data['bank_name'],
             ifsc_code=data['ifsc_code'],
             account_type=data['account_type'],
-            balance=float(data.get('balance', 0.0)),
+            balance_minor=balance_minor,
             is_primary=bool(data.get('is_primary', False))
         )
         
@@ -56,35 +69,82 @@ def create_account():
             'error': str(e)
         }), 500
 
+@bank_accounts_bp.route('/import', methods=['POST'])
+@jwt_required()
+@admission_class('bulk')
+def import_accounts():
+    """Create many of the caller's accounts and their history from a CSV or NDJSON upload.
+
+    The body is the file itself (Content-Type text/csv or
+    application/x-ndjson, or ?format=) or a multipart upload in `file`.
+    Account rows have the columns of create_account plus optional `balance`
+    and `is_primary`; rows with `record` = transaction add past transactions
+    to the caller's accounts (see models.account_import). Rows are read from
+    the stream as they arrive; the response lists the rows that failed and why.
+    """
+    try:
+        current_user_id = get_jwt_identity()
+        upload = request.files.get('file') if request.mimetype == 'multipart/form-data' else None
+        mimetype = upload.mimetype if upload else request.mimetype
+        fmt = request.args.get('format') or ('ndjson' if 'ndjson' in (mimetype or '') else 'csv')
+        if fmt not in FORMATS:
+            return jsonify({
+                'status': 'error',
+                'message': f"format must be one of: {', '.join(FORMATS)}"
+            }), 400
+
+        importer = AccountImporter(
+            owner_id=current_user_id,
+            batch_size=current_app.config.get('IMPORT_BATCH_SIZE', 1000),
+            max_rows=current_app.config.get('IMPORT_MAX_ROWS', 50000)
+        )
+        result = importer.run(iter_rows(upload.stream if upload else request.stream, fmt))
+
+        if result.failed and not result.inserted and not result.inserted_transactions:
+            return jsonify({
+                'status': 'error',
+                'message': 'Nothing was imported',
+                'data': result.to_json()
+            }), 400
+        return jsonify({
+            'status': 'success' if not result.failed else 'partial',
+            'message': f'Imported {result.inserted} accounts and {result.inserted_transactions} '
+                       f'transactions from {result.rows} rows',
+            'data': result.to_json()
+        })
+
+    except Exception as e:
+        logger.error(f"Error importing accounts: {str(e)}", exc_info=True)
+        return jsonify({
+            'status': 'error',
+            'message': 'Failed to import accounts',
+            'error': str(e)
+        }), 500
+
 @bank_accounts_bp.route('', methods=['GET'])
 @jwt_required()
+@conditional()
 def get_accounts():
     try:
         current_user_id = get_jwt_identity()
         logger.info(f'Fetching accounts for user: {current_user_id}')
         
+        # Optional sparse fieldset (?fields=a,b or ?view=summary)
+        try:
+            fields = parse_fields(request.args.get('fields'), request.args.get('view'),
+                                  BankAccount.JSON_FIELDS, BankAccount.VIEWS)
+        except ValueError as e:
+            return jsonify({
+                'status': 'error',
+                'message': str(e)
+            }), 400
+        
         # Get accounts from database
-        accounts = BankAccount.get_by_user(current_user_id)
+        accounts = BankAccount.get_by_user(current_user_id, fields=fields)
         logger.info(f'Retrieved {len(accounts)} accounts from database')
         
         # Prepare response data
-        response_data = []
-        for account in accounts:
-            # Create a copy to avoid modifying the original
-            account_data = account.copy()
-            
-            # Convert ObjectId to string
-            account_data['_id'] = str(account_data.get('_id', ''))
-            account_data['user_id'] = str(account_data.get('user_id', ''))
-            
-            # Convert datetime to ISO format
-            if 'created_at' in account_data and account_data['created_at']:
-                account_data['created_at'] = account_data['created_at'].isoformat()
-            if 'updated_at' in account_data and account_data['updated_at']:
-                account_data['updated_at'] = account_data['updated_at'].isoformat()
-                
-            logger.info(f'Account data: {account_data}')
-            response_data.append(account_data)
+        response_data = [account.to_json(fields) for account in accounts]
         
         response = {
             'status': 'success',
@@ -116,22 +176,15 @@ def get_account(account_id):
             }), 404
             
         # Check if the account belongs to the current user
-        if str(account['user_id']) != current_user_id:
+        if not account.belongs_to(current_user_id):
             return jsonify({
                 'status': 'error',
                 'message': 'Unauthorized access to account'
             }), 403
             
-        # Convert ObjectId to string for JSON serialization
-        account['_id'] = str(account['_id'])
-        account['user_id'] = str(account['user_id'])
-        # Convert datetime to ISO format
-        account['created_at'] = account['created_at'].isoformat() if 'created_at' in account else None
-        account['updated_at'] = account['updated_at'].isoformat() if 'updated_at' in account else None
-        
         return jsonify({
             'status': 'success',
-            'data': account
+            'data': account.to_json()
         })
         
     except Exception as e:
@@ -149,32 +202,29 @@ def update_account(account_id):
         current_user_id = get_jwt_identity()
         data = request.get_json()
         
-        # Check if account exists and belongs to user
-        account = BankAccount.get_by_id(account_id)
-        if not account or str(account['user_id']) != current_user_id:
-            return jsonify({
-                'status': 'error',
-                'message': 'Account not found or unauthorized'
-            }), 404
-        
-        # Update account
+        # Only the fields sent are updated, so the account is not read first
         update_data = {
-            'account_holder_name': data.get('account_holder_name', account['account_holder_name']),
-            'bank_name': data.get('bank_name', account['bank_name']),
-            'ifsc_code': data.get('ifsc_code', account['ifsc_code']),
-            'account_type': data.get('account_type', account['account_type']),
-            'balance': float(data.get('balance', account['balance'])),
-            'is_primary': data.get('is_primary', account.get('is_primary', False))
+            field: str(data[field])
+            for field in ('account_holder_name', 'bank_name', 'ifsc_code', 'account_type')
+            if field in data
         }
+        if 'is_primary' in data:
+            update_data['is_primary'] = bool(data['is_primary'])
+        if 'balance' in data:
+            try:
+                update_data['balance_minor'] = to_minor(data['balance'])
+            except ValueError:
+                return jsonify({
+                    'status': 'error',
+                    'message': 'Invalid balance'
+                }), 400
         
-        # Update in database
-        result = BankAccount.update(account_id, update_data)
-        
-        if result.modified_count == 0:
+        # Update in database; ownership is part of the update filter
+        if not BankAccount.update(account_id, current_user_id, update_data):
             return jsonify({
                 'status': 'error',
-                'message': 'Failed to update account'
-            }), 500
+                'message': 'Account not found or unauthorized'
+            }), 404
             
         return jsonify({
             'status': 'success',
@@ -195,46 +245,20 @@ def delete_account(account_id):
     try:
         current_user_id = get_jwt_identity()
         
-        # Check if account exists and belongs to user
-        account = BankAccount.get_by_id(account_id)
-        if not account or str(account['user_id']) != current_user_id:
-            return jsonify({
-                'status': 'error',
-                'message': 'Account not found or unauthorized'
-            }), 404
-            
-        # Don't allow deleting the only account
-        user_accounts_count = mongo.db.bank_accounts.count_documents({
-            'user_id': ObjectId(current_user_id)
-        })
-        
-        if user_accounts_count <= 1:
+        # Ownership check, only-account guard and primary hand-over run in one transaction
+        try:
+            deleted = BankAccount.delete(account_id, current_user_id)
+        except LastAccountError:
             return jsonify({
                 'status': 'error',
                 'message': 'Cannot delete the only account. Please add another account first.'
             }), 400
-            
-        # If deleting primary account, set another account as primary
-        if account.get('is_primary'):
-            another_account = mongo.db.bank_accounts.find_one({
-                'user_id': ObjectId(current_user_id),
-                '_id': {'$ne': ObjectId(account_id)}
-            })
-            
-            if another_account:
-                mongo.db.bank_accounts.update_one(
-                    {'_id': another_account['_id']},
-                    {'$set': {'is_primary': True}}
-                )
         
-        # Delete the account
-        result = BankAccount.delete(account_id)
-        
-        if result.deleted_count == 0:
+        if not deleted:
             return jsonify({
                 'status': 'error',
-                'message': 'Failed to delete account'
-            }), 500
+                'message': 'Account not found or unauthorized'
+            }), 404
             
         return jsonify({
             'status': 'success',
@@ -0,0 +1,85 @@
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import logging
+
+from models.bank_account import BankAccount
+from models.transaction import Transaction
+from models.user import User
+from models.money import to_json_amount
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Create blueprint
+dashboard_bp = Blueprint('dashboard', __name__)
+
+# Shared by all requests; each dashboard issues four short reads
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='dashboard')
+
+MAX_TRANSACTIONS = 50
+MAX_MONTHS = 24
+
+def _months_ago(now, months):
+    """First instant of the month `months - 1` months before now's month."""
+    index = now.year * 12 + now.month - 1 - (months - 1)
+    return datetime(index // 12, index % 12 + 1, 1)
+
+def _in_app_context(app, fn, *args, **kwargs):
+    with app.app_context():
+        return fn(*args, **kwargs)
+
+@dashboard_bp.route('', methods=['GET'])
+@jwt_required()
+def get_dashboard():
+    """Profile, accounts, recent transactions and monthly totals in one response.
+
+    Query params: `limit` recent transactions (default 10, max 50) and
+    `months` of totals (default 6, max 24). The four reads run concurrently.
+    """
+    try:
+        current_user_id = get_jwt_identity()
+        try:
+            limit = min(max(int(request.args.get('limit', '10')), 1), MAX_TRANSACTIONS)
+            months = min(max(int(request.args.get('months', '6')), 1), MAX_MONTHS)
+        except ValueError:
+            return jsonify({
+                'status': 'error',
+                'message': 'limit and months must be integers'
+            }), 400
+
+        app = current_app._get_current_object()
+        since = _months_ago(datetime.utcnow(), months)
+        profile = _executor.submit(_in_app_context, app, User.get_by_id, current_user_id)
+        accounts = _executor.submit(_in_app_context, app, BankAccount.get_by_user, current_user_id)
+        recent = _executor.submit(_in_app_context, app, Transaction.get_by_user, current_user_id, limit, 0)
+        monthly = _executor.submit(_in_app_context, app, Transaction.monthly_totals, current_user_id, since)
+
+        user = profile.result()
+        if not user:
+            return jsonify({
+                'status': 'error',
+                'message': 'User not found'
+            }), 404
+        account_list = accounts.result()
+        total_minor = sum(account.balance_minor for account in account_list)
+
+        return jsonify({
+            'status': 'success',
+            'data': {
+                'profile': user.to_json(),
+                'accounts': [account.to_json() for account in account_list],
+                'total_balance': to_json_amount(total_minor),
+                'total_balance_minor': total_minor,
+                'recent_transactions': [t.to_json() for t in recent.result()],
+                'monthly_totals': monthly.result()
+            }
+        })
+    except Exception as e:
+        logger.error(f"Error building dashboard: {str(e)}", exc_info=True)
+        return jsonify({
+            'status': 'error',
+            'message': 'Failed to load dashboard'
+        }), 500
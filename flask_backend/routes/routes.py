@@ -5,6 +5,8 @@ from bson import ObjectId
 from werkzeug.security import generate_password_hash, check_password_hash
 from extensions import mongo
 from models.user import User
+from services.admission import admission_class
+from services.write_behind import write_behind
 import json
 
 # Create blueprint
@@ -91,6 +93,7 @@ def verify_user(email, password):
     return None
 
 @auth_bp.route('/register', methods=['POST'])
+@admission_class('auth')
 def register():
     try:
         print("\n=== Registration Endpoint Called ===")
@@ -170,6 +173,7 @@ def register():
         }), 500
 
 @auth_bp.route('/login', methods=['POST'])
+@admission_class('auth')
 def login():
     data = request.get_json()
     print("\n=== LOGIN ENDPOINT CALLED ===")
@@ -188,11 +192,8 @@ def login():
         print("4. Invalid credentials: user not found or password mismatch")
         return jsonify({'message': 'Invalid email or password'}), 401
     
-    # Update last login
-    mongo.db.users.update_one(
-        {'_id': ObjectId(user['_id'])},
-        {'$set': {'last_login': datetime.utcnow()}}
-    )
+    # Bookkeeping only: written in the background, off the login's latency
+    write_behind.update('users', ObjectId(user['_id']), {'$max': {'last_login': datetime.utcnow()}})
     
     # Generate access token
     access_token = create_access_token(identity=user['_id'])
@@ -212,17 +213,12 @@ def get_me():
     current_user_id = get_jwt_identity()
     
     try:
-        user = mongo.db.users.find_one({'_id': ObjectId(current_user_id)})
+        user = User.get_by_id(current_user_id)
         
         if not user:
             return jsonify({'message': 'User not found'}), 404
-            
-        # Convert ObjectId to string for JSON serialization
-        user['_id'] = str(user['_id'])
-        
-        # Remove password before sending response
-        user.pop('password', None)
         
-        return jsonify(user)
+        # to_json leaves out the password hash
+        return jsonify(user.to_json())
     except Exception as e:
         return jsonify({'message': str(e)}), 500
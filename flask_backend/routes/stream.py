@@ -0,0 +1,68 @@
+from flask import Blueprint, Response, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from datetime import datetime
+import json
+import logging
+
+from services.stream_hub import stream_hub
+from services.admission import admission_class
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Create blueprint
+stream_bp = Blueprint('stream', __name__)
+
+HEARTBEAT_SECONDS = 15
+RETRY_MS = 5000
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+def _format(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event, default=_default)}\n\n"
+
+@stream_bp.route('', methods=['GET'])
+@jwt_required()
+@admission_class(None)  # held open for minutes; not a unit of work
+def stream():
+    """Server-Sent Events with the caller's account and transaction changes.
+
+    Events: `account` (balance and account changes), `transaction`, and
+    `resync` when the client fell behind and should refetch. Comment lines
+    are sent as heartbeats. Each open stream holds a server thread.
+    """
+    current_user_id = get_jwt_identity()
+    if not stream_hub.available:
+        # Clients fall back to polling
+        return jsonify({
+            'status': 'error',
+            'message': 'Live updates unavailable'
+        }), 503
+
+    subscription = stream_hub.subscribe(current_user_id)
+    if subscription is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Too many open streams'
+        }), 429
+
+    def generate():
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+            while True:
+                event = subscription.get(timeout=HEARTBEAT_SECONDS)
+                if event is None:
+                    yield ": keep-alive\n\n"
+                else:
+                    yield _format(event)
+        finally:
+            stream_hub.unsubscribe(subscription)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Stop nginx from buffering the stream
+    })
@@ -1,9 +1,17 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from bson import ObjectId
-from models.transaction import Transaction
-from models.bank_account import BankAccount
+from werkzeug.security import check_password_hash
+from models.transaction import (Transaction, InsufficientFundsError, RecipientNotFoundError,
+                                AccountNotFoundError)
+from models.money import to_minor
+from models.fields import parse_fields
 from extensions import mongo
+from services.risk import risk_engine, DENY, STEP_UP
+from services.versioning import conditional
+from services.encoding import compression
+from services.admission import admission_class
+from services.identity import current_identity
 import logging
 
 # Set up logging
@@ -13,11 +21,27 @@ logger = logging.getLogger(__name__)
 # Create blueprint
 transactions_bp = Blueprint('transactions', __name__)
 
+def _parse_behavior_score(value):
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def _step_up_verified(user_id, data):
+    """Step-up is satisfied by re-entering the account password."""
+    password = data.get('password')
+    if not password:
+        return False
+    user = mongo.db.users.find_one({'_id': ObjectId(user_id)}, {'password': 1})
+    return bool(user and user.get('password') and check_password_hash(user['password'], password))
+
 @transactions_bp.route('', methods=['POST'])
 @jwt_required()
+@admission_class('transfer')
 def create_transaction():
     try:
-        current_user_id = get_jwt_identity()
+        identity = current_identity()
+        current_user_id = identity.user_id
         data = request.get_json()
         
         # Validate required fields
@@ -28,9 +52,9 @@ def create_transaction():
                 'message': 'Missing required fields'
             }), 400
         
-        # Convert amount to float
+        # Convert amount to integer minor units
         try:
-            amount = float(data['amount'])
+            amount = to_minor(data['amount'])
             if amount <= 0:
                 raise ValueError("Amount must be greater than zero")
         except (ValueError, TypeError):
@@ -39,111 +63,83 @@ def create_transaction():
                 'message': 'Invalid amount'
             }), 400
         
-        # Get the account and verify ownership
-        account = BankAccount.get_by_id(data['account_id'])
-        if not account or str(account['user_id']) != current_user_id:
+        # Verify ownership against the cached account-id set
+        if not identity.owns(data['account_id']):
             return jsonify({
                 'status': 'error',
                 'message': 'Account not found or access denied'
             }), 404
         
-        # For transfers, verify recipient account
-        recipient_account = None
-        if data['transaction_type'] == 'transfer':
-            if 'recipient_account_id' not in data:
-                return jsonify({
-                    'status': 'error',
-                    'message': 'Recipient account ID is required for transfers'
-                }), 400
-            
-            recipient_account = BankAccount.get_by_id(data['recipient_account_id'])
-            if not recipient_account:
-                return jsonify({
-                    'status': 'error',
-                    'message': 'Recipient account not found'
-                }), 404
+        # The balance and the recipient are checked by apply() in the same transaction
+        if data['transaction_type'] == 'transfer' and 'recipient_account_id' not in data:
+            return jsonify({
+                'status': 'error',
+                'message': 'Recipient account ID is required for transfers'
+            }), 400
         
-        # Check sufficient balance for withdrawals and transfers
-        if data['transaction_type'] in ['withdrawal', 'transfer']:
-            if amount > float(account['balance']):
-                return jsonify({
-                    'status': 'error',
-                    'message': 'Insufficient funds'
-                }), 400
+        # Inline risk stage: in-memory velocity counters, no extra round trips
+        risk = risk_engine.assess(
+            user_id=current_user_id,
+            account_id=data['account_id'],
+            amount=amount,
+            transaction_type=data['transaction_type'],
+            recipient_account_id=data.get('recipient_account_id'),
+            behavior_score=_parse_behavior_score(data.get('behavior_score'))
+        )
+        if risk['decision'] != 'allow':
+            logger.warning(f"Risk {risk['decision']} for user {current_user_id}: {risk['reasons']}")
+        if risk['decision'] == DENY:
+            return jsonify({
+                'status': 'error',
+                'message': 'Transaction declined',
+                'risk_decision': DENY
+            }), 403
+        if risk['decision'] == STEP_UP and not _step_up_verified(current_user_id, data):
+            return jsonify({
+                'status': 'error',
+                'message': 'Additional verification required',
+                'risk_decision': STEP_UP,
+                'step_up_required': True
+            }), 403
         
-        # Create and save the transaction
+        # Build the transaction; apply() writes it and the balances in one go
         transaction = Transaction(
             user_id=current_user_id,
             account_id=data['account_id'],
-            amount=amount,
+            amount=None,
+            amount_minor=amount,
             transaction_type=data['transaction_type'],
             description=data.get('description', ''),
             recipient_account_id=data.get('recipient_account_id'),
-            status='pending'  # Will be updated after processing
+            status='pending'
         )
         
         # Process transaction
         try:
-            transactions = mongo.db.transactions
-            accounts = mongo.db.bank_accounts
-            
-            # Start a session for atomic operations
-            with mongo.cx.start_session() as session:
-                with session.start_transaction():
-                    # Save transaction
-                    transaction_id = transaction.save()
-                    
-                    # Update account balances
-                    if data['transaction_type'] == 'deposit':
-                        accounts.update_one(
-                            {'_id': ObjectId(data['account_id'])},
-                            {'$inc': {'balance': amount}},
-                            session=session
-                        )
-                    elif data['transaction_type'] == 'withdrawal':
-                        accounts.update_one(
-                            {'_id': ObjectId(data['account_id'])},
-                            {'$inc': {'balance': -amount}},
-                            session=session
-                        )
-                    elif data['transaction_type'] == 'transfer':
-                        # Debit from sender
-                        accounts.update_one(
-                            {'_id': ObjectId(data['account_id'])},
-                            {'$inc': {'balance': -amount}},
-                            session=session
-                        )
-                        # Credit to recipient
-                        accounts.update_one(
-                            {'_id': ObjectId(data['recipient_account_id'])},
-                            {'$inc': {'balance': amount}},
-                            session=session
-                        )
-                    
-                    # Update transaction status
-                    transactions.update_one(
-                        {'_id': ObjectId(transaction_id)},
-                        {'$set': {'status': 'completed'}},
-                        session=session
-                    )
-                    
-                    session.commit_transaction()
-            
-            # Get updated transaction
-            transaction_data = Transaction.get_by_id(transaction_id)
-            
+            transaction.apply()
+        except InsufficientFundsError:
             return jsonify({
-                'status': 'success',
-                'message': 'Transaction completed successfully',
-                'data': transaction_data
-            }), 201
-            
+                'status': 'error',
+                'message': 'Insufficient funds'
+            }), 400
+        except AccountNotFoundError:
+            # Deleted since the caller's cached account-id set was loaded
+            return jsonify({
+                'status': 'error',
+                'message': 'Account not found or access denied'
+            }), 404
+        except RecipientNotFoundError:
+            return jsonify({
+                'status': 'error',
+                'message': 'Recipient account not found'
+            }), 404
         except Exception as e:
             logger.error(f"Transaction processing error: {str(e)}", exc_info=True)
-            # Update transaction status to failed
+            # Nothing was committed; keep a failed record for the audit trail
             try:
-                Transaction.update_status(transaction_id, 'failed')
-            except:
+                transaction.status = 'failed'
+                transaction.save()
+            except Exception:
                 pass
             
             return jsonify({
@@ -151,6 +147,20 @@ def create_transaction():
                 'message': 'Transaction failed',
                 'error': str(e)
             }), 500
+        
+        risk_engine.record(
+            user_id=current_user_id,
+            account_id=data['account_id'],
+            amount=amount,
+            transaction_type=data['transaction_type'],
+            recipient_account_id=data.get('recipient_account_id')
+        )
+        
+        return jsonify({
+            'status': 'success',
+            'message': 'Transaction completed successfully',
+            'data': transaction.to_json()
+        }), 201
             
     except Exception as e:
         logger.error(f"Error creating transaction: {str(e)}", exc_info=True)
@@ -162,30 +172,42 @@ def create_transaction():
 
 @transactions_bp.route('', methods=['GET'])
 @jwt_required()
+@conditional()
+@compression(br=5, zstd=6)  # large history pages; worth the extra CPU
 def get_transactions():
     try:
-        current_user_id = get_jwt_identity()
+        identity = current_identity()
+        current_user_id = identity.user_id
         account_id = request.args.get('account_id')
         limit = int(request.args.get('limit', '50'))
         skip = int(request.args.get('skip', '0'))
         
+        # Optional sparse fieldset (?fields=a,b or ?view=summary)
+        try:
+            fields = parse_fields(request.args.get('fields'), request.args.get('view'),
+                                  Transaction.JSON_FIELDS, Transaction.VIEWS)
+        except ValueError as e:
+            return jsonify({
+                'status': 'error',
+                'message': str(e)
+            }), 400
+        
         if account_id:
             # Verify account ownership
-            account = BankAccount.get_by_id(account_id)
-            if not account or str(account['user_id']) != current_user_id:
+            if not identity.owns(account_id):
                 return jsonify({
                     'status': 'error',
                     'message': 'Account not found or access denied'
                 }), 404
             
-            transactions = Transaction.get_by_account(account_id, limit, skip)
+            transactions = Transaction.get_by_account(account_id, limit, skip, fields=fields)
         else:
             # Get all transactions for user
-            transactions = Transaction.get_by_user(current_user_id, limit, skip)
+            transactions = Transaction.get_by_user(current_user_id, limit, skip, fields=fields)
         
         return jsonify({
             'status': 'success',
-            'data': transactions
+            'data': [t.to_json(fields) for t in transactions]
         })
         
     except Exception as e:
@@ -211,7 +233,7 @@ def get_transaction(transaction_id):
             }), 404
         
         # Verify ownership
-        if str(transaction['user_id']) != current_user_id:
+        if not transaction.belongs_to(current_user_id):
             return jsonify({
                 'status': 'error',
                 'message': 'Access denied'
@@ -219,7 +241,7 @@ def get_transaction(transaction_id):
         
         return jsonify({
             'status': 'success',
-            'data': transaction
+            'data': transaction.to_json()
         })
         
     except Exception as e:
@@ -3,6 +3,10 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from bson import ObjectId
 from extensions import mongo
 from models.bank_account import BankAccount
+from models.fields import parse_fields
+from services.versioning import conditional
+from services.admission import admission_class
+from services.identity import current_identity
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -13,6 +17,7 @@ users_bp = Blueprint('users', __name__)
 
 @users_bp.route('', methods=['GET'])
 @jwt_required()
+@admission_class('search')
 def list_users():
     """Return a minimal list of users for recipient selection.
     Optional query param `q` filters by name/email substring (case-insensitive).
@@ -56,33 +61,29 @@ def list_users():
 
 @users_bp.route('/<user_id>/accounts', methods=['GET'])
 @jwt_required()
+@conditional(user_arg='user_id')
 def list_user_accounts(user_id: str):
-    """Return bank accounts for a specific user to allow transfers."""
-    try:
-        accounts = BankAccount.get_by_user(user_id) or []
+    """Return bank accounts for a specific user to allow transfers.
 
-        normalized = []
-        for acc in accounts:
-            # Ensure ObjectIds are stringified and datetimes serialized
-            try:
-                acc['_id'] = str(acc.get('_id'))
-            except Exception:
-                pass
-            try:
-                acc['user_id'] = str(acc.get('user_id'))
-            except Exception:
-                pass
-            if 'created_at' in acc and acc['created_at']:
-                try:
-                    acc['created_at'] = acc['created_at'].isoformat()
-                except Exception:
-                    pass
-            if 'updated_at' in acc and acc['updated_at']:
-                try:
-                    acc['updated_at'] = acc['updated_at'].isoformat()
-                except Exception:
-                    pass
-            normalized.append(acc)
+    Other users' accounts default to the lean "recipient" view, and `fields`
+    may only pick from it: no balances or full account numbers.
+    """
+    try:
+        own = current_identity().is_user(user_id)
+        try:
+            fields = parse_fields(
+                request.args.get('fields'), request.args.get('view'),
+                BankAccount.JSON_FIELDS if own else BankAccount.RECIPIENT_FIELDS,
+                BankAccount.VIEWS,
+                default_view=None if own else 'recipient'
+            )
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+
+        accounts = BankAccount.get_by_user(user_id, fields=fields) or []
+
+        # Ensure ObjectIds are stringified and datetimes serialized
+        normalized = [acc.to_json(fields) for acc in accounts]
 
         return jsonify({'status': 'success', 'data': normalized})
     except Exception as e:
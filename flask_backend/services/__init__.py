@@ -0,0 +1,2 @@
+# This makes the services directory a Python package
+# In-process components shared by the blueprints live here
@@ -0,0 +1,222 @@
+"""Admission control: per-class concurrency limits with load shedding.
+
+Every request belongs to an endpoint class (`@admission_class('search')` on
+the view, `default` otherwise). A request runs only when its class is under
+its concurrency limit and the process is under ADMISSION_CAPACITY; otherwise
+it queues. Queued requests are admitted by class priority, so transfers go
+ahead of logins, everyday reads, search and export, and bulk imports last. A request that
+cannot start within its class's queue deadline, or finds the class's queue
+full, gets an immediate 503 with Retry-After instead of tying up a worker.
+
+Class limits adapt with AIMD on observed latency: each response within the
+class's target latency while the class is at its limit raises the limit by
+1/limit (about one per round of requests); a slower response cuts it by
+`backoff`, at most once per target-latency window. Slow scans and KDF-bound
+logins therefore shrink their own share of the workers first.
+
+Views marked `@admission_class(None)` (long-lived streams) are not counted.
+"""
+import bisect
+import itertools
+import logging
+import math
+import threading
+import time
+
+from flask import current_app, g, jsonify, request
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CLASS = 'default'
+DEFAULT_CLASSES = {
+    # priority (lower first), queue deadline and target latency in seconds, limit bounds
+    'transfer': {'priority': 0, 'max_wait': 2.0, 'target_latency': 1.0, 'initial': 16, 'min': 4, 'max': 64},
+    'auth': {'priority': 1, 'max_wait': 1.0, 'target_latency': 1.0, 'initial': 8, 'min': 2, 'max': 32},
+    'default': {'priority': 2, 'max_wait': 1.0, 'target_latency': 0.5, 'initial': 16, 'min': 2, 'max': 64},
+    'search': {'priority': 3, 'max_wait': 0.5, 'target_latency': 0.5, 'initial': 4, 'min': 1, 'max': 16},
+    'export': {'priority': 3, 'max_wait': 0.5, 'target_latency': 2.0, 'initial': 2, 'min': 1, 'max': 8},
+    'bulk': {'priority': 4, 'max_wait': 0.5, 'target_latency': 30.0, 'initial': 1, 'min': 1, 'max': 2},
+}
+
+
+def admission_class(name):
+    """Put a view in an endpoint class: @admission_class('search'), or None to exempt it."""
+    def decorator(view):
+        view.admission_class = name
+        return view
+    return decorator
+
+
+class EndpointClass:
+    """One class's adaptive limit and counters."""
+
+    def __init__(self, name, priority, max_wait, target_latency, initial, min, max,
+                 backoff=0.7, max_queue=None):
+        self.name = name
+        self.priority = priority
+        self.max_wait = max_wait
+        self.target_latency = target_latency
+        self.min_limit = min
+        self.max_limit = max
+        self.backoff = backoff
+        self.max_queue = max_queue if max_queue is not None else max * 2
+        self.limit = float(initial)
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._last_decrease = 0.0
+
+    def has_room(self):
+        return self.in_flight < int(self.limit)
+
+    def observe(self, latency, now):
+        """AIMD step for one finished request; called with the controller lock held."""
+        if latency > self.target_latency:
+            if now - self._last_decrease >= self.target_latency:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self._last_decrease = now
+        elif self.in_flight + 1 >= int(self.limit):
+            # Only grow while the limit is what holds the class back
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+    def stats(self):
+        return {
+            'priority': self.priority,
+            'limit': round(self.limit, 2),
+            'in_flight': self.in_flight,
+            'queued': self.queued,
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+            'max_wait': self.max_wait,
+            'target_latency': self.target_latency
+        }
+
+
+class _Waiter:
+    __slots__ = ('endpoint_class', 'event', 'granted')
+
+    def __init__(self, endpoint_class):
+        self.endpoint_class = endpoint_class
+        self.event = threading.Event()
+        self.granted = False
+
+
+class AdmissionController:
+    """Admits, queues or sheds requests by endpoint class."""
+
+    def __init__(self):
+        self.enabled = True
+        self.capacity = 32
+        self.retry_after = 1
+        self.classes = {name: EndpointClass(name, **settings) for name, settings in DEFAULT_CLASSES.items()}
+        self.in_flight = 0
+        self._waiting = []  # (priority, seq, waiter), kept sorted
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.enabled = bool(app.config.get('ADMISSION_ENABLED', self.enabled))
+        self.capacity = int(app.config.get('ADMISSION_CAPACITY', self.capacity))
+        self.retry_after = int(app.config.get('ADMISSION_RETRY_AFTER', self.retry_after))
+        for name, overrides in (app.config.get('ADMISSION_CLASSES') or {}).items():
+            settings = dict(DEFAULT_CLASSES.get(name, DEFAULT_CLASSES[DEFAULT_CLASS]), **overrides)
+            self.classes[name] = EndpointClass(name, **settings)
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+
+    def _class_for_request(self):
+        view = current_app.view_functions.get(request.endpoint) if request.endpoint else None
+        if view is None or request.method == 'OPTIONS':
+            return None
+        name = getattr(view, 'admission_class', DEFAULT_CLASS)
+        if name is None:
+            return None
+        return self.classes.get(name) or self.classes[DEFAULT_CLASS]
+
+    def acquire(self, endpoint_class):
+        """True once the request may run; False if it should be shed."""
+        with self._lock:
+            # Queued requests that could run were dispatched on the last release
+            if endpoint_class.has_room() and self.in_flight < self.capacity:
+                self._grant(endpoint_class)
+                return True
+            if endpoint_class.queued >= endpoint_class.max_queue:
+                endpoint_class.rejected += 1
+                return False
+            waiter = _Waiter(endpoint_class)
+            bisect.insort(self._waiting, (endpoint_class.priority, next(self._seq), waiter))
+            endpoint_class.queued += 1
+
+        waiter.event.wait(endpoint_class.max_wait)
+        with self._lock:
+            if waiter.granted:
+                return True
+            # Deadline passed: leave the queue
+            self._waiting = [entry for entry in self._waiting if entry[2] is not waiter]
+            endpoint_class.queued -= 1
+            endpoint_class.rejected += 1
+            return False
+
+    def release(self, endpoint_class, latency):
+        with self._lock:
+            endpoint_class.in_flight -= 1
+            self.in_flight -= 1
+            endpoint_class.observe(latency, time.monotonic())
+            self._dispatch()
+
+    def _grant(self, endpoint_class):
+        endpoint_class.in_flight += 1
+        endpoint_class.admitted += 1
+        self.in_flight += 1
+
+    def _dispatch(self):
+        # Highest priority first; a waiter whose class is at its limit lets later ones through
+        index = 0
+        while index < len(self._waiting) and self.in_flight < self.capacity:
+            waiter = self._waiting[index][2]
+            if waiter.endpoint_class.has_room():
+                del self._waiting[index]
+                waiter.endpoint_class.queued -= 1
+                self._grant(waiter.endpoint_class)
+                waiter.granted = True
+                waiter.event.set()
+            else:
+                index += 1
+
+    def _before_request(self):
+        if not self.enabled:
+            return None
+        endpoint_class = self._class_for_request()
+        if endpoint_class is None:
+            return None
+        if not self.acquire(endpoint_class):
+            logger.warning(f"Shed {request.method} {request.path} ({endpoint_class.name})")
+            retry_after = max(self.retry_after, math.ceil(endpoint_class.target_latency))
+            response = jsonify({
+                'status': 'error',
+                'message': 'Server is busy, please retry shortly'
+            })
+            response.status_code = 503
+            response.headers['Retry-After'] = str(retry_after)
+            return response
+        g.admission = (endpoint_class, time.monotonic())
+        return None
+
+    def _teardown_request(self, exc=None):
+        admitted = g.pop('admission', None)
+        if admitted is not None:
+            endpoint_class, started = admitted
+            self.release(endpoint_class, time.monotonic() - started)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'capacity': self.capacity,
+                'in_flight': self.in_flight,
+                'classes': {name: endpoint_class.stats() for name, endpoint_class in sorted(self.classes.items())}
+            }
+
+
+admission = AdmissionController()
@@ -0,0 +1,199 @@
+"""Response content negotiation: MessagePack bodies and streaming compression.
+
+`Accept: application/msgpack` makes jsonify() emit MessagePack instead of
+JSON, packed straight from the Python objects (needs the optional `msgpack`
+package; JSON is served otherwise).
+
+Responses are compressed with the best encoding both sides support (zstd,
+br, gzip; brotli and zstandard are optional imports). Buffered bodies are
+compressed only above COMPRESS_MIN_SIZE bytes; streamed bodies always are.
+Compression runs chunk by chunk as the server writes the body, so the
+compressed copy never sits in memory next to the original. Event streams
+and already-encoded bodies are left alone.
+
+Levels can be tuned per view with @compression(gzip=.., br=.., zstd=..) or
+turned off with @compression(enabled=False).
+"""
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+
+from bson import ObjectId
+from flask import current_app, request
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+
+try:
+    import msgpack
+except ImportError:  # optional
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional
+    zstandard = None
+
+MSGPACK = 'application/msgpack'
+CHUNK_SIZE = 64 * 1024
+DEFAULT_LEVELS = {'zstd': 3, 'br': 4, 'gzip': 6}
+SKIP_MIMETYPES = ('text/event-stream', 'image/', 'video/', 'audio/', 'application/zip', 'application/gzip')
+
+
+def compression(enabled=True, **levels):
+    """Per-view compression settings: @compression(gzip=9, br=6) or enabled=False."""
+    def decorator(view):
+        view.compression = {'enabled': enabled, 'levels': levels}
+        return view
+    return decorator
+
+
+class _Gzip:
+    def __init__(self, level):
+        self._c = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip container
+
+    def compress(self, data):
+        return self._c.compress(data)
+
+    def flush(self):
+        return self._c.flush()
+
+
+class _Brotli:
+    def __init__(self, level):
+        self._c = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._c.process(data)
+
+    def flush(self):
+        return self._c.finish()
+
+
+class _Zstd:
+    def __init__(self, level):
+        self._c = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self._c.compress(data)
+
+    def flush(self):
+        return self._c.flush()
+
+
+def available_encodings():
+    """Supported encodings in server preference order."""
+    encodings = []
+    if zstandard is not None:
+        encodings.append(('zstd', _Zstd))
+    if brotli is not None:
+        encodings.append(('br', _Brotli))
+    encodings.append(('gzip', _Gzip))
+    return encodings
+
+
+def negotiate_encoding(accept_encodings):
+    """Pick (name, compressor class) by client q-value, then server preference."""
+    best, best_quality = None, 0
+    for name, compressor in available_encodings():
+        quality = accept_encodings[name]
+        if quality > best_quality:
+            best, best_quality = (name, compressor), quality
+    return best
+
+
+def _compressed(chunks, compressor):
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            # Feed large buffered bodies in slices so output is released as it is produced
+            for start in range(0, len(chunk), CHUNK_SIZE):
+                out = compressor.compress(chunk[start:start + CHUNK_SIZE])
+                if out:
+                    yield out
+        tail = compressor.flush()
+        if tail:
+            yield tail
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def _msgpack_default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime) or isinstance(value, date):
+        return http_date(value)  # same representation as the JSON responses
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f'Cannot serialize {type(value).__name__}')
+
+
+class NegotiatingJSONProvider(DefaultJSONProvider):
+    """jsonify() that answers with MessagePack when the client asks for it."""
+
+    def response(self, *args, **kwargs):
+        if msgpack is not None and request and \
+                request.accept_mimetypes.best_match(['application/json', MSGPACK]) == MSGPACK:
+            obj = self._prepare_response_obj(args, kwargs)
+            response = self._app.response_class(
+                msgpack.packb(obj, default=_msgpack_default, use_bin_type=True), mimetype=MSGPACK)
+        else:
+            response = super().response(*args, **kwargs)
+        response.vary.add('Accept')
+        return response
+
+
+class ResponseEncoder:
+    """Installs the negotiating JSON provider and the compression hook."""
+
+    def __init__(self):
+        self.enabled = True
+        self.min_size = 1024
+        self.levels = dict(DEFAULT_LEVELS)
+
+    def init_app(self, app):
+        self.enabled = bool(app.config.get('COMPRESS_ENABLED', self.enabled))
+        self.min_size = int(app.config.get('COMPRESS_MIN_SIZE', self.min_size))
+        self.levels.update(app.config.get('COMPRESS_LEVELS') or {})
+        app.json = NegotiatingJSONProvider(app)
+        app.after_request(self.compress)
+
+    def _view_settings(self):
+        view = current_app.view_functions.get(request.endpoint) if request.endpoint else None
+        return getattr(view, 'compression', None) or {'enabled': True, 'levels': {}}
+
+    def compress(self, response):
+        if not self.enabled or request.method == 'HEAD' or response.status_code != 200:
+            return response
+        if 'Content-Encoding' in response.headers or response.direct_passthrough:
+            return response
+        if response.mimetype.startswith(SKIP_MIMETYPES):
+            return response
+        settings = self._view_settings()
+        if not settings['enabled']:
+            return response
+        if not response.is_streamed:
+            length = response.calculate_content_length()
+            if length is not None and length < self.min_size:
+                return response
+
+        response.vary.add('Accept-Encoding')
+        chosen = negotiate_encoding(request.accept_encodings)
+        if chosen is None:
+            return response
+        name, compressor_class = chosen
+        level = settings['levels'].get(name, self.levels[name])
+
+        response.response = _compressed(response.response, compressor_class(level))
+        response.headers['Content-Encoding'] = name
+        response.headers.pop('Content-Length', None)
+        return response
+
+
+encoder = ResponseEncoder()
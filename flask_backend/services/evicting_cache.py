@@ -0,0 +1,53 @@
+"""Per-key expiring cache where an eviction always beats a concurrent load.
+
+A reader calls begin(key) before loading from MongoDB and stores the result
+with fill(key, token, value, expires). evict() and clear() drop outstanding
+tokens, so a load that started before an eviction cannot put the value it
+read back into the cache. All bookkeeping happens under one lock; the load
+itself runs outside it.
+"""
+import threading
+import time
+
+
+class EvictingCache:
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self._entries = {}  # key -> (value, expires)
+        self._loading = {}  # key -> token of the load allowed to fill the entry
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """The cached value for key, or None when missing or expired."""
+        entry = self._entries.get(key)
+        if entry and entry[1] > time.monotonic():
+            return entry[0]
+        return None
+
+    def begin(self, key):
+        """Token for a load of key; pass it to fill()."""
+        token = object()
+        with self._lock:
+            self._loading[key] = token
+        return token
+
+    def fill(self, key, token, value, expires):
+        """Store value unless key was evicted (or reloaded) since begin()."""
+        with self._lock:
+            if self._loading.get(key) is not token:
+                return
+            del self._loading[key]
+            if len(self._entries) >= self.max_entries:
+                self._entries.clear()
+            self._entries[key] = (value, expires)
+
+    def evict(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+                self._loading.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._loading.clear()
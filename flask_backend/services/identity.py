@@ -0,0 +1,112 @@
+"""Request identity with a cached set of the caller's account ids.
+
+current_identity() resolves the JWT identity once per request (kept on `g`).
+Its account-id set comes from a process-wide cache, so ownership checks are
+set lookups instead of reading the account from MongoDB.
+
+The cache is evicted when the user's accounts are created or deleted, locally
+by the model and in other workers by the stream hub's change events, and
+entries expire after ACCOUNT_SET_TTL seconds. Account ownership never moves
+between users, so a stale set can only be missing a new account or still
+list a deleted one. Delete events carry no owner unless pre-images are
+enabled, so the cache also remembers the owner of every account id it holds
+and evicts by account id. A miss is therefore re-checked against MongoDB before
+access is denied, and a deleted account fails in the operation itself.
+"""
+import time
+
+from flask import g
+from flask_jwt_extended import get_jwt_identity
+
+from extensions import mongo
+from ids import object_id
+from services.evicting_cache import EvictingCache
+
+
+class AccountSetCache:
+    """Per-user frozensets of account id strings with a short TTL."""
+
+    def __init__(self, ttl=30.0, max_entries=100000):
+        self.ttl = ttl
+        self.max_owners = max_entries * 10
+        self._cache = EvictingCache(max_entries)  # user_id str -> frozenset of account id strs
+        self._owners = {}  # account id str -> user_id str, for every cached set
+
+    def init_app(self, app):
+        self.ttl = float(app.config.get('ACCOUNT_SET_TTL', self.ttl))
+        from services.stream_hub import stream_hub
+        stream_hub.on_change(self._on_change)
+        stream_hub.on_reset(self.clear)
+
+    def get(self, user_id, refresh=False):
+        key = str(user_id)
+        if not refresh:
+            cached = self._cache.get(key)
+            if cached is not None:
+                return cached
+        token = self._cache.begin(key)
+        expires = time.monotonic() + self.ttl
+
+        docs = mongo.db.bank_accounts.find({'user_id': object_id(user_id)}, {'_id': 1})
+        account_ids = frozenset(str(doc['_id']) for doc in docs)
+        if len(self._owners) >= self.max_owners:
+            self.clear()  # also drops our token, so the set is not cached without its owners
+        for account_id in account_ids:
+            self._owners[account_id] = key
+        self._cache.fill(key, token, account_ids, expires)
+        return account_ids
+
+    def clear(self):
+        self._cache.clear()
+        self._owners.clear()
+
+    def evict(self, user_id):
+        self._cache.evict([str(user_id)])
+
+    def _on_change(self, collection, user_id, document_id):
+        if collection != 'bank_accounts':
+            return
+        if user_id is None:
+            # A delete without a pre-image: find the owner through the account id
+            user_id = self._owners.pop(str(document_id), None)
+        if user_id is not None:
+            self.evict(user_id)
+
+
+account_sets = AccountSetCache()
+
+
+class Identity:
+    """The authenticated caller for the current request."""
+
+    __slots__ = ('user_id', '_account_ids')
+
+    def __init__(self, user_id):
+        self.user_id = str(user_id)
+        self._account_ids = None
+
+    @property
+    def account_ids(self):
+        if self._account_ids is None:
+            self._account_ids = account_sets.get(self.user_id)
+        return self._account_ids
+
+    def owns(self, account_id):
+        """True if account_id (string or ObjectId) is one of the caller's accounts."""
+        account_id = str(account_id)
+        if account_id in self.account_ids:
+            return True
+        # Possibly created since the set was cached
+        self._account_ids = account_sets.get(self.user_id, refresh=True)
+        return account_id in self._account_ids
+
+    def is_user(self, user_id):
+        return str(user_id) == self.user_id
+
+
+def current_identity():
+    """Identity of the JWT holder, resolved once per request."""
+    identity = g.get('identity')
+    if identity is None:
+        identity = g.identity = Identity(get_jwt_identity())
+    return identity
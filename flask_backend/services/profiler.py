@@ -0,0 +1,233 @@
+"""Opt-in per-request profiling around the blueprint view functions.
+
+A request is profiled when it carries a valid signed `X-Profile` header or
+is picked by the configured sampling rate. Two profilers are available:
+
+* `cprofile` writes a `.pstats` file (snakeviz, flameprof, `python -m pstats`)
+* `sample` runs a stack sampler thread and writes a `.folded` file in the
+  collapsed-stack format flamegraph.pl and speedscope read directly
+
+Files are named `<unix ms>-<endpoint>-<duration>ms-<id>.<ext>` in
+PROFILE_DIR, and only the newest PROFILE_KEEP are kept. The admin blueprint
+lists and serves them, and can change the sampling rate at runtime.
+
+Signed header: `X-Profile: <unix seconds>.<hex HMAC-SHA256(PROFILE_SECRET,
+"<unix seconds>:<path>")>`, accepted for PROFILE_SIGNATURE_TTL seconds.
+"""
+import cProfile
+import hashlib
+import hmac
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from functools import wraps
+
+from flask import g, request
+
+logger = logging.getLogger(__name__)
+
+MODES = ('cprofile', 'sample')
+EXTENSIONS = {'cprofile': '.pstats', 'sample': '.folded'}
+FILENAME_RE = re.compile(r'^(\d+)-([\w.]+)-(\d+)ms-([0-9a-f]+)\.(pstats|folded)$')
+
+
+def sign(secret, timestamp, path):
+    """Signature expected in the X-Profile header."""
+    message = f'{timestamp}:{path}'.encode()
+    return hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+
+
+class StackSampler:
+    """Samples one thread's stack at a fixed interval into folded stacks."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self._target = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._target = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+
+
+class RequestProfiler:
+    """Decides which requests to profile and stores the results."""
+
+    def __init__(self):
+        self.sample_rate = 0.0
+        self.endpoints = set()  # empty means every blueprint endpoint
+        self.mode = 'cprofile'
+        self.secret = None
+        self.signature_ttl = 300
+        self.directory = None
+        self.keep = 200
+        self.sampler_interval = 0.005
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Read config and wrap the blueprint views registered so far."""
+        self.configure(
+            sample_rate=app.config.get('PROFILE_SAMPLE_RATE', 0.0),
+            endpoints=app.config.get('PROFILE_ENDPOINTS'),
+            mode=app.config.get('PROFILE_MODE', 'cprofile')
+        )
+        self.secret = app.config.get('PROFILE_SECRET') or None
+        self.signature_ttl = int(app.config.get('PROFILE_SIGNATURE_TTL', self.signature_ttl))
+        self.directory = app.config.get('PROFILE_DIR') or os.path.join(app.root_path, 'profiles')
+        self.keep = int(app.config.get('PROFILE_KEEP', self.keep))
+        self.sampler_interval = float(app.config.get('PROFILE_SAMPLER_INTERVAL', self.sampler_interval))
+
+        for endpoint, view in list(app.view_functions.items()):
+            # Blueprint views only; never profile the admin surface itself
+            if '.' in endpoint and not endpoint.startswith('admin.'):
+                app.view_functions[endpoint] = self._wrap(endpoint, view)
+
+        @app.after_request
+        def add_profile_header(response):
+            profile_id = g.pop('profile_id', None)
+            if profile_id:
+                response.headers['X-Profile-Id'] = profile_id
+            return response
+
+    def configure(self, sample_rate=None, endpoints=None, mode=None):
+        """Change what gets profiled; safe to call while serving."""
+        if sample_rate is not None:
+            sample_rate = float(sample_rate)
+            if not 0.0 <= sample_rate <= 1.0:
+                raise ValueError('sample_rate must be between 0 and 1')
+            self.sample_rate = sample_rate
+        if endpoints is not None:
+            if isinstance(endpoints, str):
+                endpoints = [e for e in endpoints.split(',') if e.strip()]
+            self.endpoints = {e.strip() for e in endpoints}
+        if mode is not None:
+            if mode not in MODES:
+                raise ValueError(f'mode must be one of {MODES}')
+            self.mode = mode
+
+    def settings(self):
+        return {
+            'sample_rate': self.sample_rate,
+            'endpoints': sorted(self.endpoints),
+            'mode': self.mode,
+            'signed_header_enabled': bool(self.secret),
+            'keep': self.keep
+        }
+
+    def _signed(self):
+        header = request.headers.get('X-Profile')
+        if not header or not self.secret:
+            return False
+        timestamp, _, signature = header.partition('.')
+        try:
+            if abs(time.time() - int(timestamp)) > self.signature_ttl:
+                return False
+        except ValueError:
+            return False
+        return hmac.compare_digest(signature, sign(self.secret, timestamp, request.path))
+
+    def _should_profile(self, endpoint):
+        if self._signed():
+            return True
+        if self.sample_rate <= 0.0 or (self.endpoints and endpoint not in self.endpoints):
+            return False
+        return random.random() < self.sample_rate
+
+    def _wrap(self, endpoint, view):
+        @wraps(view)
+        def profiled_view(*args, **kwargs):
+            if not self._should_profile(endpoint):
+                return view(*args, **kwargs)
+            mode = self.mode
+            started = time.perf_counter()
+            if mode == 'sample':
+                profile = StackSampler(self.sampler_interval)
+                profile.start()
+                try:
+                    return view(*args, **kwargs)
+                finally:
+                    profile.stop()
+                    self._store(profile, endpoint, mode, started)
+            profile = cProfile.Profile()
+            try:
+                return profile.runcall(view, *args, **kwargs)
+            finally:
+                self._store(profile, endpoint, mode, started)
+        return profiled_view
+
+    def _store(self, profile, endpoint, mode, started):
+        duration_ms = int((time.perf_counter() - started) * 1000)
+        name = f'{int(time.time() * 1000)}-{endpoint}-{duration_ms}ms-{uuid.uuid4().hex[:8]}{EXTENSIONS[mode]}'
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            if mode == 'sample':
+                profile.dump(os.path.join(self.directory, name))
+            else:
+                profile.dump_stats(os.path.join(self.directory, name))
+            g.profile_id = name
+            self._prune()
+        except Exception as e:
+            # Profiling must never fail the request
+            logger.error(f"Could not write profile {name}: {str(e)}")
+
+    def _prune(self):
+        with self._lock:
+            names = sorted(n for n in os.listdir(self.directory) if FILENAME_RE.match(n))
+            for name in names[:-self.keep] if len(names) > self.keep else []:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    def list_profiles(self, limit=100):
+        """Newest first: [{'name', 'endpoint', 'duration_ms', 'created_at', 'size', 'format'}]."""
+        if not self.directory or not os.path.isdir(self.directory):
+            return []
+        profiles = []
+        for name in sorted(os.listdir(self.directory), reverse=True):
+            match = FILENAME_RE.match(name)
+            if not match:
+                continue
+            profiles.append({
+                'name': name,
+                'endpoint': match.group(2),
+                'duration_ms': int(match.group(3)),
+                'created_at': int(match.group(1)) / 1000.0,
+                'size': os.path.getsize(os.path.join(self.directory, name)),
+                'format': match.group(5)
+            })
+            if len(profiles) >= limit:
+                break
+        return profiles
+
+
+profiler = RequestProfiler()
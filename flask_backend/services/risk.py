@@ -0,0 +1,284 @@
+"""Inline risk stage for money movement.
+
+Velocity counters live in memory as fixed-size ring buffers so an assessment
+is a handful of dict lookups and never touches MongoDB. The counters are
+rebuilt from the last 24 hours of transactions when the app starts.
+Amounts are integer minor units throughout.
+"""
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+
+from extensions import mongo
+from models.money import AMOUNT_MINOR
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1)  # created_at values are naive UTC
+
+ALLOW = 'allow'
+STEP_UP = 'step_up'
+DENY = 'deny'
+
+# (name, bucket count, bucket width in seconds)
+# Only money leaving an account counts towards the amount windows
+OUTGOING_TYPES = ('withdrawal', 'transfer', 'payment')
+
+WINDOWS = (
+    ('1m', 60, 1),
+    ('1h', 60, 60),
+    ('24h', 96, 900),
+)
+
+DEFAULT_LIMITS = {
+    'account_count_1m': 5,
+    'account_count_1h': 30,
+    'user_count_24h': 100,
+    'user_sum_1h': 5000000,  # minor units
+    'user_sum_24h': 20000000,
+    'unusual_amount_sigma': 3.0,
+    'unusual_amount_min_samples': 5,
+}
+
+# Weight added to the risk score when a signal fires
+WEIGHTS = {
+    'account_velocity_1m': 0.5,
+    'account_velocity_1h': 0.3,
+    'user_velocity_24h': 0.3,
+    'user_amount_1h': 0.4,
+    'user_amount_24h': 0.5,
+    'new_recipient': 0.2,
+    'unusual_amount': 0.3,
+    'behavior_mismatch': 0.5,
+}
+
+
+class SlidingWindow:
+    """Count and sum over a trailing window using a ring of time buckets."""
+    __slots__ = ('bucket_seconds', 'counts', 'sums', 'total_count', 'total_sum', 'head')
+
+    def __init__(self, buckets, bucket_seconds):
+        self.bucket_seconds = bucket_seconds
+        self.counts = [0] * buckets
+        self.sums = [0] * buckets
+        self.total_count = 0
+        self.total_sum = 0
+        self.head = None  # absolute index of the newest bucket
+
+    def _advance(self, index):
+        if self.head is None:
+            self.head = index
+            return
+        if index <= self.head:
+            return
+        size = len(self.counts)
+        steps = index - self.head
+        if steps >= size:
+            # Whole window expired
+            self.counts = [0] * size
+            self.sums = [0] * size
+            self.total_count = 0
+            self.total_sum = 0
+        else:
+            for i in range(1, steps + 1):
+                slot = (self.head + i) % size
+                self.total_count -= self.counts[slot]
+                self.total_sum -= self.sums[slot]
+                self.counts[slot] = 0
+                self.sums[slot] = 0
+        self.head = index
+
+    def add(self, ts, amount):
+        index = int(ts // self.bucket_seconds)
+        self._advance(index)
+        if index <= self.head - len(self.counts):
+            return  # Older than the window
+        slot = index % len(self.counts)
+        self.counts[slot] += 1
+        self.sums[slot] += amount
+        self.total_count += 1
+        self.total_sum += amount
+
+    def totals(self, now):
+        self._advance(int(now // self.bucket_seconds))
+        return self.total_count, self.total_sum
+
+
+class _Velocity:
+    __slots__ = ('windows',)
+
+    def __init__(self):
+        self.windows = {name: SlidingWindow(buckets, width) for name, buckets, width in WINDOWS}
+
+    def add(self, ts, amount):
+        for window in self.windows.values():
+            window.add(ts, amount)
+
+    def totals(self, now):
+        return {name: window.totals(now) for name, window in self.windows.items()}
+
+
+class _AmountStats:
+    """Running mean/variance of amounts (Welford)."""
+    __slots__ = ('n', 'mean', 'm2')
+
+    def __init__(self, n=0, mean=0.0, std=0.0):
+        self.n = n
+        self.mean = mean
+        self.m2 = (std ** 2) * n
+
+    def add(self, amount):
+        self.n += 1
+        delta = amount - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (amount - self.mean)
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / self.n) if self.n else 0.0
+
+
+class RiskEngine:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._accounts = {}
+        self._users = {}
+        self._amounts = {}
+        self._recipients = {}
+        self._behavior_thresholds = {}
+        self.limits = dict(DEFAULT_LIMITS)
+        self.step_up_score = 0.4
+        self.deny_score = 0.9
+        self.default_behavior_threshold = 0.5
+
+    def init_app(self, app):
+        self.limits.update(app.config.get('RISK_LIMITS', {}))
+        self.step_up_score = float(app.config.get('RISK_STEP_UP_SCORE', self.step_up_score))
+        self.deny_score = float(app.config.get('RISK_DENY_SCORE', self.deny_score))
+
+        try:
+            with app.app_context():
+                self.rebuild()
+        except Exception as e:
+            # Start with empty counters rather than refusing to serve
+            logger.error(f"Could not rebuild risk counters: {str(e)}", exc_info=True)
+
+    def rebuild(self, history_days=90):
+        """Reload counters and per-account baselines from MongoDB."""
+        started = time.time()
+        now = datetime.utcnow()
+        transactions = mongo.db.transactions
+
+        accounts, users = {}, {}
+        recent = transactions.aggregate([
+            {'$match': {'status': 'completed', 'created_at': {'$gte': now - timedelta(hours=24)}}},
+            {'$sort': {'created_at': 1}},
+            {'$project': {'user_id': 1, 'account_id': 1, 'transaction_type': 1,
+                          'created_at': 1, 'amount_minor': AMOUNT_MINOR}}
+        ])
+        for t in recent:
+            ts = (t['created_at'] - EPOCH).total_seconds()
+            amount = t['amount_minor'] if t.get('transaction_type') in OUTGOING_TYPES else 0
+            accounts.setdefault(str(t['account_id']), _Velocity()).add(ts, amount)
+            users.setdefault(str(t['user_id']), _Velocity()).add(ts, amount)
+
+        since = now - timedelta(days=history_days)
+        amounts = {}
+        for row in transactions.aggregate([
+            {'$match': {'status': 'completed', 'created_at': {'$gte': since}}},
+            {'$group': {'_id': '$account_id', 'n': {'$sum': 1},
+                        'mean': {'$avg': AMOUNT_MINOR}, 'std': {'$stdDevPop': AMOUNT_MINOR}}}
+        ]):
+            amounts[str(row['_id'])] = _AmountStats(row['n'], row['mean'] or 0.0, row['std'] or 0.0)
+
+        recipients = {}
+        for row in transactions.aggregate([
+            {'$match': {'transaction_type': 'transfer', 'created_at': {'$gte': since}}},
+            {'$group': {'_id': '$user_id', 'recipients': {'$addToSet': '$recipient_account_id'}}}
+        ]):
+            recipients[str(row['_id'])] = {str(r) for r in row['recipients'] if r}
+
+        thresholds = {
+            str(row['user_id']): row['threshold']
+            for row in mongo.db.behavior_thresholds.find({}, {'user_id': 1, 'threshold': 1})
+        }
+
+        with self._lock:
+            self._accounts = accounts
+            self._users = users
+            self._amounts = amounts
+            self._recipients = recipients
+            self._behavior_thresholds = thresholds
+
+        logger.info(f"Risk counters rebuilt for {len(accounts)} accounts in {time.time() - started:.2f}s")
+
+    def assess(self, user_id, account_id, amount, transaction_type,
+               recipient_account_id=None, behavior_score=None):
+        """Return {'decision': allow|step_up|deny, 'score': float, 'reasons': [...]}."""
+        user_id, account_id = str(user_id), str(account_id)
+        limits = self.limits
+        now = time.time()
+        reasons = []
+
+        with self._lock:
+            account = self._accounts.get(account_id)
+            user = self._users.get(user_id)
+            account_totals = account.totals(now) if account else None
+            user_totals = user.totals(now) if user else None
+            stats = self._amounts.get(account_id)
+            known_recipients = self._recipients.get(user_id)
+            threshold = self._behavior_thresholds.get(user_id, self.default_behavior_threshold)
+
+        # Counts include the transaction being assessed
+        if account_totals:
+            if account_totals['1m'][0] + 1 > limits['account_count_1m']:
+                reasons.append('account_velocity_1m')
+            if account_totals['1h'][0] + 1 > limits['account_count_1h']:
+                reasons.append('account_velocity_1h')
+        if user_totals:
+            if user_totals['24h'][0] + 1 > limits['user_count_24h']:
+                reasons.append('user_velocity_24h')
+        if transaction_type in OUTGOING_TYPES:
+            spent_1h = (user_totals['1h'][1] if user_totals else 0) + amount
+            spent_24h = (user_totals['24h'][1] if user_totals else 0) + amount
+            if spent_1h > limits['user_sum_1h']:
+                reasons.append('user_amount_1h')
+            if spent_24h > limits['user_sum_24h']:
+                reasons.append('user_amount_24h')
+
+        if transaction_type == 'transfer' and recipient_account_id:
+            if not known_recipients or str(recipient_account_id) not in known_recipients:
+                reasons.append('new_recipient')
+
+        if stats and stats.n >= limits['unusual_amount_min_samples']:
+            if amount > stats.mean + limits['unusual_amount_sigma'] * max(stats.std, 100.0):
+                reasons.append('unusual_amount')
+
+        if behavior_score is not None and behavior_score < threshold:
+            reasons.append('behavior_mismatch')
+
+        score = min(sum(WEIGHTS[r] for r in reasons), 1.0)
+        if score >= self.deny_score:
+            decision = DENY
+        elif score >= self.step_up_score:
+            decision = STEP_UP
+        else:
+            decision = ALLOW
+        return {'decision': decision, 'score': round(score, 3), 'reasons': reasons}
+
+    def record(self, user_id, account_id, amount, transaction_type, recipient_account_id=None):
+        """Feed a completed transaction into the counters."""
+        user_id, account_id = str(user_id), str(account_id)
+        now = time.time()
+        outgoing = amount if transaction_type in OUTGOING_TYPES else 0
+        with self._lock:
+            self._accounts.setdefault(account_id, _Velocity()).add(now, outgoing)
+            self._users.setdefault(user_id, _Velocity()).add(now, outgoing)
+            self._amounts.setdefault(account_id, _AmountStats()).add(amount)
+            if transaction_type == 'transfer' and recipient_account_id:
+                self._recipients.setdefault(user_id, set()).add(str(recipient_account_id))
+
+
+risk_engine = RiskEngine()
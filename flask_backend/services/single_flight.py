@@ -0,0 +1,101 @@
+"""Single-flight coalescing for identical concurrent reads.
+
+While a read for a key is in flight, other threads asking for the same key
+wait for it and share its result instead of issuing their own query. Nothing
+is cached: once the leader finishes, the next caller starts a fresh read.
+
+Followers wait at most the group's timeout (or the per-call one) and then
+run the read themselves, so a stuck leader cannot stall a whole burst.
+Writers call forget(key) so readers arriving after a write never join a
+read that started before it.
+"""
+import threading
+
+_groups = {}
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """A named group of coalesced reads with its own counters."""
+
+    def __init__(self, name, timeout=5.0):
+        self.name = name
+        self.timeout = timeout
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.executions = 0
+        self.shared = 0
+        self.timeouts = 0
+
+    def do(self, key, fn, timeout=None):
+        """Return fn(), sharing the result with concurrent callers of the same key."""
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+
+        if not leader:
+            if not call.done.wait(self.timeout if timeout is None else timeout):
+                with self._lock:
+                    self.timeouts += 1
+                    self.executions += 1
+                return fn()
+            with self._lock:
+                self.shared += 1
+            if call.error is not None:
+                raise call.error
+            # Callers get their own list; the models inside are shared read-only
+            return list(call.result) if isinstance(call.result, list) else call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+
+    def forget(self, key):
+        """Stop new callers joining in-flight reads for key (or keys starting with it)."""
+        with self._lock:
+            for existing in list(self._calls):
+                if existing == key or (isinstance(existing, tuple) and existing[0] == key):
+                    del self._calls[existing]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'executions': self.executions,
+                'shared': self.shared,
+                'timeouts': self.timeouts,
+                'in_flight': len(self._calls),
+                'coalescing_ratio': round(self.shared / self.calls, 4) if self.calls else 0.0
+            }
+
+
+def group(name, timeout=5.0):
+    """The process-wide group called name, created on first use."""
+    if name not in _groups:
+        _groups.setdefault(name, SingleFlight(name, timeout))
+    return _groups[name]
+
+
+def stats():
+    return {name: group.stats() for name, group in sorted(_groups.items())}
@@ -0,0 +1,263 @@
+"""Slow-query log fed by a pymongo command listener.
+
+Every command slower than SLOW_QUERY_MS is recorded with its filter shape
+(values replaced by '?'), sort/skip/limit, and the Flask endpoint that issued
+it. A background thread then explains the command, rate-limited per shape
+and globally. Only the plan's stages, index names and counters are kept,
+never the literal filter values. Entries go to an in-memory ring buffer
+straight away and to the capped `slow_queries` collection once explained.
+The admin blueprint serves both.
+"""
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from flask import has_request_context, request
+from pymongo import monitoring
+from pymongo.errors import CollectionInvalid
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = 'slow_queries'
+
+# Never tracked: handshakes, session and transaction bookkeeping
+IGNORED_COMMANDS = frozenset((
+    'hello', 'ismaster', 'isMaster', 'ping', 'buildinfo', 'buildInfo', 'saslStart', 'saslContinue',
+    'endSessions', 'commitTransaction', 'abortTransaction', 'killCursors', 'explain',
+))
+EXPLAINABLE_COMMANDS = frozenset(('find', 'aggregate', 'count', 'distinct', 'findAndModify', 'update', 'delete'))
+# Session, transaction and routing fields that explain rejects
+EXPLAIN_STRIP_FIELDS = frozenset((
+    'lsid', '$db', '$clusterTime', 'txnNumber', 'autocommit', 'startTransaction',
+    '$readPreference', 'readConcern', 'writeConcern', 'apiVersion', 'apiStrict', 'apiDeprecationErrors',
+))
+
+
+def shape(value):
+    """Replace literal values with '?', keeping field names and operators."""
+    if isinstance(value, dict):
+        return {key: shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)) and value and isinstance(value[0], dict):
+        return [shape(item) for item in value]  # $or/$and clauses, pipelines
+    return '?'
+
+
+def command_shape(name, command):
+    """The parts of a command that identify the query, without its values."""
+    details = {}
+    if name == 'find':
+        details['filter'] = shape(command.get('filter', {}))
+        for key in ('sort', 'skip', 'limit'):
+            if key in command:
+                details[key] = dict(command[key]) if key == 'sort' else command[key]
+    elif name == 'aggregate':
+        details['pipeline'] = shape(list(command.get('pipeline', [])))
+    elif name in ('count', 'distinct', 'findAndModify'):
+        details['filter'] = shape(command.get('query', {}))
+    elif name in ('update', 'delete'):
+        statements = command.get('updates' if name == 'update' else 'deletes') or []
+        if statements:
+            details['filter'] = shape(statements[0].get('q', {}))
+            details['statements'] = len(statements)
+    return details
+
+
+def plan_summary(explain):
+    """Winning-plan stages and execution counters, without literal values."""
+    planner = explain.get('queryPlanner')
+    if planner is None and explain.get('stages'):
+        # Aggregations put the cursor stage's plan first
+        planner = explain['stages'][0].get('$cursor', {}).get('queryPlanner')
+    planner = planner or {}
+    stages = []
+    plan = planner.get('winningPlan', {})
+    plan = plan.get('queryPlan', plan)  # slot-based engine wraps the plan
+    while plan:
+        stage = {'stage': plan.get('stage')}
+        for key in ('indexName', 'direction', 'isMultiKey'):
+            if key in plan:
+                stage[key] = plan[key]
+        if 'keyPattern' in plan:
+            stage['keyPattern'] = dict(plan['keyPattern'])
+        stages.append(stage)
+        plan = plan.get('inputStage') or (plan.get('inputStages') or [None])[0]
+    summary = {'stages': stages}
+    stats = explain.get('executionStats')
+    if stats:
+        summary.update({key: stats.get(key) for key in (
+            'nReturned', 'totalKeysExamined', 'totalDocsExamined', 'executionTimeMillis')})
+    return summary
+
+
+class SlowQueryLog(monitoring.CommandListener):
+    """Records slow commands and explains them off the request path."""
+
+    def __init__(self):
+        self.threshold_ms = 100.0
+        self.explain_enabled = True
+        self.explain_verbosity = 'queryPlanner'
+        self.explain_interval = 60.0  # seconds between explains of one shape
+        self.explains_per_minute = 10
+        self.capped_bytes = 16 * 1024 * 1024
+        self.buffer = deque(maxlen=200)
+        self.dropped = 0
+        self._inflight = {}
+        self._queue = queue.Queue(maxsize=1000)
+        self._last_explained = {}
+        self._recent_explains = deque()
+        self._client = None
+        self._worker = None
+        self._collection_ready = False
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.threshold_ms = float(app.config.get('SLOW_QUERY_MS', self.threshold_ms))
+        self.explain_enabled = bool(app.config.get('SLOW_QUERY_EXPLAIN', self.explain_enabled))
+        self.explain_verbosity = app.config.get('SLOW_QUERY_EXPLAIN_VERBOSITY', self.explain_verbosity)
+        self.explain_interval = float(app.config.get('SLOW_QUERY_EXPLAIN_INTERVAL', self.explain_interval))
+        self.explains_per_minute = int(app.config.get('SLOW_QUERY_EXPLAINS_PER_MINUTE', self.explains_per_minute))
+        self.capped_bytes = int(app.config.get('SLOW_QUERY_CAPPED_BYTES', self.capped_bytes))
+        size = int(app.config.get('SLOW_QUERY_BUFFER', self.buffer.maxlen))
+        if size != self.buffer.maxlen:
+            self.buffer = deque(self.buffer, maxlen=size)
+
+    @property
+    def enabled(self):
+        return self.threshold_ms > 0
+
+    # pymongo listener callbacks run on the thread that issued the command
+
+    def started(self, event):
+        if not self.enabled or event.command_name in IGNORED_COMMANDS or self._is_worker():
+            return
+        command = event.command
+        collection = command.get(event.command_name)
+        if collection == COLLECTION:
+            return
+        self._inflight[(event.connection_id, event.request_id)] = (
+            event.command_name,
+            event.database_name,
+            collection if isinstance(collection, str) else None,
+            command,
+            request.endpoint if has_request_context() else None,
+        )
+
+    def succeeded(self, event):
+        self._finish(event, ok=True)
+
+    def failed(self, event):
+        self._finish(event, ok=False)
+
+    def _finish(self, event, ok):
+        started = self._inflight.pop((event.connection_id, event.request_id), None)
+        if started is None or event.duration_micros < self.threshold_ms * 1000:
+            return
+        name, database, collection, command, endpoint = started
+        entry = {
+            'at': datetime.utcnow(),
+            'command': name,
+            'database': database,
+            'collection': collection,
+            'duration_ms': round(event.duration_micros / 1000.0, 3),
+            'ok': ok,
+            'endpoint': endpoint,
+            'shape': command_shape(name, command),
+            'plan': None,
+        }
+        self.buffer.append(entry)
+        try:
+            self._queue.put_nowait((entry, command))
+        except queue.Full:
+            self.dropped += 1
+            return
+        self._ensure_worker()
+
+    # Background worker: explain and persist
+
+    def _is_worker(self):
+        return self._worker is not None and threading.current_thread() is self._worker
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='slow-query-log', daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            entry, command = self._queue.get()
+            try:
+                if self._should_explain(entry):
+                    entry['plan'] = self._explain(entry, command)
+                self._persist(entry)
+            except Exception as e:
+                logger.error(f"Slow query log worker error: {str(e)}")
+
+    def _should_explain(self, entry):
+        if not self.explain_enabled or entry['command'] not in EXPLAINABLE_COMMANDS:
+            return False
+        now = time.monotonic()
+        key = (entry['collection'], entry['command'], repr(entry['shape']))
+        if now - self._last_explained.get(key, -self.explain_interval) < self.explain_interval:
+            return False
+        while self._recent_explains and now - self._recent_explains[0] > 60:
+            self._recent_explains.popleft()
+        if len(self._recent_explains) >= self.explains_per_minute:
+            return False
+        if len(self._last_explained) > 1000:
+            self._last_explained.clear()
+        self._last_explained[key] = now
+        self._recent_explains.append(now)
+        return True
+
+    def _explain(self, entry, command):
+        explain_command = {key: value for key, value in command.items() if key not in EXPLAIN_STRIP_FIELDS}
+        try:
+            result = self._get_client()[entry['database']].command(
+                'explain', explain_command, verbosity=self.explain_verbosity)
+        except Exception as e:
+            return {'error': str(e)}
+        return plan_summary(result)
+
+    def _persist(self, entry):
+        db = self._get_client()[entry['database']]
+        if not self._collection_ready:
+            try:
+                db.create_collection(COLLECTION, capped=True, size=self.capped_bytes)
+            except CollectionInvalid:
+                pass  # Already exists
+            self._collection_ready = True
+        db[COLLECTION].insert_one(dict(entry))
+
+    def _get_client(self):
+        if self._client is None:
+            from extensions import mongo
+            self._client = mongo.cx
+        return self._client
+
+    # Readers for the admin endpoint
+
+    def recent(self, limit=100):
+        """Newest entries from the in-memory ring buffer."""
+        return list(self.buffer)[::-1][:limit]
+
+    def stored(self, db, limit=100):
+        """Newest entries from the capped collection."""
+        return list(db[COLLECTION].find({}, {'_id': 0}).sort('$natural', -1).limit(limit))
+
+    def stats(self):
+        return {
+            'threshold_ms': self.threshold_ms,
+            'buffered': len(self.buffer),
+            'queued': self._queue.qsize(),
+            'dropped': self.dropped,
+            'explain': self.explain_enabled,
+        }
+
+
+slow_query_log = SlowQueryLog()
@@ -0,0 +1,215 @@
+"""Fan out per-user change events from one shared MongoDB change stream.
+
+A single watcher thread per process follows `bank_accounts` and
+`transactions`, and routes each change to the queues of the owning user's
+subscribers (the SSE endpoint) and to every registered on_change hook
+(in-process caches). Subscribers are kept in a dict keyed by user id, so
+routing an event costs one lookup however many users are connected.
+
+The stream resumes from its last token after an error. When that token has
+fallen off the oplog the stream restarts from the present instead, and
+on_reset hooks and subscribers are told that changes may have been missed
+(caches clear themselves, clients get `resync`). A subscriber that
+falls behind has its queue replaced by a single `resync` event, telling the
+client to refetch. Change streams need a replica set; on a standalone server
+the hub logs the error, keeps retrying and reports itself unavailable.
+"""
+import logging
+import queue
+import threading
+import time
+
+from pymongo.errors import OperationFailure
+
+from extensions import mongo
+from models.bank_account import BankAccount
+from models.transaction import Transaction
+
+logger = logging.getLogger(__name__)
+
+WATCHED = (BankAccount.collection_name, Transaction.collection_name)
+OPERATIONS = ('insert', 'update', 'replace', 'delete')
+RESYNC = {'type': 'resync'}
+CHANGE_STREAM_HISTORY_LOST = 286
+
+
+class Subscription:
+    """One connected client's event queue."""
+
+    def __init__(self, user_id, maxsize):
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize=maxsize)
+
+    def push(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            # Too far behind: drop the backlog and ask the client to refetch
+            with self.queue.mutex:
+                self.queue.queue.clear()
+            self.queue.put_nowait(RESYNC)
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class StreamHub:
+    """Shared change-stream watcher, subscriber registry and change hooks."""
+
+    def __init__(self):
+        self.enabled = True
+        self.queue_size = 100
+        self.max_per_user = 5
+        self.available = False
+        self.events_seen = 0
+        self._subscribers = {}  # user_id str -> set of Subscription
+        self._hooks = []
+        self._reset_hooks = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._resume_token = None
+
+    def init_app(self, app):
+        self.enabled = bool(app.config.get('STREAM_ENABLED', self.enabled))
+        self.queue_size = int(app.config.get('STREAM_QUEUE_SIZE', self.queue_size))
+        self.max_per_user = int(app.config.get('STREAM_MAX_PER_USER', self.max_per_user))
+        if self.enabled:
+            self.start()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='stream-hub', daemon=True)
+                self._thread.start()
+
+    # Registry
+
+    def subscribe(self, user_id):
+        """Register a subscriber for user_id; None when the per-user limit is reached."""
+        user_id = str(user_id)
+        with self._lock:
+            subscribers = self._subscribers.setdefault(user_id, set())
+            if len(subscribers) >= self.max_per_user:
+                return None
+            subscription = Subscription(user_id, self.queue_size)
+            subscribers.add(subscription)
+            return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(s) for s in self._subscribers.values())
+
+    def on_change(self, callback):
+        """Call callback(collection, user_id, document_id) for every change."""
+        self._hooks.append(callback)
+        return callback
+
+    def on_reset(self, callback):
+        """Call callback() when changes may have been missed and caches must be dropped."""
+        self._reset_hooks.append(callback)
+        return callback
+
+    def publish(self, user_id, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(str(user_id), ()))
+        for subscription in subscribers:
+            subscription.push(event)
+
+    # Watcher
+
+    def _run(self):
+        delay = 1.0
+        while True:
+            try:
+                self._watch()
+                delay = 1.0
+            except OperationFailure as e:
+                if e.code != CHANGE_STREAM_HISTORY_LOST or self._resume_token is None:
+                    self.available = False
+                    logger.error(f"Change stream error, retrying in {delay:.0f}s: {str(e)}")
+                    time.sleep(delay)
+                    delay = min(delay * 2, 60.0)
+                    continue
+                # Retrying the same token would fail forever
+                logger.warning("Change stream resume token is no longer in the oplog; restarting from now")
+                self._resume_token = None
+                self._reset()
+            except Exception as e:
+                self.available = False
+                logger.error(f"Change stream error, retrying in {delay:.0f}s: {str(e)}")
+                time.sleep(delay)
+                delay = min(delay * 2, 60.0)
+
+    def _watch(self):
+        options = {}
+        if mongo.cx.server_info().get('versionArray', [0])[0] >= 6:
+            options['full_document_before_change'] = 'whenAvailable'
+        pipeline = [{'$match': {
+            'ns.coll': {'$in': list(WATCHED)},
+            'operationType': {'$in': list(OPERATIONS)},
+            # Transactions are only deleted when tiered to the archive, which readers never notice
+            '$nor': [{'ns.coll': Transaction.collection_name, 'operationType': 'delete'}]
+        }}]
+        with mongo.db.watch(pipeline, full_document='updateLookup',
+                            resume_after=self._resume_token, **options) as stream:
+            self.available = True
+            for change in stream:
+                self._resume_token = stream.resume_token
+                self.events_seen += 1
+                self._dispatch(change)
+
+    def _reset(self):
+        self.available = False
+        for hook in self._reset_hooks:
+            try:
+                hook()
+            except Exception as e:
+                logger.error(f"Reset hook {hook!r} failed: {str(e)}")
+        with self._lock:
+            subscribers = [s for group in self._subscribers.values() for s in group]
+        for subscription in subscribers:
+            subscription.push(RESYNC)
+
+    def _dispatch(self, change):
+        collection = change['ns']['coll']
+        operation = change['operationType']
+        document_id = change['documentKey']['_id']
+        # Deletes only carry the owner when pre-images are enabled
+        doc = change.get('fullDocument') or change.get('fullDocumentBeforeChange') or {}
+        user_id = doc.get('user_id')
+
+        for hook in self._hooks:
+            try:
+                hook(collection, user_id, document_id)
+            except Exception as e:
+                logger.error(f"Change hook {hook!r} failed: {str(e)}")
+
+        if user_id is None:
+            return
+        if collection == BankAccount.collection_name:
+            if operation == 'delete':
+                event = {'type': 'account', 'op': operation, 'account_id': str(document_id)}
+            else:
+                event = {'type': 'account', 'op': operation,
+                         'account': BankAccount.from_bson(doc).to_json()}
+        else:
+            if operation == 'delete':
+                event = {'type': 'transaction', 'op': operation, 'transaction_id': str(document_id)}
+            else:
+                event = {'type': 'transaction', 'op': operation,
+                         'transaction': Transaction.from_bson(doc).to_json()}
+        self.publish(user_id, event)
+
+
+stream_hub = StreamHub()
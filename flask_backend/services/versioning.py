@@ -0,0 +1,135 @@
+"""Per-user data versions for conditional GETs.
+
+Every write to a user's accounts or transactions bumps `data_version` on the
+user document, inside the same MongoDB transaction where there is one, and
+stamps `data_modified_at`. List endpoints tag responses with that version as
+an ETag. A matching If-None-Match gets a 304 before any account or
+transaction is read or serialized. Last-Modified is informational only:
+second resolution cannot tell two writes in the same second apart.
+
+Versions are cached in-process and evicted by the stream hub's change events
+(and locally on bump). While the change stream is down the cache is bypassed,
+because other workers' writes would go unnoticed.
+"""
+import time
+import zlib
+from functools import wraps
+
+from flask import make_response, request
+from flask_jwt_extended import get_jwt_identity
+
+from extensions import mongo
+from ids import object_id
+from services.evicting_cache import EvictingCache
+
+VERSION_FIELD = 'data_version'
+MODIFIED_FIELD = 'data_modified_at'
+
+
+class VersionStore:
+    """Reads, caches and bumps per-user data versions."""
+
+    def __init__(self, ttl=60.0, max_entries=100000):
+        self.ttl = ttl
+        self._cache = EvictingCache(max_entries)  # user_id str -> (version, modified_at)
+        self._stream = None
+
+    def init_app(self, app):
+        self.ttl = float(app.config.get('VERSION_CACHE_TTL', self.ttl))
+        from services.stream_hub import stream_hub
+        self._stream = stream_hub
+        stream_hub.on_change(self._on_change)
+        stream_hub.on_reset(self.clear)
+
+    @staticmethod
+    def bump_update(update=None):
+        """update with the version bump folded in, for writers already updating the user.
+
+        The caller evicts after the write (after the commit in a transaction).
+        """
+        update = dict(update or {})
+        update['$inc'] = dict(update.get('$inc', {}), **{VERSION_FIELD: 1})
+        update['$currentDate'] = dict(update.get('$currentDate', {}), **{MODIFIED_FIELD: True})
+        return update
+
+    def bump(self, user_ids, session=None):
+        """Increment the version of every user in user_ids.
+
+        Inside a transaction the caller evicts after the commit; evicting
+        earlier would let a concurrent read re-cache the old version.
+        """
+        ids = list({object_id(user_id) for user_id in user_ids if user_id is not None})
+        if not ids:
+            return
+        mongo.db.users.update_many(
+            {'_id': {'$in': ids}},
+            self.bump_update(),
+            session=session
+        )
+        if session is None:
+            self.evict(ids)
+
+    def clear(self):
+        self._cache.clear()
+
+    def evict(self, user_ids):
+        self._cache.evict([str(user_id) for user_id in user_ids])
+
+    def _on_change(self, collection, user_id, document_id):
+        if user_id is not None:
+            self.evict([user_id])
+
+    def get(self, user_id):
+        """(version, modified_at) for user_id; (0, None) for unknown users."""
+        key = str(user_id)
+        use_cache = self._stream is not None and self._stream.available
+        if use_cache:
+            cached = self._cache.get(key)
+            if cached is not None:
+                return cached
+            token = self._cache.begin(key)
+            expires = time.monotonic() + self.ttl
+
+        doc = mongo.db.users.find_one({'_id': object_id(user_id)}, {VERSION_FIELD: 1, MODIFIED_FIELD: 1}) or {}
+        value = (doc.get(VERSION_FIELD, 0), doc.get(MODIFIED_FIELD))
+        if use_cache:
+            self._cache.fill(key, token, value, expires)
+        return value
+
+
+versions = VersionStore()
+
+
+def conditional(user_arg=None):
+    """Serve 304s for unchanged data owned by one user.
+
+    The owner is the JWT identity, or the view argument named user_arg. The
+    version is read before the view runs, so a write racing with the view
+    can only make the ETag look older than the body, never newer.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            owner = kwargs.get(user_arg) if user_arg else get_jwt_identity()
+            try:
+                version, modified_at = versions.get(owner)
+            except Exception:
+                # Malformed ids and lookup errors are the view's to report
+                return view(*args, **kwargs)
+
+            # One tag per owner, version and query string
+            variant = zlib.crc32(request.full_path.encode()) & 0xffffffff
+            etag = f'{owner}-{version}-{variant:08x}'
+            if request.if_none_match.contains_weak(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            if modified_at:
+                response.last_modified = modified_at
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,188 @@
+"""Write-behind buffer for non-critical bookkeeping updates.
+
+Requests hand updates such as `last_login` to the buffer instead of waiting
+for MongoDB. Updates to the same document are coalesced in memory ($set keeps
+the latest value, $max the largest, $inc the sum), and a background thread
+writes them every WRITE_BEHIND_INTERVAL seconds as one unordered bulk_write
+per collection with the bookkeeping durability profile (w:1 by default).
+Pending updates are flushed at interpreter exit.
+
+The buffer is bounded: when WRITE_BEHIND_MAX_PENDING documents are waiting,
+further updates are dropped and counted. A failed flush puts its updates
+back, so they are retried with the next batch; updates the server rejected
+for good (a validation failure, say) are logged, counted and dropped
+instead. Only use it for values that may be lost in a crash and may lag
+reads by an interval.
+"""
+import atexit
+import logging
+import threading
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from models.durability import durability, BOOKKEEPING
+
+logger = logging.getLogger(__name__)
+
+# Write error codes worth retrying: conflicts, elections, shutdowns, timeouts
+RETRYABLE_CODES = frozenset({
+    6,      # HostUnreachable
+    7,      # HostNotFound
+    50,     # MaxTimeMSExpired
+    89,     # NetworkTimeout
+    91,     # ShutdownInProgress
+    112,    # WriteConflict
+    189,    # PrimarySteppedDown
+    262,    # ExceededTimeLimit
+    9001,   # SocketException
+    10107,  # NotWritablePrimary
+    11600,  # InterruptedAtShutdown
+    11602,  # InterruptedDueToReplStateChange
+    13435,  # NotPrimaryNoSecondaryOk
+    13436,  # NotPrimaryOrSecondary
+})
+
+MERGES = {
+    '$set': lambda old, new: new,
+    '$max': max,
+    '$min': min,
+    '$inc': lambda old, new: old + new,
+}
+
+
+def _merge(pending, update):
+    for operator, fields in update.items():
+        merge = MERGES[operator]
+        current = pending.setdefault(operator, {})
+        for field, value in fields.items():
+            current[field] = merge(current[field], value) if field in current else value
+
+
+class WriteBehindBuffer:
+    """Coalesces per-document updates and writes them in periodic batches."""
+
+    def __init__(self):
+        self.interval = 1.0
+        self.max_pending = 100000
+        self.flushed = 0
+        self.batches = 0
+        self.dropped = 0
+        self.errors = 0
+        self.discarded = 0
+        self._pending = {}  # (collection, _id) -> {operator: {field: value}}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._worker = None
+
+    def init_app(self, app):
+        self.interval = float(app.config.get('WRITE_BEHIND_INTERVAL', self.interval))
+        self.max_pending = int(app.config.get('WRITE_BEHIND_MAX_PENDING', self.max_pending))
+        atexit.register(self.flush)
+
+    def update(self, collection, doc_id, update):
+        """Queue update (a $set/$max/$min/$inc document) for collection's doc_id."""
+        for operator in update:
+            if operator not in MERGES:
+                raise ValueError(f"Unsupported write-behind operator: {operator}")
+        key = (collection, doc_id)
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is None:
+                if len(self._pending) >= self.max_pending:
+                    self.dropped += 1
+                    return
+                pending = self._pending[key] = {}
+            _merge(pending, update)
+            if len(self._pending) >= self.max_pending // 2:
+                self._wake.set()  # flush early rather than start dropping
+        self._ensure_worker()
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='write-behind', daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Write-behind flush failed: {str(e)}")
+
+    def flush(self):
+        """Write everything pending now; returns the number of documents written."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+
+            by_collection = {}
+            for (collection, doc_id), update in batch.items():
+                by_collection.setdefault(collection, []).append((doc_id, update))
+
+            written = 0
+            for collection, updates in by_collection.items():
+                target = durability.collection(collection, BOOKKEEPING)
+                try:
+                    target.bulk_write([UpdateOne({'_id': doc_id}, update) for doc_id, update in updates],
+                                      ordered=False)
+                    written += len(updates)
+                except BulkWriteError as e:
+                    # Unordered: everything but the reported failures was applied
+                    write_errors = e.details.get('writeErrors', [])
+                    retry = sorted(error['index'] for error in write_errors
+                                   if error.get('code') in RETRYABLE_CODES)
+                    permanent = [error for error in write_errors if error.get('code') not in RETRYABLE_CODES]
+                    self.errors += 1
+                    written += len(updates) - len(write_errors)
+                    if retry:
+                        logger.error(f"Write-behind batch for {collection}: {len(retry)} updates failed, "
+                                     f"retrying later")
+                        self._requeue(collection, [updates[index] for index in retry])
+                    if permanent:
+                        self.discarded += len(permanent)
+                        for error in permanent:
+                            logger.error(f"Write-behind update of {collection} {updates[error['index']][0]} "
+                                         f"discarded: {error.get('code')} {error.get('errmsg')}")
+                except Exception as e:
+                    self.errors += 1
+                    logger.error(f"Write-behind batch for {collection} failed, retrying later: {str(e)}")
+                    self._requeue(collection, updates)
+
+            self.flushed += written
+            self.batches += 1
+            return written
+
+    def _requeue(self, collection, updates):
+        # Newer updates queued meanwhile are merged on top of the failed ones
+        with self._lock:
+            for doc_id, update in updates:
+                key = (collection, doc_id)
+                newer = self._pending.get(key)
+                self._pending[key] = update
+                if newer:
+                    _merge(update, newer)
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            'pending': pending,
+            'flushed': self.flushed,
+            'batches': self.batches,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'discarded': self.discarded,
+            'interval': self.interval
+        }
+
+
+write_behind = WriteBehindBuffer()
@@ -0,0 +1,72 @@
+import io
+from datetime import datetime
+
+import pytest
+from bson.int64 import Int64
+
+from models.account_import import _created_at, _effects, _id_at, iter_rows
+from models.transaction import Transaction
+
+
+def _rows(text, fmt):
+    return list(iter_rows(io.BytesIO(text.encode('utf-8')), fmt))
+
+
+def test_csv_rows_are_numbered_without_the_header():
+    rows = _rows('\ufeffaccount_number,balance\n111,10\n222,\n', 'csv')
+    assert rows == [(1, {'account_number': '111', 'balance': '10'}), (2, {'account_number': '222', 'balance': ''})]
+
+
+def test_csv_is_read_lazily():
+    rows = iter_rows(io.BytesIO(b'account_number\n111\n222\n'), 'csv')
+    assert next(rows) == (1, {'account_number': '111'})
+
+
+def test_ndjson_skips_blank_lines_and_flags_bad_ones():
+    text = '{"account_number": "111"}\n\n[1, 2]\nnot json\n{"account_number": "222"}\n'
+    rows = _rows(text, 'ndjson')
+    assert rows == [
+        (1, {'account_number': '111'}),
+        (2, {'__invalid__': '[1, 2]'}),
+        (3, {'__invalid__': 'not json'}),
+        (4, {'account_number': '222'}),
+    ]
+
+
+def test_ndjson_handles_multibyte_text():
+    assert _rows('{"account_holder_name": "Zoë"}\n', 'ndjson') == [(1, {'account_holder_name': 'Zoë'})]
+
+
+def test_created_at_parses_iso_and_converts_to_utc():
+    now = datetime(2026, 10, 1)
+    assert _created_at('', now) == now
+    assert _created_at('2025-01-02T10:00:00Z', now) == datetime(2025, 1, 2, 10)
+    assert _created_at('2025-01-02T10:00:00+05:30', now) == datetime(2025, 1, 2, 4, 30)
+    with pytest.raises(ValueError):
+        _created_at('2027-01-01', now)
+    with pytest.raises(ValueError):
+        _created_at('yesterday', now)
+
+
+def test_backdated_ids_carry_the_creation_time():
+    when = datetime(2024, 5, 6, 7, 8, 9)
+    first, second = _id_at(when), _id_at(when)
+    assert first != second
+    assert first.generation_time.replace(tzinfo=None) == when
+
+
+def _transaction(transaction_type, status='completed', recipient=None):
+    return Transaction(user_id='6ad5855837fe0a598daf9370', account_id='6ad5855837fe0a598daf9371',
+                       amount=None, amount_minor=500, transaction_type=transaction_type,
+                       recipient_account_id=recipient, status=status)
+
+
+def test_effects_follow_transaction_apply():
+    recipient = '6ad5855837fe0a598daf9372'
+    own = _transaction('deposit').account_id
+    assert _effects(_transaction('deposit')) == [(own, Int64(500))]
+    assert _effects(_transaction('withdrawal')) == [(own, -500)]
+    transfer = _transaction('transfer', recipient=recipient)
+    assert _effects(transfer) == [(own, -500), (transfer.recipient_account_id, 500)]
+    assert _effects(_transaction('payment')) == []
+    assert _effects(_transaction('deposit', status='failed')) == []
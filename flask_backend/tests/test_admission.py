@@ -0,0 +1,132 @@
+import threading
+import time
+
+import pytest
+from flask import Flask
+
+from services.admission import AdmissionController, EndpointClass, admission_class
+
+
+def _endpoint_class(name, priority, max_wait=5.0, initial=4):
+    return EndpointClass(name, priority=priority, max_wait=max_wait, target_latency=1.0,
+                         initial=initial, min=1, max=8)
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError('condition not reached')
+        time.sleep(0.001)
+
+
+def test_release_admits_queued_requests_by_priority():
+    controller = AdmissionController()
+    controller.capacity = 1
+    high, low = _endpoint_class('high', 0), _endpoint_class('low', 4)
+    assert controller.acquire(low)
+
+    admitted = []
+    lock = threading.Lock()
+
+    def request(endpoint_class):
+        if controller.acquire(endpoint_class):
+            with lock:
+                admitted.append(endpoint_class.name)
+
+    # The low-priority request queues first
+    threads = [threading.Thread(target=request, args=(low,))]
+    threads[0].start()
+    _wait_for(lambda: low.queued == 1)
+    threads.append(threading.Thread(target=request, args=(high,)))
+    threads[1].start()
+    _wait_for(lambda: high.queued == 1)
+
+    controller.release(low, 0.01)
+    _wait_for(lambda: len(admitted) == 1)
+    assert admitted == ['high']
+    assert low.queued == 1
+
+    controller.release(high, 0.01)
+    for thread in threads:
+        thread.join(2.0)
+    assert admitted == ['high', 'low']
+    assert controller.in_flight == 1
+
+
+def test_queued_request_is_shed_after_max_wait():
+    app = Flask(__name__)
+    app.config['ADMISSION_CAPACITY'] = 1
+    app.config['ADMISSION_CLASSES'] = {'default': {'max_wait': 0.05}}
+    controller = AdmissionController()
+    controller.init_app(app)
+
+    @app.route('/ping')
+    def ping():
+        return 'pong'
+
+    @app.route('/stream')
+    @admission_class(None)
+    def stream():
+        return 'open'
+
+    endpoint_class = controller.classes['default']
+    assert controller.acquire(endpoint_class)  # takes the only slot
+
+    client = app.test_client()
+    started = time.monotonic()
+    response = client.get('/ping')
+    assert time.monotonic() - started >= 0.05
+    assert response.status_code == 503
+    assert int(response.headers['Retry-After']) >= 1
+    assert endpoint_class.rejected == 1
+    assert endpoint_class.queued == 0
+
+    # Exempt views are not counted
+    assert client.get('/stream').status_code == 200
+
+    controller.release(endpoint_class, 0.01)
+    assert client.get('/ping').status_code == 200
+    assert controller.in_flight == 0
+
+
+def test_full_queue_is_shed_without_waiting():
+    controller = AdmissionController()
+    endpoint_class = EndpointClass('tiny', priority=0, max_wait=5.0, target_latency=1.0,
+                                   initial=1, min=1, max=1, max_queue=0)
+    assert controller.acquire(endpoint_class)
+    started = time.monotonic()
+    assert not controller.acquire(endpoint_class)
+    assert time.monotonic() - started < 1.0
+    assert endpoint_class.rejected == 1
+
+
+def test_slow_responses_cut_the_limit_once_per_window():
+    endpoint_class = EndpointClass('search', priority=3, max_wait=0.5, target_latency=0.5,
+                                   initial=10, min=1, max=16, backoff=0.5)
+    endpoint_class.observe(2.0, now=100.0)
+    assert endpoint_class.limit == 5
+    # More slow responses within the same target-latency window
+    endpoint_class.observe(2.0, now=100.1)
+    endpoint_class.observe(2.0, now=100.4)
+    assert endpoint_class.limit == 5
+    endpoint_class.observe(2.0, now=100.5)
+    assert endpoint_class.limit == 2.5
+
+
+def test_limit_never_drops_below_min():
+    endpoint_class = EndpointClass('bulk', priority=4, max_wait=0.5, target_latency=1.0,
+                                   initial=2, min=1, max=2, backoff=0.1)
+    endpoint_class.observe(5.0, now=10.0)
+    assert endpoint_class.limit == 1
+
+
+def test_fast_responses_grow_the_limit_only_at_the_limit():
+    endpoint_class = _endpoint_class('default', 2, initial=4)
+    endpoint_class.in_flight = 0
+    endpoint_class.observe(0.1, now=1.0)
+    assert endpoint_class.limit == 4  # not limited by the cap, no growth
+
+    endpoint_class.in_flight = 3
+    endpoint_class.observe(0.1, now=2.0)
+    assert endpoint_class.limit == pytest.approx(4.25)
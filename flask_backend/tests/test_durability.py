@@ -0,0 +1,38 @@
+import pytest
+from flask import Flask
+
+from models.durability import DurabilityProfiles, MONEY, STANDARD, BOOKKEEPING, parse_write_concern
+
+
+@pytest.mark.parametrize('spec, document', [
+    ('majority+j', {'w': 'majority', 'j': True}),
+    ('1', {'w': 1}),
+    (' 2+wtimeout=5000 ', {'w': 2, 'wtimeout': 5000}),
+    ('majority+j+wtimeout=100', {'w': 'majority', 'j': True, 'wtimeout': 100}),
+    ('0', {'w': 0}),
+])
+def test_parse_write_concern(spec, document):
+    assert parse_write_concern(spec).document == document
+
+
+def test_default_means_the_client_default():
+    assert parse_write_concern('default') is None
+
+
+@pytest.mark.parametrize('spec', ['majority+fsync', '1+wtimeout=soon', '1+j=false'])
+def test_parse_write_concern_rejects_unknown_options(spec):
+    with pytest.raises(ValueError):
+        parse_write_concern(spec)
+
+
+def test_profiles_default_and_config_overrides():
+    profiles = DurabilityProfiles()
+    assert profiles.stats() == {MONEY: {'w': 'majority', 'j': True}, STANDARD: 'default', BOOKKEEPING: {'w': 1}}
+
+    app = Flask(__name__)
+    app.config['DURABILITY_MONEY'] = 'majority'
+    app.config['DURABILITY_BOOKKEEPING'] = ''  # unset: keeps the default
+    profiles.init_app(app)
+    assert profiles.write_concern(MONEY).document == {'w': 'majority'}
+    assert profiles.write_concern(STANDARD) is None
+    assert profiles.write_concern(BOOKKEEPING).document == {'w': 1}
@@ -0,0 +1,80 @@
+import threading
+import time
+
+from services.evicting_cache import EvictingCache
+
+
+def _later(seconds=60):
+    return time.monotonic() + seconds
+
+
+def test_fill_after_begin_is_cached():
+    cache = EvictingCache()
+    token = cache.begin('user')
+    cache.fill('user', token, 7, _later())
+    assert cache.get('user') == 7
+
+
+def test_expired_entries_are_misses():
+    cache = EvictingCache()
+    token = cache.begin('user')
+    cache.fill('user', token, 7, time.monotonic() - 1)
+    assert cache.get('user') is None
+
+
+def test_eviction_beats_a_load_started_before_it():
+    cache = EvictingCache()
+    token = cache.begin('user')  # a reader starts loading the old value
+    cache.evict(['user'])  # a writer commits and evicts
+    cache.fill('user', token, 'stale', _later())
+    assert cache.get('user') is None
+
+
+def test_clear_beats_loads_in_progress():
+    cache = EvictingCache()
+    tokens = {key: cache.begin(key) for key in ('a', 'b')}
+    cache.clear()
+    for key, token in tokens.items():
+        cache.fill(key, token, 'stale', _later())
+        assert cache.get(key) is None
+
+
+def test_only_the_latest_load_fills():
+    cache = EvictingCache()
+    first = cache.begin('user')
+    second = cache.begin('user')
+    cache.fill('user', first, 'older', _later())
+    assert cache.get('user') is None
+    cache.fill('user', second, 'newer', _later())
+    assert cache.get('user') == 'newer'
+
+
+def test_eviction_from_another_thread_during_a_load():
+    cache = EvictingCache()
+    loading, evicted = threading.Event(), threading.Event()
+
+    def reader():
+        token = cache.begin('user')
+        loading.set()
+        evicted.wait(2.0)  # the database read is still in flight
+        cache.fill('user', token, 'stale', _later())
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    loading.wait(2.0)
+    cache.evict(['user'])
+    evicted.set()
+    thread.join(2.0)
+    assert cache.get('user') is None
+
+    token = cache.begin('user')
+    cache.fill('user', token, 'fresh', _later())
+    assert cache.get('user') == 'fresh'
+
+
+def test_full_cache_starts_over():
+    cache = EvictingCache(max_entries=2)
+    for key in ('a', 'b', 'c'):
+        cache.fill(key, cache.begin(key), key, _later())
+    assert cache.get('a') is None and cache.get('b') is None
+    assert cache.get('c') == 'c'
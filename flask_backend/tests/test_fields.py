@@ -0,0 +1,47 @@
+import pytest
+
+from models.fields import parse_fields, projection, select
+
+ALLOWED = {'_id': ('_id',), 'amount': ('amount_minor', 'amount'), 'status': ('status',),
+           'created_at': ('created_at',)}
+VIEWS = {'summary': ('_id', 'amount', 'status')}
+
+
+def test_no_selection_means_everything():
+    assert parse_fields(None, None, ALLOWED, VIEWS) is None
+    assert parse_fields('', '', ALLOWED, VIEWS) is None
+
+
+def test_fields_always_include_the_id_once():
+    assert parse_fields('amount, status', None, ALLOWED, VIEWS) == ('_id', 'amount', 'status')
+    assert parse_fields('status,_id,status', None, ALLOWED, VIEWS) == ('status', '_id')
+
+
+def test_fields_win_over_view():
+    assert parse_fields('status', 'summary', ALLOWED, VIEWS) == ('_id', 'status')
+
+
+def test_views_and_default_view():
+    assert parse_fields(None, 'summary', ALLOWED, VIEWS) == ('_id', 'amount', 'status')
+    assert parse_fields(None, None, ALLOWED, VIEWS, default_view='summary') == ('_id', 'amount', 'status')
+
+
+def test_unknown_view_is_rejected():
+    with pytest.raises(ValueError, match='Unknown view'):
+        parse_fields(None, 'everything', ALLOWED, VIEWS)
+
+
+def test_fields_outside_the_allowlist_are_rejected():
+    with pytest.raises(ValueError, match='password, pin'):
+        parse_fields('amount,password,pin', None, ALLOWED, VIEWS)
+
+
+def test_projection_covers_the_stored_fields():
+    assert projection(None, ALLOWED) is None
+    assert projection(('_id', 'amount'), ALLOWED) == {'_id': 1, 'amount_minor': 1, 'amount': 1}
+
+
+def test_select_keeps_the_requested_keys():
+    data = {'_id': '1', 'amount': '2.00', 'status': 'completed'}
+    assert select(data, None) is data
+    assert select(data, ('_id', 'status')) == {'_id': '1', 'status': 'completed'}
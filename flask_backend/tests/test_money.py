@@ -0,0 +1,59 @@
+from decimal import Decimal
+
+import bson
+import pytest
+from bson.int64 import Int64
+
+from models.money import MAX_MINOR, from_minor, to_minor
+
+
+@pytest.mark.parametrize('value, expected', [
+    (12, 1200),
+    ('12.34', 1234),
+    (' 0.5 ', 50),
+    (12.5, 1250),
+    (Decimal('-3.10'), -310),
+    ('0', 0),
+])
+def test_to_minor_parses_amounts(value, expected):
+    minor = to_minor(value)
+    assert minor == expected
+    assert isinstance(minor, Int64)
+
+
+@pytest.mark.parametrize('value', [
+    None, True, '', 'abc', 'NaN', 'nan', 'Infinity', '-Infinity', float('nan'), float('inf'),
+])
+def test_to_minor_rejects_non_numbers(value):
+    with pytest.raises(ValueError):
+        to_minor(value)
+
+
+@pytest.mark.parametrize('value', ['1e30', 1e30, '1e17', 10 ** 17, -(10 ** 17), '-1e17'])
+def test_to_minor_rejects_amounts_beyond_int64(value):
+    with pytest.raises(ValueError):
+        to_minor(value)
+
+
+def test_to_minor_accepts_the_largest_int64_amount():
+    minor = to_minor(from_minor(MAX_MINOR))
+    assert minor == MAX_MINOR
+    bson.encode({'amount_minor': minor})
+
+
+def test_to_minor_strict_rejects_sub_minor_precision():
+    with pytest.raises(ValueError):
+        to_minor('0.005')
+    with pytest.raises(ValueError):
+        to_minor(0.1 + 0.2)
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('0.005', 0),
+    ('0.015', 2),
+    ('0.025', 2),
+    ('-0.015', -2),
+    (0.1 + 0.2, 30),
+])
+def test_to_minor_non_strict_rounds_half_even(value, expected):
+    assert to_minor(value, strict=False) == expected
@@ -0,0 +1,99 @@
+import pytest
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+import services.write_behind as write_behind_module
+from services.write_behind import WriteBehindBuffer, _merge
+
+
+class FakeCollection:
+    """Records bulk writes; raises `error` once if set."""
+
+    def __init__(self, error=None):
+        self.error = error
+        self.requests = []
+
+    def bulk_write(self, requests, ordered=True):
+        self.requests.append(requests)
+        error, self.error = self.error, None
+        if error is not None:
+            raise error
+
+
+@pytest.fixture
+def buffer(monkeypatch):
+    collection = FakeCollection()
+    monkeypatch.setattr(write_behind_module.durability, 'collection', lambda name, profile: collection)
+    buffer = WriteBehindBuffer()
+    buffer.collection = collection
+    return buffer
+
+
+def test_merge_coalesces_by_operator():
+    pending = {}
+    _merge(pending, {'$set': {'last_login': 1}, '$max': {'seen': 5}, '$inc': {'logins': 1}})
+    _merge(pending, {'$set': {'last_login': 2}, '$max': {'seen': 3}, '$min': {'first': 9}, '$inc': {'logins': 2}})
+    assert pending == {'$set': {'last_login': 2}, '$max': {'seen': 5}, '$min': {'first': 9}, '$inc': {'logins': 3}}
+
+
+def test_update_rejects_unsupported_operators(buffer):
+    with pytest.raises(ValueError):
+        buffer.update('users', 1, {'$unset': {'last_login': ''}})
+
+
+def test_updates_to_one_document_are_written_once(buffer):
+    buffer._ensure_worker = lambda: None
+    buffer.update('users', 1, {'$set': {'last_login': 1}})
+    buffer.update('users', 1, {'$set': {'last_login': 2}})
+    buffer.update('users', 2, {'$inc': {'logins': 1}})
+    assert buffer.flush() == 2
+    [requests] = buffer.collection.requests
+    assert requests == [UpdateOne({'_id': 1}, {'$set': {'last_login': 2}}),
+                        UpdateOne({'_id': 2}, {'$inc': {'logins': 1}})]
+    assert buffer.flush() == 0
+
+
+def test_requeue_merges_newer_updates_on_top(buffer):
+    buffer._pending[('users', 1)] = {'$set': {'last_login': 3}, '$inc': {'logins': 1}}
+    buffer._requeue('users', [(1, {'$set': {'last_login': 2}, '$inc': {'logins': 2}}), (2, {'$max': {'seen': 1}})])
+    assert buffer._pending == {
+        ('users', 1): {'$set': {'last_login': 3}, '$inc': {'logins': 3}},
+        ('users', 2): {'$max': {'seen': 1}},
+    }
+
+
+def test_failed_flush_is_retried_with_the_next_batch(buffer):
+    buffer._ensure_worker = lambda: None
+    buffer.collection.error = ConnectionError('primary unreachable')
+    buffer.update('users', 1, {'$set': {'last_login': 1}})
+    assert buffer.flush() == 0
+    assert buffer.stats()['pending'] == 1
+    assert buffer.flush() == 1
+    assert buffer.stats()['errors'] == 1
+
+
+def test_only_retryable_write_errors_are_requeued(buffer):
+    buffer._ensure_worker = lambda: None
+    for doc_id in (1, 2, 3):
+        buffer.update('users', doc_id, {'$set': {'last_login': doc_id}})
+    buffer.collection.error = BulkWriteError({'writeErrors': [
+        {'index': 0, 'code': 112, 'errmsg': 'WriteConflict'},
+        {'index': 1, 'code': 121, 'errmsg': 'Document failed validation'},
+    ]})
+    assert buffer.flush() == 1
+    assert list(buffer._pending) == [('users', 1)]
+    stats = buffer.stats()
+    assert stats['discarded'] == 1
+    assert stats['errors'] == 1
+    assert buffer.flush() == 1
+    assert buffer.stats()['pending'] == 0
+
+
+def test_full_buffer_drops_new_documents(buffer):
+    buffer._ensure_worker = lambda: None
+    buffer.max_pending = 2
+    for doc_id in (1, 2, 3):
+        buffer.update('users', doc_id, {'$set': {'last_login': doc_id}})
+    buffer.update('users', 1, {'$set': {'last_login': 4}})  # already pending: merged, not dropped
+    assert buffer.stats()['dropped'] == 1
+    assert buffer._pending[('users', 1)] == {'$set': {'last_login': 4}}